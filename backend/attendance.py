@@ -0,0 +1,220 @@
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from models import AttendanceStatus
+import os
+
+# How much one record of each status counts towards the attendance percentage
+DEFAULT_WEIGHTS = {
+    AttendanceStatus.PRESENT.value: 1.0,
+    AttendanceStatus.LATE.value: 1.0,
+    AttendanceStatus.HALF_DAY.value: 0.5,
+    AttendanceStatus.EXCUSED.value: 0.0,
+    AttendanceStatus.ABSENT.value: 0.0,
+}
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Status weights from a "late=1,half_day=0.5" string, defaulting unlisted statuses"""
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        status, _, weight = item.partition("=")
+        status = status.strip()
+        if status not in weights:
+            raise ValueError(f"Unknown attendance status in ATTENDANCE_WEIGHTS: {status}")
+        weights[status] = float(weight)
+    return weights
+
+ATTENDANCE_WEIGHTS = parse_weights(os.environ.get('ATTENDANCE_WEIGHTS', ''))
+
+STATUSES: List[str] = [status.value for status in AttendanceStatus]
+
+def as_utc(value: datetime) -> datetime:
+    """Aware UTC datetime; naive values are taken to be UTC already"""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def month_start(value: datetime) -> datetime:
+    """First instant of the (UTC) month containing value"""
+    return as_utc(value).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def status_count_fields() -> dict:
+    """$group accumulators counting records per status, plus the total"""
+    fields = {"total": {"$sum": 1}}
+    for status in STATUSES:
+        fields[status] = {"$sum": {"$cond": [{"$eq": ["$status", status]}, 1, 0]}}
+    return fields
+
+def summarize_counts(counts: dict, weights: Dict[str, float] = None) -> dict:
+    """Per-status counts and the weighted attendance percentage"""
+    weights = weights or ATTENDANCE_WEIGHTS
+    total = counts.get("total", 0)
+    summary = {"total_days": total}
+    summary.update({status: counts.get(status, 0) for status in STATUSES})
+
+    attended = sum(weights[status] * summary[status] for status in STATUSES)
+    summary["attended"] = round(attended, 2)
+    summary["percentage"] = round(attended / total * 100, 2) if total > 0 else 0
+    return summary
+
+async def attendance_stats(collection, query: dict) -> dict:
+    """Attendance statistics of the records matching a query, counted by the database"""
+    result = await collection.aggregate([
+        {"$match": query},
+        {"$group": {"_id": None, **status_count_fields()}}
+    ]).to_list(1)
+
+    return summarize_counts(result[0] if result else {})
+
+def summary_rows(counts_by_student: Dict[str, dict], students: Dict[str, dict]) -> List[dict]:
+    """Per-student statistics with names and roll numbers, sorted by roll number"""
+    rows = []
+    for student_id, counts in counts_by_student.items():
+        student = students.get(student_id, {})
+        rows.append({
+            "student_id": student_id,
+            "name": student.get("name"),
+            "roll_no": student.get("roll_no"),
+            **summarize_counts(counts)
+        })
+    rows.sort(key=lambda row: (row["roll_no"] is not None, row["roll_no"] or "", row["student_id"]))
+    return rows
+
+async def student_summaries(collection, query: dict) -> List[dict]:
+    """Attendance statistics per student of the records matching a query, in one aggregation
+
+    Students are joined in for their name and roll number.
+    """
+    rows = await collection.aggregate([
+        {"$match": query},
+        {"$group": {"_id": "$student_id", **status_count_fields()}},
+        {"$lookup": {
+            "from": "students",
+            "localField": "_id",
+            "foreignField": "id",
+            "as": "student"
+        }}
+    ]).to_list(None)
+
+    counts = {row["_id"]: row for row in rows}
+    students = {row["_id"]: row["student"][0] for row in rows if row["student"]}
+    return summary_rows(counts, students)
+
+# Fields identifying an attendance record; unique in the attendance collection
+RECORD_KEY = ("student_id", "date", "subject_id")
+
+def record_key(doc: dict) -> tuple:
+    return tuple(as_utc(doc[field]) if field == "date" else doc.get(field) for field in RECORD_KEY)
+
+def upsert_update(doc: dict) -> Tuple[dict, dict]:
+    """Filter and update storing a record under its key, keeping the id and created_at of one already there"""
+    key = {field: doc.get(field) for field in RECORD_KEY}
+    values = {field: value for field, value in doc.items() if field not in RECORD_KEY and field not in ("id", "created_at")}
+    return key, {"$set": values, "$setOnInsert": {"id": doc["id"], "created_at": doc["created_at"]}}
+
+# Fields of a stored record the rollups count it under; an update only goes
+# through while they still hold the values read before the write
+GUARD_FIELDS = ("id", "status", "class_id", "section_id")
+
+# Server error code of a write colliding with a unique index
+DUPLICATE_KEY = 11000
+
+# Times a row is re-read and re-written after a concurrent write changed its record
+MAX_UPSERT_ATTEMPTS = 3
+
+def next_round(pending: List[int], key: Callable[[int], Hashable]) -> Tuple[List[int], List[int]]:
+    """Split pending rows into the first row of each key and the rest
+
+    Rows of one unordered bulk write may be applied in any order, so rows sharing
+    a key go in successive writes, and the last of them wins.
+    """
+    seen, first, rest = set(), [], []
+    for index in pending:
+        k = key(index)
+        (rest if k in seen else first).append(index)
+        seen.add(k)
+    return first, rest
+
+def write_errors(error: BulkWriteError) -> Tuple[Dict[int, dict], Dict[int, Any]]:
+    """Write errors and upserted ids of a failed unordered bulk write, by operation index"""
+    details = error.details or {}
+    return (
+        {e["index"]: e for e in details.get("writeErrors", [])},
+        {u["index"]: u["_id"] for u in details.get("upserted", [])}
+    )
+
+def failure(index: int, message: str) -> dict:
+    return {"index": index, "status": "failed", "error": message}
+
+async def current_records(collection, docs: List[dict]) -> Dict[tuple, dict]:
+    """Stored records under the keys of docs, read in one query"""
+    query = {field: {"$in": list({doc.get(field) for doc in docs})} for field in RECORD_KEY}
+    return {record_key(record): record async for record in collection.find(query, {"_id": 0})}
+
+async def upsert_records(collection, docs: List[dict], chunk_size: int = 500) -> Tuple[List[dict], List[Tuple[dict, int]]]:
+    """Insert or overwrite attendance records by RECORD_KEY with one unordered bulk write per chunk
+
+    The records already stored under a chunk's keys are read first, and each update
+    only applies while the record still has the GUARD_FIELDS values read, so the
+    records reported as replaced are exactly those overwritten. Rows whose record
+    changed in between, and later rows repeating a key, go in a further bulk write.
+    Returns a result per document, {"index", "status": inserted/updated/failed,
+    "id" or "error"}, and the stored records that were added (+1) or replaced (-1),
+    in document order. A chunk whose write fails outright has its unwritten rows
+    reported as failed; the records written before that are still returned.
+    """
+    results: List[Optional[dict]] = [None] * len(docs)
+    changes: List[List[Tuple[dict, int]]] = [[] for _ in docs]
+    attempts = [0] * len(docs)
+
+    for offset in range(0, len(docs), chunk_size):
+        pending = list(range(offset, min(offset + chunk_size, len(docs))))
+        while pending:
+            batch, later = next_round(pending, lambda index: record_key(docs[index]))
+            retry = []
+            try:
+                current = await current_records(collection, [docs[index] for index in batch])
+                previous, operations = [], []
+                for index in batch:
+                    doc = docs[index]
+                    key, update = upsert_update(doc)
+                    stored = current.get(record_key(doc))
+                    if stored is None:
+                        # Matches nothing once some other write has inserted the key
+                        guard = {**key, "id": {"$exists": False}}
+                    else:
+                        guard = {**key, **{field: stored.get(field) for field in GUARD_FIELDS}}
+                    previous.append(stored)
+                    operations.append(UpdateOne(guard, update, upsert=True))
+                    attempts[index] += 1
+
+                try:
+                    result = await collection.bulk_write(operations, ordered=False)
+                    errors, upserted = {}, result.upserted_ids
+                except BulkWriteError as e:
+                    errors, upserted = write_errors(e)
+            except PyMongoError as e:
+                for index in pending:
+                    results[index] = failure(index, str(e))
+                break
+
+            for position, index in enumerate(batch):
+                doc, stored = docs[index], previous[position]
+                error = errors.get(position)
+                if error is not None:
+                    # A guard that no longer matches makes the upsert collide with the stored record
+                    if error.get("code") == DUPLICATE_KEY and attempts[index] < MAX_UPSERT_ATTEMPTS:
+                        retry.append(index)
+                    else:
+                        results[index] = failure(index, error.get("errmsg", "write failed"))
+                elif position in upserted or stored is None:
+                    results[index] = {"index": index, "status": "inserted", "id": doc["id"]}
+                    changes[index].append((doc, 1))
+                else:
+                    record = {**doc, "id": stored["id"], "created_at": stored["created_at"]}
+                    results[index] = {"index": index, "status": "updated", "id": stored["id"]}
+                    changes[index].extend([(stored, -1), (record, 1)])
+            pending = sorted(retry + later)
+
+    return results, [change for index_changes in changes for change in index_changes]
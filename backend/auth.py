@@ -1,8 +1,11 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
 from typing import Optional
+import asyncio
 import os
+import time
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -12,6 +15,15 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 
+# "lookup" resolves the user on every request, "claims" trusts role/id embedded in the token
+AUTH_TOKEN_MODE = os.getenv("AUTH_TOKEN_MODE", "lookup")
+TOKEN_VERSION_REFRESH_SECONDS = float(os.getenv("TOKEN_VERSION_REFRESH_SECONDS", "30"))
+
+# bcrypt is deliberately slow, so it runs on a bounded pool instead of the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_jobs_in_flight = 0
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against a hashed password"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -20,6 +32,32 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+async def _run_hash_job(func, *args):
+    """Run a bcrypt call on the hashing pool and track how many are waiting"""
+    global _hash_jobs_in_flight
+    loop = asyncio.get_running_loop()
+    _hash_jobs_in_flight += 1
+    try:
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_jobs_in_flight -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password without blocking the event loop"""
+    return await _run_hash_job(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password without blocking the event loop"""
+    return await _run_hash_job(get_password_hash, password)
+
+def password_hash_pool_stats() -> dict:
+    """Worker count, running jobs and queue depth of the hashing pool"""
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "running": min(_hash_jobs_in_flight, PASSWORD_HASH_WORKERS),
+        "queue_depth": max(_hash_jobs_in_flight - PASSWORD_HASH_WORKERS, 0)
+    }
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -39,3 +77,38 @@ def decode_access_token(token: str) -> Optional[dict]:
         return payload
     except JWTError:
         return None
+
+class TokenVersionMap:
+    """In-memory copy of per-user token versions, used to revoke claim tokens"""
+
+    def __init__(self, refresh_interval: float = TOKEN_VERSION_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self._versions = {}
+        self._refreshed_at = None
+
+    def get(self, user_id: str) -> int:
+        """Current version for a user; users never bumped are at version 0"""
+        return self._versions.get(user_id, 0)
+
+    def set(self, user_id: str, version: int):
+        """Record a version bumped by this process"""
+        self._versions[user_id] = version
+
+    def is_stale(self) -> bool:
+        """Whether the map should be reloaded to pick up bumps from other workers"""
+        return self._refreshed_at is None or time.monotonic() - self._refreshed_at > self.refresh_interval
+
+    async def fetch(self, collection, user_id: str) -> int:
+        """Reload one user's version, e.g. for a token newer than this process has seen"""
+        doc = await collection.find_one({"user_id": user_id}, {"_id": 0, "version": 1})
+        version = doc["version"] if doc else 0
+        # Versions only move forward; keep a newer one set here meanwhile
+        self._versions[user_id] = max(version, self.get(user_id))
+        return self._versions[user_id]
+
+    async def refresh(self, collection):
+        """Reload all versions from the token_versions collection"""
+        # Mark as fresh first so concurrent requests don't all reload at once
+        self._refreshed_at = time.monotonic()
+        docs = await collection.find({}, {"_id": 0, "user_id": 1, "version": 1}).to_list(None)
+        self._versions = {doc["user_id"]: doc["version"] for doc in docs}
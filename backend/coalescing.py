@@ -0,0 +1,82 @@
+from typing import Any, Awaitable, Callable, List, Optional, Set, Tuple
+import asyncio
+
+class WriteCoalescer:
+    """Group commit: writes submitted by concurrent requests go to the database as one batch
+
+    A batch is written once max_batch items are waiting or max_delay seconds after
+    its first item arrived, whichever comes first. write receives the items in
+    submission order and returns one result per item. submit() resolves only
+    after the batch holding its item has been written. If the write raises, or
+    returns a different number of results, every caller in that batch gets an exception.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[List[Any]], Awaitable[List[Any]]],
+        max_batch: int = 200,
+        max_delay: float = 0.005
+    ):
+        self.write = write
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self._batches = 0
+        self._items = 0
+        self._largest = 0
+
+    async def submit(self, item: Any) -> Any:
+        """Queue an item for the next batch and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._write(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: List[Tuple[Any, asyncio.Future]]):
+        self._batches += 1
+        self._items += len(batch)
+        self._largest = max(self._largest, len(batch))
+        try:
+            results = await self.write([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Write returned {len(results)} results for a batch of {len(batch)}")
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def drain(self):
+        """Write whatever is queued and wait for batches in flight, e.g. at shutdown"""
+        self._flush()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "batches": self._batches,
+            "items": self._items,
+            "largest_batch": self._largest,
+            "average_batch": round(self._items / self._batches, 1) if self._batches else 0
+        }
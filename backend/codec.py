@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Type, get_args
+from pydantic import BaseModel
+
+def _is_datetime_field(annotation) -> bool:
+    """True for datetime and Optional[datetime] annotations"""
+    return annotation is datetime or datetime in get_args(annotation)
+
+def parse_datetime(value: str) -> datetime:
+    """Parse an ISO 8601 string, treating values without an offset as UTC"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def _compile(name: str, fields: tuple, body: List[str]) -> Callable[[dict], dict]:
+    """Build a straight-line function that touches each datetime field once"""
+    lines = [f"def {name}(doc):"]
+    for field in fields:
+        lines.extend(line.format(field=field) for line in body)
+    lines.append("    return doc")
+
+    namespace = {"parse_datetime": parse_datetime}
+    exec("\n".join(lines), namespace)
+    return namespace[name]
+
+# Dates are stored as native BSON datetimes, so both directions only need to turn
+# ISO strings (legacy documents, raw update payloads) into datetimes
+_PARSE_FIELD = [
+    "    value = doc.get({field!r})",
+    "    if value.__class__ is str:",
+    "        doc[{field!r}] = parse_datetime(value)",
+]
+
+class ModelCodec:
+    """Converts between a model and its stored document, compiled once per model"""
+
+    def __init__(self, model: Type[BaseModel]):
+        self.model = model
+        self.datetime_fields = tuple(
+            name for name, field in model.model_fields.items()
+            if _is_datetime_field(field.annotation)
+        )
+        # Both functions convert in place and return the same dict
+        self.decode = _compile("decode", self.datetime_fields, _PARSE_FIELD)
+        self.encode = _compile("encode", self.datetime_fields, _PARSE_FIELD)
+
+    def load(self, doc: dict) -> BaseModel:
+        """Build a model from a stored document"""
+        return self.model(**self.decode(doc))
+
+    def load_many(self, docs: List[dict]) -> List[BaseModel]:
+        """Build models from stored documents in a single pass"""
+        model, decode = self.model, self.decode
+        return [model(**decode(doc)) for doc in docs]
+
+    def dump(self, obj: BaseModel) -> dict:
+        """Turn a model into a document ready to be stored"""
+        return self.encode(obj.model_dump())
+
+_codecs: Dict[type, ModelCodec] = {}
+
+def codec_for(model: Type[BaseModel]) -> ModelCodec:
+    """Get the codec of a model, compiling it on first use"""
+    codec = _codecs.get(model)
+    if codec is None:
+        codec = _codecs[model] = ModelCodec(model)
+    return codec
@@ -0,0 +1,60 @@
+from typing import Dict, Iterable, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CollectionCounters:
+    """Document counts kept in a counters collection, one {_id: name, count} document per collection
+
+    Handlers $inc a counter next to each insert or delete. Writes that bypass the API
+    and failed increments make the counts drift, so reconcile() recounts periodically.
+    """
+
+    def __init__(self, db, names: Iterable[str], collection: str = "counters", reconcile_interval: float = 3600.0):
+        self.db = db
+        self.names = tuple(names)
+        self.collection = collection
+        self.reconcile_interval = reconcile_interval
+        self._reconciler: Optional[asyncio.Task] = None
+
+    async def inc(self, name: str, amount: int = 1):
+        """Record documents added to (or, with a negative amount, removed from) a collection"""
+        await self.db[self.collection].update_one({"_id": name}, {"$inc": {"count": amount}}, upsert=True)
+
+    async def get_all(self) -> Dict[str, int]:
+        """Every count, in one read"""
+        docs = await self.db[self.collection].find({"_id": {"$in": list(self.names)}}).to_list(None)
+        counts = {name: 0 for name in self.names}
+        counts.update({doc["_id"]: doc["count"] for doc in docs})
+        return counts
+
+    async def reconcile(self) -> Dict[str, int]:
+        """Recount every collection and overwrite drifted counters, returning the corrections"""
+        corrections = {}
+        current = await self.get_all()
+        for name in self.names:
+            actual = await self.db[name].count_documents({})
+            if actual != current[name]:
+                corrections[name] = actual - current[name]
+                await self.db[self.collection].update_one({"_id": name}, {"$set": {"count": actual}}, upsert=True)
+        if corrections:
+            logger.warning("Corrected drifted counters: %s", corrections)
+        return corrections
+
+    async def _reconcile_forever(self):
+        while True:
+            try:
+                await self.reconcile()
+            except Exception:
+                logger.exception("Reconciling counters failed")
+            await asyncio.sleep(self.reconcile_interval)
+
+    def start(self):
+        """Reconcile now (which also seeds missing counters) and then periodically"""
+        self._reconciler = asyncio.create_task(self._reconcile_forever())
+
+    def stop(self):
+        if self._reconciler is not None:
+            self._reconciler.cancel()
+            self._reconciler = None
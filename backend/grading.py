@@ -0,0 +1,81 @@
+from bisect import bisect_right
+from typing import List, Tuple
+import numpy as np
+
+# Rules written to two decimals (e.g. 60-79.99 and 80-100) leave gaps this small on purpose
+GAP_TOLERANCE = 0.01
+
+UNGRADED = "N/A"
+
+class GradeTable:
+    """Grade rules compiled for bisect lookups and for grading whole arrays at once
+
+    A percentage gets the rule with the highest min_percentage whose inclusive range
+    covers it, or "N/A", as a scan of the rules by descending minimum would give.
+    """
+
+    def __init__(self, rules: list):
+        self.rules = sorted(rules, key=lambda rule: rule.min_percentage)
+        self.mins = [rule.min_percentage for rule in self.rules]
+        self.maxes = [rule.max_percentage for rule in self.rules]
+        self.overlaps = find_overlaps(self.rules)
+        self.gaps = find_gaps(self.rules)
+        # Rule names by index, with the last slot for percentages no rule covers
+        self._names = np.array([rule.name for rule in self.rules] + [UNGRADED], dtype=object)
+        self._mins = np.array(self.mins, dtype=float)
+        self._maxes = np.array(self.maxes, dtype=float)
+
+    def grade(self, percentage: float) -> str:
+        """Grade of one percentage"""
+        index = bisect_right(self.mins, percentage) - 1
+        while index >= 0:
+            if percentage <= self.maxes[index]:
+                return self.rules[index].name
+            # Without overlaps no lower rule can reach above the one just below
+            if not self.overlaps:
+                break
+            index -= 1
+        return UNGRADED
+
+    def grade_many(self, percentages) -> np.ndarray:
+        """Grades of an array of percentages"""
+        percentages = np.asarray(percentages, dtype=float)
+        if not self.rules:
+            return np.full(percentages.shape, UNGRADED, dtype=object)
+
+        index = np.searchsorted(self._mins, percentages, side="right") - 1
+        covered = (index >= 0) & (percentages <= self._maxes[index.clip(0)])
+        names = self._names[np.where(covered, index, len(self.rules))]
+
+        if self.overlaps:
+            # A lower, overlapping rule may still cover what the nearest one misses
+            for i in np.flatnonzero(~covered & (index > 0)):
+                names[i] = self.grade(percentages[i])
+        return names
+
+    def overlapping(self, min_percentage: float, max_percentage: float) -> list:
+        """Rules whose range shares any percentage with [min_percentage, max_percentage]"""
+        return [rule for rule in self.rules
+                if rule.min_percentage <= max_percentage and min_percentage <= rule.max_percentage]
+
+def find_overlaps(rules: list) -> List[Tuple[str, str]]:
+    """Pairs of rule names whose ranges overlap, for rules sorted by min_percentage"""
+    overlaps = []
+    for i, rule in enumerate(rules):
+        for later in rules[i + 1:]:
+            if later.min_percentage > rule.max_percentage:
+                break
+            overlaps.append((rule.name, later.name))
+    return overlaps
+
+def find_gaps(rules: list) -> List[Tuple[float, float]]:
+    """Parts of 0-100% no rule covers, for rules sorted by min_percentage"""
+    gaps = []
+    covered_to = 0.0
+    for rule in rules:
+        if round(rule.min_percentage - covered_to, 6) > GAP_TOLERANCE:
+            gaps.append((covered_to, rule.min_percentage))
+        covered_to = max(covered_to, rule.max_percentage)
+    if round(100.0 - covered_to, 6) > GAP_TOLERANCE:
+        gaps.append((covered_to, 100.0))
+    return gaps
@@ -0,0 +1,131 @@
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _id_index() -> IndexModel:
+    return IndexModel([("id", ASCENDING)], unique=True)
+
+# Indexes every collection should have, keyed by collection name.
+# List endpoints filter on a prefix and sort on the rest, so their keys end with the
+# endpoint's sort spec (see the paginated_find calls in server.py).
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        _id_index(),
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("role", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "token_versions": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "school_years": [_id_index()],
+    "sections": [_id_index()],
+    "classes": [_id_index()],
+    "subjects": [_id_index()],
+    "exam_types": [_id_index()],
+    "grade_rules": [_id_index()],
+    "fee_types": [_id_index()],
+    "teachers": [
+        _id_index(),
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "students": [
+        _id_index(),
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("roll_no", ASCENDING), ("class_id", ASCENDING), ("school_year_id", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("class_id", ASCENDING), ("section_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("school_year_id", ASCENDING), ("created_at", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "parents": [
+        _id_index(),
+        IndexModel([("user_id", ASCENDING)]),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "timetable": [
+        _id_index(),
+        IndexModel([("day", ASCENDING), ("period_number", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("class_id", ASCENDING), ("section_id", ASCENDING), ("day", ASCENDING), ("period_number", ASCENDING)]),
+        IndexModel([("teacher_id", ASCENDING), ("day", ASCENDING), ("period_number", ASCENDING)]),
+    ],
+    "attendance": [
+        _id_index(),
+        IndexModel([("date", DESCENDING), ("id", ASCENDING)]),
+        IndexModel([("student_id", ASCENDING), ("date", DESCENDING), ("id", ASCENDING)]),
+        IndexModel([("class_id", ASCENDING), ("section_id", ASCENDING), ("date", DESCENDING), ("id", ASCENDING)]),
+        # One record per student, day and subject; /attendance/bulk upserts on it
+        IndexModel([("student_id", ASCENDING), ("date", ASCENDING), ("subject_id", ASCENDING)], unique=True),
+    ],
+    "attendance_months": [
+        IndexModel([("student_id", ASCENDING), ("month", DESCENDING)]),
+        IndexModel([("class_id", ASCENDING), ("section_id", ASCENDING), ("month", DESCENDING)]),
+        IndexModel([("month", DESCENDING), ("_id", ASCENDING)]),
+    ],
+    "attendance_monthly": [
+        IndexModel([("student_id", ASCENDING), ("month", DESCENDING)]),
+        IndexModel([("class_id", ASCENDING), ("section_id", ASCENDING), ("month", DESCENDING)]),
+    ],
+    "attendance_daily": [
+        IndexModel([("class_id", ASCENDING), ("section_id", ASCENDING), ("date", DESCENDING)]),
+    ],
+    "exam_schedules": [
+        _id_index(),
+        IndexModel([("exam_date", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("class_id", ASCENDING), ("exam_type_id", ASCENDING), ("exam_date", ASCENDING), ("id", ASCENDING)]),
+    ],
+    "marks": [
+        _id_index(),
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("student_id", ASCENDING), ("exam_schedule_id", ASCENDING)]),
+        IndexModel([("exam_schedule_id", ASCENDING), ("student_id", ASCENDING)]),
+    ],
+    "fee_structures": [
+        _id_index(),
+        IndexModel([("class_id", ASCENDING), ("school_year_id", ASCENDING)]),
+        IndexModel([("school_year_id", ASCENDING)]),
+    ],
+    "invoices": [
+        _id_index(),
+        IndexModel([("issue_date", DESCENDING), ("id", ASCENDING)]),
+        IndexModel([("student_id", ASCENDING), ("issue_date", DESCENDING), ("id", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("issue_date", DESCENDING), ("id", ASCENDING)]),
+    ],
+    "payments": [
+        _id_index(),
+        IndexModel([("payment_date", DESCENDING), ("id", ASCENDING)]),
+        IndexModel([("student_id", ASCENDING), ("payment_date", DESCENDING), ("id", ASCENDING)]),
+        IndexModel([("invoice_id", ASCENDING), ("payment_date", DESCENDING), ("id", ASCENDING)]),
+    ],
+    "income": [
+        _id_index(),
+        IndexModel([("date", DESCENDING), ("id", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("date", DESCENDING), ("id", ASCENDING)]),
+    ],
+    "expenses": [
+        _id_index(),
+        IndexModel([("date", DESCENDING), ("id", ASCENDING)]),
+        IndexModel([("category", ASCENDING), ("date", DESCENDING), ("id", ASCENDING)]),
+    ],
+}
+
+async def ensure_indexes(db) -> int:
+    """Create any missing registry index, returning how many could not be built
+
+    Existing identical indexes are left alone. A failure (e.g. duplicate values under
+    a unique key, or an index of the same name with other options) is logged and
+    does not stop the remaining indexes or the application from starting.
+    """
+    failures = 0
+    for name, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await db[name].create_indexes([index])
+            except PyMongoError as e:
+                failures += 1
+                logger.error("Could not create index %s on %s: %s", index.document["name"], name, e)
+    return failures
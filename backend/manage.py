@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Maintenance commands for the School Management System database
+
+Usage:
+    python manage.py migrate-dates [--collection NAME] [--batch-size N] [--pause-ms N] [--restart]
+    python manage.py rebuild-rollups
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+
+from codec import codec_for, parse_datetime
+from rollups import rebuild_pipelines
+from models import (
+    UserInDB, SchoolYear, Section, Class, Subject, Teacher, Student, Parent, Settings,
+    TimetableEntry, Attendance, ExamType, ExamSchedule, MarksEntry, GradeRule,
+    FeeType, FeeStructure, Invoice, Payment, Income, Expense
+)
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# Model stored in each collection, used to find its date fields
+COLLECTION_MODELS = {
+    "users": UserInDB,
+    "school_years": SchoolYear,
+    "sections": Section,
+    "classes": Class,
+    "subjects": Subject,
+    "teachers": Teacher,
+    "students": Student,
+    "parents": Parent,
+    "settings": Settings,
+    "timetable": TimetableEntry,
+    "attendance": Attendance,
+    "exam_types": ExamType,
+    "exam_schedules": ExamSchedule,
+    "marks": MarksEntry,
+    "grade_rules": GradeRule,
+    "fee_types": FeeType,
+    "fee_structures": FeeStructure,
+    "invoices": Invoice,
+    "payments": Payment,
+    "income": Income,
+    "expenses": Expense,
+}
+
+def get_db():
+    """Synchronous handle on the configured database"""
+    client = MongoClient(os.environ['MONGO_URL'], tz_aware=True)
+    return client[os.environ['DB_NAME']]
+
+# ============ Date Migration ============
+
+def migrate_collection_dates(db, name: str, batch_size: int, pause_ms: int, restart: bool):
+    """Convert ISO string dates of one collection to BSON datetimes, resuming from the last checkpoint"""
+    fields = codec_for(COLLECTION_MODELS[name]).datetime_fields
+    checkpoint_id = f"migrate-dates:{name}"
+
+    if restart:
+        db.migrations.delete_one({"_id": checkpoint_id})
+    checkpoint = db.migrations.find_one({"_id": checkpoint_id}) or {}
+
+    if checkpoint.get("completed_at"):
+        print(f"{name}: already migrated")
+        return
+
+    last_id = checkpoint.get("last_id")
+    converted = checkpoint.get("converted", 0)
+    skipped = checkpoint.get("skipped", 0)
+    projection = {field: 1 for field in fields}
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = list(db[name].find(query, projection).sort("_id", 1).limit(batch_size))
+        if not batch:
+            break
+
+        operations = []
+        for doc in batch:
+            strings = {field: doc[field] for field in fields if isinstance(doc.get(field), str)}
+            if not strings:
+                continue
+
+            updates = {}
+            for field, value in strings.items():
+                try:
+                    updates[field] = parse_datetime(value)
+                except ValueError:
+                    skipped += 1
+
+            if updates:
+                # Only convert values the application hasn't rewritten since we read them
+                guard = {"_id": doc["_id"], **{field: strings[field] for field in updates}}
+                operations.append(UpdateOne(guard, {"$set": updates}))
+
+        if operations:
+            result = db[name].bulk_write(operations, ordered=False)
+            converted += result.modified_count
+
+        last_id = batch[-1]["_id"]
+        db.migrations.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"last_id": last_id, "converted": converted, "skipped": skipped}},
+            upsert=True
+        )
+        print(f"{name}: {converted} documents converted, {skipped} unparseable values skipped")
+
+        if pause_ms:
+            time.sleep(pause_ms / 1000)
+
+    db.migrations.update_one(
+        {"_id": checkpoint_id},
+        {"$set": {"completed_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    print(f"{name}: done")
+
+def migrate_dates(args):
+    """Convert stored ISO string dates to BSON datetimes in every (or one) collection"""
+    db = get_db()
+    names = [args.collection] if args.collection else list(COLLECTION_MODELS)
+    for name in names:
+        migrate_collection_dates(db, name, args.batch_size, args.pause_ms, args.restart)
+
+# ============ Attendance Rollups ============
+
+def rebuild_rollups(args):
+    """Regenerate the attendance rollup collections from the raw attendance records"""
+    db = get_db()
+    skipped = db.attendance.count_documents({"date": {"$not": {"$type": "date"}}})
+    if skipped:
+        print(f"Skipping {skipped} records with string dates; run migrate-dates first to include them")
+
+    for name, pipeline in rebuild_pipelines().items():
+        started = time.monotonic()
+        # $out swaps the collection in when the aggregation completes, keeping its indexes
+        db.attendance.aggregate(pipeline, allowDiskUse=True)
+        print(f"{name}: {db[name].estimated_document_count()} documents in {time.monotonic() - started:.1f}s")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="School Management System maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser("migrate-dates", help="Convert ISO string dates to BSON datetimes")
+    migrate.add_argument("--collection", choices=sorted(COLLECTION_MODELS), help="Only migrate this collection")
+    migrate.add_argument("--batch-size", type=int, default=500, help="Documents per batch")
+    migrate.add_argument("--pause-ms", type=int, default=0, help="Pause between batches to limit load")
+    migrate.add_argument("--restart", action="store_true", help="Ignore saved checkpoints and start over")
+    migrate.set_defaults(handler=migrate_dates)
+
+    rollups = commands.add_parser("rebuild-rollups", help="Regenerate attendance rollups from raw records")
+    rollups.set_defaults(handler=rebuild_rollups)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
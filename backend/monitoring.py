@@ -0,0 +1,229 @@
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+from pymongo import monitoring
+import bson
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# ASGI scope of the request being served; the router adds the matched route to it in place
+request_scope: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+# Commands that carry application queries; handshakes, auth and session upkeep are ignored
+TRACKED_COMMANDS = {
+    "find", "aggregate", "count", "distinct", "insert", "update", "delete", "findAndModify", "getMore"
+}
+
+def current_route() -> str:
+    """Route template of the request being served, e.g. "GET /api/students/{student_id}" """
+    scope = request_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    return f"{scope.get('method', '')} {path}".strip()
+
+def _shape(value: Any) -> Any:
+    """A filter with its literal values replaced by placeholders"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = _shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return "?"
+
+def command_shape(name: str, command: dict) -> str:
+    """Literal-free description of what a command filters, sorts or matches on"""
+    if name == "find":
+        shape = {"filter": _shape(command.get("filter", {}))}
+        if "sort" in command:
+            shape["sort"] = dict(command["sort"])
+    elif name == "aggregate":
+        # Stage names, with the filters of $match stages
+        shape = {"pipeline": [
+            {stage: _shape(body) if stage == "$match" else "..." for stage, body in step.items()}
+            for step in command.get("pipeline", [])
+        ]}
+    elif name in ("count", "findAndModify"):
+        shape = {"filter": _shape(command.get("query", {}))}
+    elif name == "distinct":
+        shape = {"key": command.get("key"), "filter": _shape(command.get("query", {}))}
+    elif name == "update":
+        shape = {"filter": _shape([update.get("q", {}) for update in command.get("updates", [])])}
+    elif name == "delete":
+        shape = {"filter": _shape([delete.get("q", {}) for delete in command.get("deletes", [])])}
+    else:
+        shape = {}
+    return json.dumps(shape, sort_keys=True, default=str)
+
+def _returned_documents(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if "value" in reply:
+        return 1 if reply["value"] is not None else 0
+    if "values" in reply:
+        return len(reply["values"])
+    return 0
+
+class _ShapeStats:
+    __slots__ = ("count", "total_ms", "max_ms", "documents", "bytes")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.documents = 0
+        self.bytes = 0
+
+class CommandMonitor(monitoring.CommandListener):
+    """Per-route timing of Mongo commands, grouped by query shape
+
+    Register with the client (event_listeners=[monitor]). Callbacks run on Motor's
+    executor threads, which inherit the caller's context and so its request_scope.
+    """
+
+    def __init__(self, slow_ms: float = 100.0, max_shapes: int = 2000, max_cursors: int = 10000):
+        self.slow_ms = slow_ms
+        self.max_shapes = max_shapes
+        self.max_cursors = max_cursors
+        self.dropped = 0
+        self._stats: Dict[Tuple[str, str, str, str], _ShapeStats] = {}
+        self._started: Dict[int, tuple] = {}
+        # getMore batches are charged to the query that opened the cursor
+        self._cursors: Dict[int, Tuple[str, str, str, str]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        name = event.command_name
+        if name == "killCursors":
+            # Cursors closed before they were exhausted, e.g. by an aborted stream
+            with self._lock:
+                for cursor_id in event.command.get("cursors", []):
+                    self._cursors.pop(cursor_id, None)
+            return
+        if name not in TRACKED_COMMANDS:
+            return
+
+        cursor_id = None
+        if name == "getMore":
+            cursor_id = event.command.get("getMore")
+            key = self._cursors.get(cursor_id)
+            if key is None:
+                key = (current_route(), str(event.command.get("collection", "")), name, "{}")
+        else:
+            collection = str(event.command.get(name, ""))
+            key = (current_route(), collection, name, command_shape(name, event.command))
+
+        with self._lock:
+            self._started[event.request_id] = (key, cursor_id)
+
+    def succeeded(self, event):
+        with self._lock:
+            started = self._started.pop(event.request_id, None)
+        if started is None:
+            return
+        key, cursor_id = started
+
+        reply = event.reply
+        cursor = reply.get("cursor")
+        if isinstance(cursor, dict):
+            with self._lock:
+                if cursor.get("id"):
+                    # Past the bound, further batches are recorded under an unknown shape
+                    if cursor["id"] in self._cursors or len(self._cursors) < self.max_cursors:
+                        self._cursors[cursor["id"]] = key
+                elif cursor_id is not None:
+                    # Exhausted
+                    self._cursors.pop(cursor_id, None)
+
+        self._record(
+            key, event.duration_micros / 1000, _returned_documents(reply), len(bson.encode(reply)),
+            executions=0 if cursor_id is not None else 1
+        )
+
+    def failed(self, event):
+        with self._lock:
+            started = self._started.pop(event.request_id, None)
+            if started is not None and started[1] is not None:
+                # A failed getMore (e.g. CursorNotFound) leaves nothing to fetch
+                self._cursors.pop(started[1], None)
+        if started is not None:
+            self._record(started[0], event.duration_micros / 1000, 0, 0, executions=0 if started[1] is not None else 1)
+
+    def _record(self, key, duration_ms: float, documents: int, size: int, executions: int = 1):
+        route, collection, command, shape = key
+        if duration_ms >= self.slow_ms:
+            logger.warning(
+                "Slow %s on %s (%.1f ms, %d docs, %d bytes) from %s: %s",
+                command, collection, duration_ms, documents, size, route, shape
+            )
+
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_shapes:
+                    self.dropped += 1
+                    return
+                stats = self._stats[key] = _ShapeStats()
+            stats.count += executions
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            stats.documents += documents
+            stats.bytes += size
+
+    def slowest(self, limit: int = 10) -> Dict[str, list]:
+        """Top query shapes of every route, slowest on average first
+
+        Time spent fetching further batches of a cursor counts towards the query that opened it.
+        """
+        with self._lock:
+            items = [(key, stats) for key, stats in self._stats.items()]
+
+        routes: Dict[str, list] = {}
+        for (route, collection, command, shape), stats in items:
+            routes.setdefault(route, []).append({
+                "command": command,
+                "collection": collection,
+                "shape": json.loads(shape),
+                "count": stats.count,
+                "avg_ms": round(stats.total_ms / max(stats.count, 1), 3),
+                "max_ms": round(stats.max_ms, 3),
+                "total_ms": round(stats.total_ms, 3),
+                "documents": stats.documents,
+                "bytes": stats.bytes
+            })
+
+        return {
+            route: sorted(shapes, key=lambda shape: shape["avg_ms"], reverse=True)[:limit]
+            for route, shapes in sorted(routes.items())
+        }
+
+    def reset(self):
+        """Forget all recorded timings"""
+        with self._lock:
+            self._stats.clear()
+            self.dropped = 0
+
+class RequestScopeMiddleware:
+    """Pure ASGI middleware exposing the current request scope to the command monitor"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_scope.reset(token)
@@ -0,0 +1,263 @@
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from bson.int64 import Int64
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from attendance import (
+    DUPLICATE_KEY, MAX_UPSERT_ATTEMPTS, STATUSES, as_utc, failure, month_start, next_round, summarize_counts, write_errors
+)
+
+# One document per student, subject and month. Each day takes 3 bits holding a status
+# code (0 = not marked). Days 1-21 live in w0 and days 22-31 in w1, which keeps the
+# sign bit of both Int64 words clear so single days can be rewritten with $bit.
+BITS_PER_DAY = 3
+DAYS_PER_WORD = 21
+DAY_MASK = (1 << BITS_PER_DAY) - 1
+
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES, start=1)}
+CODE_STATUSES = {code: status for status, code in STATUS_CODES.items()}
+
+# Sort order of expanded records, matching GET /attendance
+RECORD_SORT = [("date", -1), ("id", 1)]
+
+def day_slot(day: int) -> Tuple[str, int]:
+    """Word field and bit offset of a day of the month"""
+    word, index = divmod(day - 1, DAYS_PER_WORD)
+    return f"w{word}", index * BITS_PER_DAY
+
+def month_id(student_id: str, subject_id: Optional[str], month: datetime) -> str:
+    return f"{student_id}|{subject_id or ''}|{month:%Y-%m}"
+
+# (day, word index, bit offset) of every day of a month
+_SLOTS = [(day, (day - 1) // DAYS_PER_WORD, ((day - 1) % DAYS_PER_WORD) * BITS_PER_DAY) for day in range(1, 32)]
+
+def unpack_days(doc: dict) -> Dict[int, str]:
+    """Marked days of a month document and their statuses"""
+    days = {}
+    words = (doc.get("w0", 0), doc.get("w1", 0))
+    for day, word, shift in _SLOTS:
+        code = (words[word] >> shift) & DAY_MASK
+        if code:
+            days[day] = CODE_STATUSES[code]
+    return days
+
+def pack_days(days: Dict[int, str]) -> Dict[str, Int64]:
+    """Words of a month holding the given day statuses"""
+    words = {"w0": 0, "w1": 0}
+    for day, status in days.items():
+        field, shift = day_slot(day)
+        words[field] |= STATUS_CODES[status] << shift
+    return {field: Int64(value) for field, value in words.items()}
+
+def expand(doc: dict, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None) -> List[dict]:
+    """Attendance records, shaped like the Attendance model, stored in a month document"""
+    date_from = as_utc(date_from) if date_from else None
+    date_to = as_utc(date_to) if date_to else None
+    month = as_utc(doc["month"])
+    remarks = doc.get("remarks", {})
+    records = []
+    for day, status in unpack_days(doc).items():
+        date = month.replace(day=day)
+        if (date_from and date < date_from) or (date_to and date > date_to):
+            continue
+        records.append({
+            "id": f"{doc['_id']}|{day:02d}",
+            "student_id": doc["student_id"],
+            "class_id": doc["class_id"],
+            "section_id": doc["section_id"],
+            "date": date,
+            "status": status,
+            "subject_id": doc.get("subject_id"),
+            "remarks": remarks.get(str(day)),
+            "marked_by": doc.get("marked_by", ""),
+            "created_at": doc.get("updated_at", date)
+        })
+    return records
+
+def _count(docs: List[dict], date_from: Optional[datetime], date_to: Optional[datetime]) -> dict:
+    counts = {"total": 0}
+    date_from = as_utc(date_from) if date_from else None
+    date_to = as_utc(date_to) if date_to else None
+    for doc in docs:
+        month = as_utc(doc["month"])
+        # Only months at the edges of the range need their days checked
+        partial = (date_from and month < date_from) or (date_to and month_start(date_to) == month)
+        for day, status in unpack_days(doc).items():
+            if partial:
+                date = month.replace(day=day)
+                if (date_from and date < date_from) or (date_to and date > date_to):
+                    continue
+            counts[status] = counts.get(status, 0) + 1
+            counts["total"] += 1
+    return counts
+
+class PackedAttendance:
+    """Attendance kept as bit-packed monthly documents, read and written as ordinary records
+
+    class_id, section_id and marked_by are kept once per month document, so they
+    reflect the most recent mark of that month.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def mark_update(self, record: dict) -> Tuple[dict, dict]:
+        """Filter and upsert update setting one day of a month document, leaving the other days untouched"""
+        date = as_utc(record["date"])
+        month = month_start(date)
+        day = date.day
+        field, shift = day_slot(day)
+
+        update = {
+            # Clear the day's bits, then set its status code
+            "$bit": {field: {
+                "and": Int64(~(DAY_MASK << shift)),
+                "or": Int64(STATUS_CODES[record["status"]] << shift)
+            }},
+            "$set": {
+                "class_id": record["class_id"],
+                "section_id": record["section_id"],
+                "marked_by": record["marked_by"],
+                "updated_at": datetime.now(timezone.utc)
+            },
+            "$setOnInsert": {
+                "student_id": record["student_id"],
+                "subject_id": record.get("subject_id"),
+                "month": month
+            }
+        }
+        if record.get("remarks"):
+            update["$set"][f"remarks.{day}"] = record["remarks"]
+        else:
+            update["$unset"] = {f"remarks.{day}": ""}
+
+        return {"_id": month_id(record["student_id"], record.get("subject_id"), month)}, update
+
+    def record_id(self, record: dict) -> str:
+        """Id under which a marked record is read back"""
+        date = as_utc(record["date"])
+        return f"{month_id(record['student_id'], record.get('subject_id'), month_start(date))}|{date.day:02d}"
+
+    async def mark(self, records: List[dict], chunk_size: int = 500) -> List[dict]:
+        """Store attendance records with one unordered bulk write per chunk, returning a result per record
+
+        Results are shaped as upsert_records returns them. A record is "updated" when
+        the day was already marked in its month document, as read just before the write.
+        """
+        results: List[Optional[dict]] = [None] * len(records)
+        attempts = [0] * len(records)
+        marks = [self.mark_update(record) for record in records]
+        slots = [day_slot(as_utc(record["date"]).day) for record in records]
+
+        for offset in range(0, len(records), chunk_size):
+            pending = list(range(offset, min(offset + chunk_size, len(records))))
+            while pending:
+                # Two marks of one day must not share an unordered write
+                batch, later = next_round(pending, lambda index: (marks[index][0]["_id"], slots[index]))
+                retry = []
+                try:
+                    ids = list({marks[index][0]["_id"] for index in batch})
+                    words = {doc["_id"]: doc async for doc in self.collection.find({"_id": {"$in": ids}}, {"w0": 1, "w1": 1})}
+                    for index in batch:
+                        attempts[index] += 1
+                    try:
+                        result = await self.collection.bulk_write(
+                            [UpdateOne(key, update, upsert=True) for key, update in (marks[index] for index in batch)],
+                            ordered=False
+                        )
+                        errors, upserted = {}, result.upserted_ids
+                    except BulkWriteError as e:
+                        errors, upserted = write_errors(e)
+                except PyMongoError as e:
+                    for index in pending:
+                        results[index] = failure(index, str(e))
+                    break
+
+                for position, index in enumerate(batch):
+                    error = errors.get(position)
+                    if error is not None:
+                        # A concurrent mark created the month document first; the retry updates it
+                        if error.get("code") == DUPLICATE_KEY and attempts[index] < MAX_UPSERT_ATTEMPTS:
+                            retry.append(index)
+                        else:
+                            results[index] = failure(index, error.get("errmsg", "write failed"))
+                        continue
+                    field, shift = slots[index]
+                    previous = words.get(marks[index][0]["_id"], {})
+                    marked = position not in upserted and (previous.get(field, 0) >> shift) & DAY_MASK
+                    results[index] = {"index": index, "status": "updated" if marked else "inserted",
+                                      "id": self.record_id(records[index])}
+                pending = sorted(retry + later)
+
+        return results
+
+    def _month_query(self, query: dict, date_from: Optional[datetime], date_to: Optional[datetime]) -> dict:
+        month_query = dict(query)
+        months = {}
+        if date_from:
+            months["$gte"] = month_start(date_from)
+        if date_to:
+            months["$lte"] = month_start(date_to)
+        if months:
+            month_query["month"] = months
+        return month_query
+
+    async def _months(self, query: dict, date_from: Optional[datetime], date_to: Optional[datetime]) -> List[dict]:
+        return await self.collection.find(self._month_query(query, date_from, date_to)).to_list(None)
+
+    async def iter_records_by_month(
+        self, query: dict, date_from: Optional[datetime], date_to: Optional[datetime]
+    ) -> AsyncIterator[List[dict]]:
+        """Expanded records month by month, newest month first, each month in RECORD_SORT order"""
+        cursor = self.collection.find(self._month_query(query, date_from, date_to)).sort([("month", -1), ("_id", 1)])
+        current, records = None, []
+        async for doc in cursor:
+            if current is not None and doc["month"] != current:
+                yield sorted(records, key=lambda r: (-r["date"].timestamp(), r["id"]))
+                records = []
+            current = doc["month"]
+            records.extend(expand(doc, date_from, date_to))
+        if records:
+            yield sorted(records, key=lambda r: (-r["date"].timestamp(), r["id"]))
+
+    async def find_page(
+        self,
+        query: dict,
+        date_from: Optional[datetime],
+        date_to: Optional[datetime],
+        limit: int,
+        after: Optional[list] = None
+    ) -> Tuple[List[dict], bool]:
+        """One page of records in RECORD_SORT order after a keyset position, and whether more follow"""
+        page_to = date_to
+        if after is not None:
+            after_date, after_id = as_utc(after[0]), after[1]
+            # Records dated after the cursor position were on earlier pages
+            page_to = min(date_to, after_date) if date_to else after_date
+
+        page = []
+        async for records in self.iter_records_by_month(query, date_from, page_to):
+            for record in records:
+                if after is not None and record["date"] == after_date and record["id"] <= after_id:
+                    continue
+                page.append(record)
+                if len(page) > limit:
+                    return page[:limit], True
+        return page, False
+
+    async def count(self, query: dict, date_from: Optional[datetime], date_to: Optional[datetime]) -> int:
+        """Number of records matching a query"""
+        return _count(await self._months(query, date_from, date_to), date_from, date_to)["total"]
+
+    async def stats(self, query: dict, date_from: Optional[datetime], date_to: Optional[datetime]) -> dict:
+        """Attendance statistics, as attendance.attendance_stats computes them for records"""
+        return summarize_counts(_count(await self._months(query, date_from, date_to), date_from, date_to))
+
+    async def student_counts(
+        self, query: dict, date_from: Optional[datetime], date_to: Optional[datetime]
+    ) -> Dict[str, dict]:
+        """Per-status counts per student"""
+        by_student: Dict[str, List[dict]] = {}
+        for doc in await self._months(query, date_from, date_to):
+            by_student.setdefault(doc["student_id"], []).append(doc)
+        return {student_id: _count(docs, date_from, date_to) for student_id, docs in by_student.items()}
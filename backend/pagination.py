@@ -0,0 +1,133 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import List, Optional, Tuple
+from bson import BSON, CodecOptions
+from bson.errors import BSONError
+from fastapi import HTTPException, Query
+import binascii
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+# Sort specs are lists of (field, direction) pairs ending with a unique tie-breaker
+SortSpec = List[Tuple[str, int]]
+
+_CURSOR_CODEC_OPTIONS = CodecOptions(tz_aware=True)
+
+class Page:
+    """Keyset pagination query parameters shared by all list endpoints"""
+
+    def __init__(
+        self,
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+        cursor: Optional[str] = None,
+        include_total: bool = False
+    ):
+        self.limit = limit
+        self.cursor = cursor
+        self.include_total = include_total
+
+def encode_cursor(sort: SortSpec, doc: dict) -> str:
+    """Opaque cursor pointing just after doc in sort order"""
+    # BSON keeps datetimes and numbers exact, unlike JSON
+    raw = BSON.encode({"k": [doc.get(field) for field, _ in sort]})
+    return urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(sort: SortSpec, cursor: str) -> list:
+    """Sort key values stored in a cursor"""
+    try:
+        raw = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = BSON(raw).decode(_CURSOR_CODEC_OPTIONS)["k"]
+    except (binascii.Error, BSONError, KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+def _after(field: str, direction: int, value, mixed_dates: bool) -> List[dict]:
+    """Conditions on one field selecting values strictly after value in sort order"""
+    conditions = [{field: {"$gt" if direction == 1 else "$lt": value}}]
+    # $gt/$lt only compare within a BSON type, but a sort orders strings before dates,
+    # so while legacy ISO strings share a field with datetimes the other type must be
+    # selected whole when the page boundary falls on its side
+    if mixed_dates and isinstance(value, datetime) and direction == -1:
+        conditions.append({field: {"$type": "string"}})
+    elif mixed_dates and isinstance(value, str) and direction == 1:
+        conditions.append({field: {"$type": "date"}})
+    return conditions
+
+def keyset_filter(sort: SortSpec, values: list) -> dict:
+    """Clause selecting documents strictly after the given sort key values"""
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        prefix = {prefix_field: value for (prefix_field, _), value in zip(sort[:i], values[:i])}
+        # The unique tie-breaker ending the sort is never a date
+        mixed_dates = i < len(sort) - 1
+        clauses.extend({**prefix, **condition} for condition in _after(field, direction, values[i], mixed_dates))
+    return {"$or": clauses}
+
+class PageCursor:
+    """Documents of one page, read from a cursor over limit + 1 rows
+
+    The row after the page is never returned; it only tells whether another page
+    follows. Once the page has been read, headers() holds its X-Next-Cursor.
+    """
+
+    def __init__(self, cursor, sort: SortSpec, limit: int, added: List[str]):
+        self.cursor = cursor
+        self.sort = sort
+        self.limit = limit
+        self.added = added
+        self.next_cursor: Optional[str] = None
+
+    async def __aiter__(self):
+        read, last = 0, None
+        async for doc in self.cursor:
+            if read == self.limit:
+                self.next_cursor = encode_cursor(self.sort, last)
+                break
+            read += 1
+            last = {field: doc.get(field) for field, _ in self.sort}
+            for field in self.added:
+                doc.pop(field, None)
+            yield doc
+
+    async def to_list(self, length: Optional[int] = None) -> List[dict]:
+        return [doc async for doc in self]
+
+    def headers(self) -> dict:
+        return {NEXT_CURSOR_HEADER: self.next_cursor} if self.next_cursor else {}
+
+async def paginated_find(collection, query: dict, sort: SortSpec, page: Page, projection: dict = None):
+    """Cursor over one page of a keyset-paginated query, plus the pagination headers known up front"""
+    if projection is None:
+        projection = {"_id": 0}
+
+    page_query = query
+    if page.cursor:
+        after = keyset_filter(sort, decode_cursor(sort, page.cursor))
+        page_query = {"$and": [query, after]} if query else after
+
+    # The next cursor is built from the last row, so an inclusion projection must carry the sort keys
+    added = []
+    if any(value == 1 for value in projection.values()):
+        added = [field for field, _ in sort if field not in projection]
+        projection = {**projection, **{field: 1 for field in added}}
+
+    # One extra row tells whether another page follows
+    cursor = collection.find(page_query, projection).sort(sort).limit(page.limit + 1)
+
+    headers = {}
+    if page.include_total:
+        # Unfiltered totals come from collection metadata and may be slightly stale
+        if query:
+            total = await collection.count_documents(query)
+        else:
+            total = await collection.estimated_document_count()
+        headers[TOTAL_COUNT_HEADER] = str(total)
+
+    return PageCursor(cursor, sort, page.limit, added), headers
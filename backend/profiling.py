@@ -0,0 +1,208 @@
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional
+import asyncio
+import os
+import re
+import sys
+import threading
+import uuid
+import weakref
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+
+_PROFILE_NAME = re.compile(r"^[\w-]+$")
+
+def _collapse(frame) -> str:
+    """One stack in collapsed format, outermost frame first"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+# Profile id of the request being profiled, inherited by the tasks it starts
+_profiled_request: ContextVar[Optional[str]] = ContextVar("profiled_request", default=None)
+
+# Profile id of every task run on behalf of a profiled request
+_task_profiles: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+
+_tracked_loops: "weakref.WeakSet[asyncio.AbstractEventLoop]" = weakref.WeakSet()
+
+def _track_tasks(loop: asyncio.AbstractEventLoop):
+    """Wrap the loop's task factory so tasks started by a profiled request count towards it
+
+    Streamed response bodies, for example, are sent from a task of their own.
+    """
+    if loop in _tracked_loops:
+        return
+    previous = loop.get_task_factory()
+
+    def factory(loop, coro, **kwargs):
+        task = previous(loop, coro, **kwargs) if previous else asyncio.Task(coro, loop=loop, **kwargs)
+        profile_id = _profiled_request.get()
+        if profile_id is not None:
+            _task_profiles[task] = profile_id
+        return task
+
+    loop.set_task_factory(factory)
+    _tracked_loops.add(loop)
+
+class SamplingProfiler:
+    """Samples the stack of one thread from a background thread
+
+    Given a loop and a profile id, only samples taken while a task of that profiled
+    request is running on the loop are kept, so time the request spends awaiting,
+    the idle selector and other requests served meanwhile stay out of the profile.
+    """
+
+    def __init__(
+        self,
+        thread_id: int,
+        interval: float = 0.002,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        profile_id: Optional[str] = None
+    ):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.loop = loop
+        self.profile_id = profile_id
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _profiled_task(self) -> Optional[asyncio.Task]:
+        task = asyncio.current_task(self.loop)
+        return task if task is not None and _task_profiles.get(task) == self.profile_id else None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            task = self._profiled_task() if self.loop is not None else None
+            if self.loop is not None and task is None:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            # Drop samples where the loop switched tasks while the stack was read
+            if frame is not None and (self.loop is None or self._profiled_task() is task):
+                self.samples[_collapse(frame)] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+class ProfileStore:
+    """Collapsed-stack files (flamegraph.pl / speedscope input), oldest pruned beyond a limit"""
+
+    def __init__(self, directory: Path, keep: int = 100):
+        self.directory = Path(directory)
+        self.keep = keep
+
+    def save(self, samples: Counter, name: str) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        lines = [f"{stack} {count}" for stack, count in samples.most_common()]
+        path.write_text("\n".join(lines) + "\n")
+
+        profiles = sorted(self.directory.glob("*.collapsed"), key=lambda p: p.stat().st_mtime)
+        for old in profiles[:-self.keep]:
+            old.unlink(missing_ok=True)
+        return path
+
+    def list(self) -> List[dict]:
+        """Stored profiles, newest first"""
+        if not self.directory.exists():
+            return []
+        profiles = sorted(self.directory.glob("*.collapsed"), key=lambda p: p.stat().st_mtime, reverse=True)
+        return [
+            {
+                "name": path.name,
+                "size": path.stat().st_size,
+                "created_at": datetime.fromtimestamp(path.stat().st_mtime, timezone.utc)
+            }
+            for path in profiles
+        ]
+
+    def read(self, name: str) -> Optional[str]:
+        """Contents of a stored profile by file name or profile id, or None if there is none"""
+        name = name[:-len(".collapsed")] if name.endswith(".collapsed") else name
+        if not _PROFILE_NAME.match(name) or not self.directory.exists():
+            return None
+        # Ids are the last part of the file name
+        matches = list(self.directory.glob(f"{name}.collapsed")) or list(self.directory.glob(f"*-{name}.collapsed"))
+        if not matches:
+            return None
+        return matches[0].read_text()
+
+def profile_name(method: str, route: str, profile_id: str) -> str:
+    """File name of a profile, e.g. 20240101T120000-get-api-report-card-student_id-<id>.collapsed"""
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+    slug = re.sub(r"[^\w]+", "-", route).strip("-") or "root"
+    return f"{timestamp}-{method.lower()}-{slug}-{profile_id}.collapsed"
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware profiling requests sent with an X-Profile header
+
+    authorize receives the Authorization header and decides whether the caller may
+    profile; unauthorized requests run normally. Requests without the header only
+    pay for one header scan.
+    """
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        authorize: Callable[[Optional[str]], Awaitable[bool]],
+        interval: float = 0.002
+    ):
+        self.app = app
+        self.store = store
+        self.authorize = authorize
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if not any(name == PROFILE_HEADER for name, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        authorization = dict(scope["headers"]).get(b"authorization")
+        if not await self.authorize(authorization.decode("latin-1") if authorization else None):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = uuid.uuid4().hex[:12]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", [])) + [(PROFILE_ID_HEADER, profile_id.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        loop = asyncio.get_running_loop()
+        _track_tasks(loop)
+        _task_profiles[asyncio.current_task()] = profile_id
+        token = _profiled_request.set(profile_id)
+
+        profiler = SamplingProfiler(threading.get_ident(), self.interval, loop, profile_id)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            samples = profiler.stop()
+            _profiled_request.reset(token)
+            _task_profiles.pop(asyncio.current_task(), None)
+            # Unmatched paths are client-controlled, so only route templates go into file names
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.store.save(samples, profile_name(scope["method"], route, profile_id))
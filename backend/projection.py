@@ -0,0 +1,32 @@
+from functools import lru_cache
+from typing import Optional, Tuple, Type
+from fastapi import HTTPException
+from pydantic import BaseModel, ConfigDict, create_model
+
+def parse_fields(model: Type[BaseModel], fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Validate a comma-separated fields= parameter against a model; None means all fields"""
+    if not fields:
+        return None
+
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in model.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    # id is always returned so rows can still be told apart and paginated
+    if "id" in model.model_fields and "id" not in names:
+        names = ("id",) + names
+    return names
+
+def projection_for(names: Tuple[str, ...]) -> dict:
+    """Mongo projection returning only the selected fields"""
+    return {"_id": 0, **{name: 1 for name in names}}
+
+@lru_cache(maxsize=256)
+def partial_model(model: Type[BaseModel], names: Tuple[str, ...]) -> Type[BaseModel]:
+    """Response model trimmed to the selected fields"""
+    return create_model(
+        f"{model.__name__}Fields",
+        __config__=ConfigDict(extra="ignore"),
+        **{name: (Optional[model.model_fields[name].annotation], None) for name in names}
+    )
@@ -0,0 +1,145 @@
+from typing import Dict, List, Optional
+import numpy as np
+
+from grading import GradeTable
+
+def rank_scores(scores: np.ndarray) -> Dict[str, np.ndarray]:
+    """Rankings of scores (higher is better), all computed in one vectorised pass
+
+    - competition: 1 + number of higher scores ("1224" ranking)
+    - dense: 1 + number of distinct higher scores ("1223" ranking)
+    - percentile: share of scores below, counting ties as half below, in percent
+    - z_score: standard deviations from the mean (0 when all scores are equal)
+    """
+    scores = np.asarray(scores, dtype=float)
+    if scores.size == 0:
+        empty = np.empty(0)
+        return {"competition": empty.astype(int), "dense": empty.astype(int), "percentile": empty, "z_score": empty}
+
+    ascending = np.sort(scores)
+    below = np.searchsorted(ascending, scores, side="left")
+    at_or_below = np.searchsorted(ascending, scores, side="right")
+
+    distinct = np.unique(ascending)
+    distinct_above = distinct.size - np.searchsorted(distinct, scores, side="right")
+
+    std = scores.std()
+    return {
+        "competition": scores.size - at_or_below + 1,
+        "dense": distinct_above + 1,
+        "percentile": (below + (at_or_below - below) / 2) / scores.size * 100,
+        "z_score": (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+    }
+
+class ScheduleRanking:
+    """Marks of one exam schedule and their rankings; students marked absent are not ranked"""
+
+    def __init__(self, schedule: dict, marks: List[dict]):
+        self.schedule_id = schedule["id"]
+        self.subject_id = schedule["subject_id"]
+        self.total_marks = float(schedule["total_marks"])
+
+        entries: Dict[str, dict] = {}
+        for entry in marks:
+            # One entry per student, the first as the report card uses
+            entries.setdefault(entry["student_id"], entry)
+        present = [entry for entry in entries.values() if not entry.get("is_absent")]
+
+        self.absent = [student_id for student_id, entry in entries.items() if entry.get("is_absent")]
+        self.student_ids = np.array([entry["student_id"] for entry in present], dtype=object)
+        self.marks = np.array([entry["marks_obtained"] for entry in present], dtype=float)
+        self.ranks = rank_scores(self.marks)
+
+    def rows(self, grades: Optional[GradeTable] = None) -> List[dict]:
+        """Ranked students, best first, with their grade if a grade table is given"""
+        percentages = self.marks / self.total_marks * 100 if self.total_marks else np.zeros_like(self.marks)
+        return ranking_rows(self.student_ids, self.marks, percentages, self.ranks, self.absent, grades)
+
+def ranking_rows(
+    student_ids: np.ndarray,
+    marks: np.ndarray,
+    percentages: np.ndarray,
+    ranks: Dict[str, np.ndarray],
+    absent: Optional[List[str]] = None,
+    grades: Optional[GradeTable] = None
+) -> List[dict]:
+    order = np.lexsort((student_ids.astype(str), ranks["competition"])) if student_ids.size else []
+    rows = [
+        {
+            "student_id": student_ids[i],
+            "marks_obtained": float(marks[i]),
+            "percentage": round(float(percentages[i]), 2),
+            "rank": int(ranks["competition"][i]),
+            "dense_rank": int(ranks["dense"][i]),
+            "percentile": round(float(ranks["percentile"][i]), 2),
+            "z_score": round(float(ranks["z_score"][i]), 3)
+        }
+        for i in order
+    ]
+    if grades is not None:
+        for row, grade in zip(rows, grades.grade_many(percentages[order])):
+            row["grade"] = grade
+    rows.extend(
+        {"student_id": student_id, "marks_obtained": None, "percentage": None, "rank": None,
+         "dense_rank": None, "percentile": None, "z_score": None, "absent": True}
+        for student_id in sorted(absent or [])
+    )
+    return rows
+
+def overall_rows(rankings: List[ScheduleRanking], grades: Optional[GradeTable] = None) -> List[dict]:
+    """Ranking on marks summed over several schedules, as a percentage of the marks possible
+
+    Like the report card, a student's total only counts schedules they have marks for.
+    """
+    if not rankings:
+        return []
+    student_ids = np.unique(np.concatenate([ranking.student_ids for ranking in rankings]).astype(str))
+    obtained = np.zeros(student_ids.size)
+    possible = np.zeros(student_ids.size)
+    for ranking in rankings:
+        positions = np.searchsorted(student_ids, ranking.student_ids.astype(str))
+        np.add.at(obtained, positions, ranking.marks)
+        np.add.at(possible, positions, ranking.total_marks)
+
+    percentages = np.divide(obtained * 100, possible, out=np.zeros_like(obtained), where=possible > 0)
+    return ranking_rows(student_ids.astype(object), obtained, percentages, rank_scores(percentages), grades=grades)
+
+class RankingCache:
+    """Rankings of exam schedules, loaded from db.marks and kept in a cache per worker
+
+    Marks writes call invalidate(), which drops the schedule's rankings and bumps its
+    generation. Rankings loaded while their schedule was invalidated are returned
+    but not kept, as they may be built from marks read before the write.
+    """
+
+    def __init__(self, db, cache):
+        self.db = db
+        self.cache = cache
+        self._generations: Dict[str, int] = {}
+
+    def invalidate(self, schedule_id: str):
+        self.cache.pop(schedule_id)
+        self._generations[schedule_id] = self._generations.get(schedule_id, 0) + 1
+
+    async def rankings(self, schedules: List[dict]) -> List[ScheduleRanking]:
+        """Rankings of exam schedules, loading the marks of all uncached ones in one query"""
+        rankings = {schedule["id"]: self.cache.get(schedule["id"]) for schedule in schedules}
+        missing = [schedule for schedule in schedules if rankings[schedule["id"]] is None]
+        if not missing:
+            return [rankings[schedule["id"]] for schedule in schedules]
+
+        generations = {schedule["id"]: self._generations.get(schedule["id"], 0) for schedule in missing}
+        marks = await self.db.marks.find(
+            {"exam_schedule_id": {"$in": [schedule["id"] for schedule in missing]}},
+            {"_id": 0, "exam_schedule_id": 1, "student_id": 1, "marks_obtained": 1, "is_absent": 1}
+        ).to_list(None)
+        by_schedule: Dict[str, List[dict]] = {}
+        for entry in marks:
+            by_schedule.setdefault(entry["exam_schedule_id"], []).append(entry)
+
+        for schedule in missing:
+            rankings[schedule["id"]] = ScheduleRanking(schedule, by_schedule.get(schedule["id"], []))
+            if self._generations.get(schedule["id"], 0) == generations[schedule["id"]]:
+                self.cache.set(schedule["id"], rankings[schedule["id"]])
+
+        return [rankings[schedule["id"]] for schedule in schedules]
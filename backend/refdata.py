@@ -0,0 +1,99 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel
+from codec import codec_for
+import asyncio
+import time
+
+class _Snapshot:
+    """One collection as loaded at a given version"""
+
+    def __init__(self, items: List[BaseModel], version: int):
+        self.items = items
+        self.by_id = {item.id: item for item in items if hasattr(item, "id")}
+        self.version = version
+        self.loaded_at = time.monotonic()
+        # Values computed from the items, dropped with the snapshot when it is reloaded
+        self.derived: Dict[str, Any] = {}
+
+class ReferenceData:
+    """Small, rarely written collections held in memory as models
+
+    A snapshot is reloaded when its collection's version moves on, which covers
+    writes from other workers, or when it is older than the TTL as a safety net
+    against writes that bypass the API.
+    """
+
+    def __init__(self, db, versions, collections: Dict[str, Tuple[Type[BaseModel], list]], ttl: float = 300.0):
+        self.db = db
+        self.versions = versions
+        self.collections = collections
+        self.ttl = ttl
+        self.loads = 0
+        self.hits = 0
+        self._snapshots: Dict[str, _Snapshot] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _current(self, name: str) -> Optional[_Snapshot]:
+        snapshot = self._snapshots.get(name)
+        if snapshot is None:
+            return None
+        if snapshot.version != self.versions.get(name):
+            return None
+        if time.monotonic() - snapshot.loaded_at > self.ttl:
+            return None
+        return snapshot
+
+    async def _snapshot(self, name: str) -> _Snapshot:
+        snapshot = self._current(name)
+        if snapshot is not None:
+            self.hits += 1
+            return snapshot
+
+        # One load per collection at a time; concurrent readers wait for it
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            snapshot = self._current(name)
+            if snapshot is not None:
+                self.hits += 1
+                return snapshot
+
+            model, sort = self.collections[name]
+            # Read the version first so a write landing during the load forces another one
+            version = self.versions.get(name)
+            cursor = self.db[name].find({}, {"_id": 0})
+            if sort:
+                cursor = cursor.sort(sort)
+            docs = await cursor.to_list(None)
+
+            snapshot = _Snapshot(codec_for(model).load_many(docs), version)
+            self._snapshots[name] = snapshot
+            self.loads += 1
+            return snapshot
+
+    async def all(self, name: str) -> List[BaseModel]:
+        """Every document of a collection, in its configured order"""
+        return (await self._snapshot(name)).items
+
+    async def get(self, name: str, item_id: str) -> Optional[BaseModel]:
+        """One document by id"""
+        return (await self._snapshot(name)).by_id.get(item_id)
+
+    async def derived(self, name: str, key: str, build: Callable[[List[BaseModel]], Any]) -> Any:
+        """A value built from a collection's documents, rebuilt only when the collection reloads"""
+        snapshot = await self._snapshot(name)
+        if key not in snapshot.derived:
+            snapshot.derived[key] = build(snapshot.items)
+        return snapshot.derived[key]
+
+    def invalidate(self, name: str):
+        """Drop a collection so the next read reloads it"""
+        self._snapshots.pop(name, None)
+
+    def stats(self) -> dict:
+        """Loaded collection sizes and hit/load counters"""
+        return {
+            "collections": {name: len(snapshot.items) for name, snapshot in self._snapshots.items()},
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "loads": self.loads
+        }
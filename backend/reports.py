@@ -0,0 +1,144 @@
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from grading import GradeTable
+
+def compose_report_card(
+    student: dict,
+    schedules: List[dict],
+    marks_by_schedule: Dict[str, dict],
+    subjects: Dict[str, object],
+    grades: GradeTable
+) -> dict:
+    """A student's report card from already loaded schedules, marks, subjects and grade table"""
+    card, overall_percentage = _ungraded_report_card(student, schedules, marks_by_schedule, subjects)
+    card["grade"] = grades.grade(overall_percentage)
+    return card
+
+def _ungraded_report_card(student, schedules, marks_by_schedule, subjects) -> Tuple[dict, float]:
+    results = []
+    total_marks_obtained = 0
+    total_marks_possible = 0
+
+    for schedule in schedules:
+        marks = marks_by_schedule.get(schedule['id'])
+        if not marks:
+            continue
+
+        total_marks_obtained += marks['marks_obtained']
+        total_marks_possible += schedule['total_marks']
+
+        subject = subjects.get(schedule['subject_id'])
+        results.append({
+            "subject_name": subject.name if subject else "Unknown",
+            "subject_code": subject.code if subject else "",
+            "marks_obtained": marks['marks_obtained'],
+            "total_marks": schedule['total_marks'],
+            "percentage": round((marks['marks_obtained'] / schedule['total_marks'] * 100), 2),
+            "remarks": marks.get('remarks', '')
+        })
+
+    overall_percentage = (total_marks_obtained / total_marks_possible * 100) if total_marks_possible > 0 else 0
+
+    return {
+        "student": student,
+        "results": results,
+        "total_marks_obtained": total_marks_obtained,
+        "total_marks_possible": total_marks_possible,
+        "overall_percentage": round(overall_percentage, 2)
+    }, overall_percentage
+
+async def load_report_card(
+    db, student_id: str, exam_type_id: Optional[str] = None
+) -> Optional[Tuple[dict, List[dict], Dict[str, dict]]]:
+    """Student, exam schedules and marks behind a report card, in three queries
+
+    Returns None if the student does not exist.
+    """
+    student = await db.students.find_one({"id": student_id}, {"_id": 0})
+    if not student:
+        return None
+
+    query = {"class_id": student['class_id']}
+    if exam_type_id:
+        query["exam_type_id"] = exam_type_id
+    schedules = await db.exam_schedules.find(query, {"_id": 0}).to_list(None)
+
+    marks_by_schedule: Dict[str, dict] = {}
+    if schedules:
+        marks = await db.marks.find({
+            "student_id": student_id,
+            "exam_schedule_id": {"$in": [schedule['id'] for schedule in schedules]}
+        }, {"_id": 0}).to_list(None)
+        for entry in marks:
+            # Keep the first entry per schedule, as a find_one per schedule would
+            marks_by_schedule.setdefault(entry['exam_schedule_id'], entry)
+
+    return student, schedules, marks_by_schedule
+
+def compose_report_cards(
+    students: List[dict],
+    schedules: List[dict],
+    marks: List[dict],
+    subjects: Dict[str, object],
+    grades: GradeTable
+) -> List[dict]:
+    """Report cards of several students from their marks, loaded together and graded in one pass"""
+    marks_by_student: Dict[str, Dict[str, dict]] = {}
+    for entry in marks:
+        marks_by_student.setdefault(entry['student_id'], {}).setdefault(entry['exam_schedule_id'], entry)
+
+    cards, percentages = [], []
+    for student in students:
+        card, overall_percentage = _ungraded_report_card(
+            student, schedules, marks_by_student.get(student['id'], {}), subjects)
+        cards.append(card)
+        percentages.append(overall_percentage)
+    for card, grade in zip(cards, grades.grade_many(percentages)):
+        card["grade"] = grade
+    return cards
+
+async def iter_class_report_cards(
+    db,
+    class_id: str,
+    section_id: Optional[str],
+    exam_type_id: Optional[str],
+    subjects: Dict[str, object],
+    grades: GradeTable,
+    batch_size: int = 500
+) -> AsyncIterator[dict]:
+    """Report cards of every student in a class (or one section), in student list order
+
+    Schedules are loaded once. Students are read in batches, with one marks query
+    per batch, so memory stays bounded and the first cards go out early.
+    """
+    query = {"class_id": class_id}
+    if exam_type_id:
+        query["exam_type_id"] = exam_type_id
+    schedules = await db.exam_schedules.find(query, {"_id": 0}).to_list(None)
+    schedule_ids = [schedule['id'] for schedule in schedules]
+
+    student_query = {"class_id": class_id}
+    if section_id:
+        student_query["section_id"] = section_id
+    cursor = db.students.find(student_query, {"_id": 0}).sort([("created_at", 1), ("id", 1)])
+
+    batch: List[dict] = []
+    async for student in cursor:
+        batch.append(student)
+        if len(batch) < batch_size:
+            continue
+        for card in await _batch_report_cards(db, batch, schedules, schedule_ids, subjects, grades):
+            yield card
+        batch = []
+    if batch:
+        for card in await _batch_report_cards(db, batch, schedules, schedule_ids, subjects, grades):
+            yield card
+
+async def _batch_report_cards(db, students, schedules, schedule_ids, subjects, grades) -> List[dict]:
+    marks = []
+    if schedule_ids:
+        marks = await db.marks.find({
+            "student_id": {"$in": [student['id'] for student in students]},
+            "exam_schedule_id": {"$in": schedule_ids}
+        }, {"_id": 0, "student_id": 1, "exam_schedule_id": 1, "marks_obtained": 1, "remarks": 1}).to_list(None)
+    return compose_report_cards(students, schedules, marks, subjects, grades)
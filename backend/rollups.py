@@ -0,0 +1,223 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from pymongo import UpdateOne
+from attendance import STATUSES, as_utc, month_start, status_count_fields
+
+MONTHLY_COLLECTION = "attendance_monthly"
+DAILY_COLLECTION = "attendance_daily"
+
+# Per-status counts kept in every rollup document, next to "total"
+COUNT_FIELDS = ["total"] + STATUSES
+
+def next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+def day_start(value: datetime) -> datetime:
+    return as_utc(value).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def monthly_key(record: dict) -> Tuple[str, dict]:
+    """Rollup id and identifying fields of the (student, section, month) a record counts towards"""
+    month = month_start(record["date"])
+    fields = {
+        "student_id": record["student_id"],
+        "class_id": record["class_id"],
+        "section_id": record["section_id"],
+        "month": month
+    }
+    return f"{record['student_id']}|{record['class_id']}|{record['section_id']}|{month:%Y-%m}", fields
+
+def daily_key(record: dict) -> Tuple[str, dict]:
+    """Rollup id and identifying fields of the (section, day) a record counts towards"""
+    day = day_start(record["date"])
+    fields = {"class_id": record["class_id"], "section_id": record["section_id"], "date": day}
+    return f"{record['class_id']}|{record['section_id']}|{day:%Y-%m-%d}", fields
+
+def split_range(
+    date_from: Optional[datetime], date_to: Optional[datetime]
+) -> Tuple[Optional[Tuple[Optional[datetime], Optional[datetime]]], List[Tuple[datetime, datetime]]]:
+    """Split [date_from, date_to] into whole months and the partial months at its edges
+
+    Returns the half-open [start, end) month range served by monthly rollups (None
+    bounds are open, and None means no whole month) and the inclusive date ranges
+    that have to be counted from raw records.
+    """
+    date_from = as_utc(date_from) if date_from else None
+    date_to = as_utc(date_to) if date_to else None
+
+    start = None
+    if date_from:
+        start = month_start(date_from)
+        if start != date_from:
+            start = next_month(start)
+
+    end = None
+    if date_to:
+        end = month_start(date_to)
+        # Records are dated by day, so a range ending on the last day of a month (a
+        # date-only 2024-03-31 parses to midnight) covers that month whole
+        if date_to >= next_month(end) - timedelta(days=1):
+            end = next_month(end)
+
+    if start and end and start >= end:
+        return None, [(date_from, date_to)]
+
+    edges = []
+    if date_from and date_from < start:
+        edges.append((date_from, start - timedelta(microseconds=1)))
+    if date_to and end <= date_to:
+        edges.append((end, date_to))
+    return (start, end), edges
+
+def _add_counts(total: dict, counts: dict):
+    for field in COUNT_FIELDS:
+        total[field] = total.get(field, 0) + counts.get(field, 0)
+
+def _sum_fields() -> dict:
+    """$group accumulators adding up the counts of rollup documents"""
+    return {field: {"$sum": f"${field}"} for field in COUNT_FIELDS}
+
+def rebuild_pipelines() -> Dict[str, List[dict]]:
+    """Aggregations over raw attendance that regenerate each rollup collection with $out
+
+    Records still holding ISO string dates are skipped; run migrate-dates first.
+    """
+    counts = status_count_fields()
+    monthly = [
+        {"$match": {"date": {"$type": "date"}}},
+        {"$group": {
+            "_id": {
+                "student_id": "$student_id",
+                "class_id": "$class_id",
+                "section_id": "$section_id",
+                "month": {"$dateFromParts": {"year": {"$year": "$date"}, "month": {"$month": "$date"}}}
+            },
+            **counts
+        }},
+        {"$project": {
+            "_id": {"$concat": [
+                "$_id.student_id", "|", "$_id.class_id", "|", "$_id.section_id", "|",
+                {"$dateToString": {"format": "%Y-%m", "date": "$_id.month"}}
+            ]},
+            "student_id": "$_id.student_id",
+            "class_id": "$_id.class_id",
+            "section_id": "$_id.section_id",
+            "month": "$_id.month",
+            **{field: 1 for field in COUNT_FIELDS}
+        }},
+        {"$out": MONTHLY_COLLECTION}
+    ]
+    daily = [
+        {"$match": {"date": {"$type": "date"}}},
+        {"$group": {
+            "_id": {
+                "class_id": "$class_id",
+                "section_id": "$section_id",
+                "date": {"$dateFromParts": {
+                    "year": {"$year": "$date"}, "month": {"$month": "$date"}, "day": {"$dayOfMonth": "$date"}
+                }}
+            },
+            **counts
+        }},
+        {"$project": {
+            "_id": {"$concat": [
+                "$_id.class_id", "|", "$_id.section_id", "|",
+                {"$dateToString": {"format": "%Y-%m-%d", "date": "$_id.date"}}
+            ]},
+            "class_id": "$_id.class_id",
+            "section_id": "$_id.section_id",
+            "date": "$_id.date",
+            **{field: 1 for field in COUNT_FIELDS}
+        }},
+        {"$out": DAILY_COLLECTION}
+    ]
+    return {MONTHLY_COLLECTION: monthly, DAILY_COLLECTION: daily}
+
+class AttendanceRollups:
+    """Per-status attendance counts per student and month, and per section and day
+
+    Handlers apply() every record they store or replace. The increments are not
+    atomic with the raw writes, so a failure between the two leaves the rollups off
+    until `python manage.py rebuild-rollups` regenerates them.
+    """
+
+    def __init__(self, db, raw: str = "attendance"):
+        self.db = db
+        self.raw = raw
+
+    def operations(self, key, changes: Iterable[Tuple[dict, int]]) -> List[UpdateOne]:
+        """$inc upserts applying (record, +1/-1) changes to the rollup documents selected by key"""
+        deltas: Dict[str, Tuple[dict, dict]] = {}
+        for record, sign in changes:
+            rollup_id, fields = key(record)
+            _, counts = deltas.setdefault(rollup_id, (fields, {}))
+            status = record["status"].value if hasattr(record["status"], "value") else record["status"]
+            counts["total"] = counts.get("total", 0) + sign
+            counts[status] = counts.get(status, 0) + sign
+        operations = []
+        for rollup_id, (fields, counts) in deltas.items():
+            # Re-marking a record with its current status cancels out
+            counts = {field: delta for field, delta in counts.items() if delta}
+            if counts:
+                operations.append(UpdateOne({"_id": rollup_id}, {"$inc": counts, "$setOnInsert": fields}, upsert=True))
+        return operations
+
+    async def apply(self, changes: List[Tuple[dict, int]]):
+        """Count stored records into (+1) or out of (-1) both rollups"""
+        for name, key in ((MONTHLY_COLLECTION, monthly_key), (DAILY_COLLECTION, daily_key)):
+            operations = self.operations(key, changes)
+            if operations:
+                await self.db[name].bulk_write(operations, ordered=False)
+
+    async def _monthly_counts(self, query: dict, start: Optional[datetime], end: Optional[datetime]) -> Dict[str, dict]:
+        match = dict(query)
+        months = {}
+        if start:
+            months["$gte"] = start
+        if end:
+            months["$lt"] = end
+        if months:
+            match["month"] = months
+        rows = await self.db[MONTHLY_COLLECTION].aggregate([
+            {"$match": match},
+            {"$group": {"_id": "$student_id", **_sum_fields()}}
+        ]).to_list(None)
+        return {row["_id"]: row for row in rows}
+
+    async def _raw_counts(self, query: dict, start: datetime, end: datetime) -> Dict[str, dict]:
+        rows = await self.db[self.raw].aggregate([
+            {"$match": {**query, "date": {"$gte": start, "$lte": end}}},
+            {"$group": {"_id": "$student_id", **status_count_fields()}}
+        ]).to_list(None)
+        return {row["_id"]: row for row in rows}
+
+    async def student_counts(
+        self, query: dict, date_from: Optional[datetime], date_to: Optional[datetime]
+    ) -> Dict[str, dict]:
+        """Per-status counts per student; query may filter on student_id, class_id and section_id"""
+        months, edges = split_range(date_from, date_to)
+        parts = []
+        if months is not None:
+            parts.append(await self._monthly_counts(query, *months))
+        for start, end in edges:
+            parts.append(await self._raw_counts(query, start, end))
+
+        counts: Dict[str, dict] = {}
+        for part in parts:
+            for student_id, row in part.items():
+                _add_counts(counts.setdefault(student_id, {}), row)
+        return counts
+
+    async def counts(self, query: dict, date_from: Optional[datetime], date_to: Optional[datetime]) -> dict:
+        """Per-status counts over every student matching query"""
+        total: dict = {}
+        for counts in (await self.student_counts(query, date_from, date_to)).values():
+            _add_counts(total, counts)
+        return total
+
+    async def day_counts(self, query: dict, day: datetime) -> dict:
+        """Per-status counts of one day; query may filter on class_id and section_id"""
+        rows = await self.db[DAILY_COLLECTION].aggregate([
+            {"$match": {**query, "date": day_start(day)}},
+            {"$group": {"_id": None, **_sum_fields()}}
+        ]).to_list(1)
+        return rows[0] if rows else {}
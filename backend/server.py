@@ -1,9 +1,13 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Header, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, Header, UploadFile, File, Response, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+import asyncio
 import os
 import logging
 from pathlib import Path
@@ -25,7 +29,7 @@ from models import (
     # Phase 2
     TimetableEntry, TimetableEntryCreate, DayOfWeek,
     # Phase 3
-    Attendance, AttendanceCreate, AttendanceStatus,
+    Attendance, AttendanceCreate,
     ExamType, ExamTypeCreate,
     ExamSchedule, ExamScheduleCreate,
     MarksEntry, MarksEntryCreate,
@@ -38,14 +42,46 @@ from models import (
     Income, IncomeCreate, IncomeCategory,
     Expense, ExpenseCreate, ExpenseCategory
 )
-from auth import get_password_hash, verify_password, create_access_token, decode_access_token
+from auth import (
+    get_password_hash_async, verify_password_async, password_hash_pool_stats,
+    create_access_token, decode_access_token, AUTH_TOKEN_MODE, TokenVersionMap
+)
+from cache import TTLCache
+from codec import codec_for, parse_datetime
+from streaming import json_array_response, ndjson_response
+from pagination import Page, PageCursor, paginated_find, decode_cursor, encode_cursor, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+from projection import parse_fields, projection_for, partial_model
+from versions import CollectionVersions
+from refdata import ReferenceData
+from indexes import ensure_indexes
+from monitoring import CommandMonitor, RequestScopeMiddleware
+from metrics import (
+    registry as metrics_registry, MetricsMiddleware, PoolMetricsListener, EventLoopLagMonitor,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE
+)
+from profiling import ProfileStore, ProfilingMiddleware
+from counters import CollectionCounters
+from attendance import attendance_stats, student_summaries, summary_rows, summarize_counts, upsert_records
+from packed_attendance import PackedAttendance, RECORD_SORT
+from rollups import AttendanceRollups
+from coalescing import WriteCoalescer
+from reports import compose_report_card, load_report_card, iter_class_report_cards
+from ranking import RankingCache, overall_rows
+from grading import GradeTable
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# Per-route timing of every Mongo command; slower ones are logged with their filter shape
+command_monitor = CommandMonitor(slow_ms=float(os.environ.get('SLOW_QUERY_MS', '100')))
+
+# Metrics are per worker process; scrape every worker (or run one) for complete numbers
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+event_listeners = [command_monitor, PoolMetricsListener()] if METRICS_ENABLED else [command_monitor]
+client = AsyncIOMotorClient(mongo_url, tz_aware=True, event_listeners=event_listeners)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app
@@ -61,12 +97,245 @@ security = HTTPBearer()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Resolved users keyed by (username, token); saves a users lookup on every request
+user_cache = TTLCache(
+    maxsize=int(os.environ.get('USER_CACHE_MAX_SIZE', '2048')),
+    ttl=float(os.environ.get('USER_CACHE_TTL_SECONDS', '60'))
+)
+
+def invalidate_cached_user(user_id: str):
+    """Drop every cached session of a user after it was changed or removed"""
+    user_cache.invalidate_matching(lambda key, user: user.id == user_id)
+
+# Write counters of rarely changing reference collections, used as ETags
+collection_versions = CollectionVersions(
+    db.collection_versions,
+    poll_interval=float(os.environ.get('COLLECTION_VERSION_POLL_SECONDS', '2'))
+)
+
+# Reference collections served from memory, with the order they are listed in
+reference_data = ReferenceData(
+    db,
+    collection_versions,
+    {
+        "school_years": (SchoolYear, None),
+        "sections": (Section, None),
+        "classes": (Class, [("numeric", 1)]),
+        "subjects": (Subject, None),
+        "exam_types": (ExamType, None),
+        "grade_rules": (GradeRule, [("min_percentage", -1)]),
+        "fee_types": (FeeType, None),
+        "settings": (Settings, None),
+    },
+    ttl=float(os.environ.get('REFERENCE_CACHE_TTL_SECONDS', '300'))
+)
+
+async def reference_data_changed(name: str):
+    """Publish a write to a reference collection to the ETags and caches of every worker"""
+    await collection_versions.bump(name)
+    reference_data.invalidate(name)
+
+async def grade_table() -> GradeTable:
+    """Grade rules compiled for lookups, rebuilt whenever the rules change"""
+    return await reference_data.derived("grade_rules", "grade_table", GradeTable)
+
+# Document counts shown on the admin dashboard, maintained by the create handlers
+collection_counters = CollectionCounters(
+    db,
+    ("students", "teachers", "parents", "classes", "subjects"),
+    reconcile_interval=float(os.environ.get('COUNTER_RECONCILE_SECONDS', '3600'))
+)
+
+# Per-user dashboard figures, recomputed at most this often
+dashboard_cache = TTLCache(
+    maxsize=int(os.environ.get('DASHBOARD_CACHE_MAX_SIZE', '2048')),
+    ttl=float(os.environ.get('DASHBOARD_CACHE_TTL_SECONDS', '30'))
+)
+
+# "records" stores one document per attendance mark; "packed" stores one bit-packed
+# document per student, subject and month in attendance_months
+ATTENDANCE_STORAGE = os.environ.get('ATTENDANCE_STORAGE', 'records')
+packed_attendance = PackedAttendance(db.attendance_months)
+
+# Monthly and daily per-status counts, maintained by the attendance handlers in
+# records storage. Reads use them once `python manage.py rebuild-rollups` has run.
+attendance_rollups = AttendanceRollups(db)
+ATTENDANCE_ROLLUPS = os.environ.get('ATTENDANCE_ROLLUPS', 'false').lower() == 'true'
+
+# Rows per bulk write when upserting attendance registers
+ATTENDANCE_BULK_CHUNK_SIZE = int(os.environ.get('ATTENDANCE_BULK_CHUNK_SIZE', '500'))
+
+# Group commit for single attendance marks: wait up to this long (0 disables it) or
+# for this many marks, then write them together as one register
+ATTENDANCE_COALESCE_MS = float(os.environ.get('ATTENDANCE_COALESCE_MS', '0'))
+ATTENDANCE_COALESCE_MAX_BATCH = int(os.environ.get('ATTENDANCE_COALESCE_MAX_BATCH', '200'))
+
+# Mark rankings per exam schedule. Marks handlers drop the schedules they touch in this
+# worker; the TTL bounds how long other workers serve rankings from before a change.
+ranking_cache = TTLCache(
+    maxsize=int(os.environ.get('RANKING_CACHE_MAX_SIZE', '512')),
+    ttl=float(os.environ.get('RANKING_CACHE_TTL_SECONDS', '300'))
+)
+exam_rankings = RankingCache(db, ranking_cache)
+
+event_loop_lag_monitor = EventLoopLagMonitor()
+
+def runtime_metrics() -> list:
+    """In-process cache and pool counters, snapshotted for /metrics"""
+    user_stats = user_cache.stats()
+    hashing = password_hash_pool_stats()
+    reference = reference_data.stats()
+    return [
+        ("user_cache_entries", "gauge", "Cached user sessions", [({}, user_stats["size"])]),
+        ("user_cache_lookups_total", "counter", "User cache lookups",
+         [({"result": "hit"}, user_stats["hits"]), ({"result": "miss"}, user_stats["misses"])]),
+        ("password_hash_jobs_running", "gauge", "Password hashing jobs on worker threads", [({}, hashing["running"])]),
+        ("password_hash_queue_depth", "gauge", "Password hashing jobs waiting for a worker", [({}, hashing["queue_depth"])]),
+        ("reference_data_lookups_total", "counter", "Reference data reads",
+         [({"result": "hit"}, reference["hits"]), ({"result": "load"}, reference["loads"])]),
+    ]
+
+metrics_registry.add_collector(runtime_metrics)
+
+# Admins can profile a single request by sending an X-Profile header
+profile_store = ProfileStore(
+    Path(os.environ.get('PROFILE_DIR', str(ROOT_DIR / 'profiles'))),
+    keep=int(os.environ.get('PROFILE_KEEP', '100'))
+)
+
+# ============ Date Helper Functions ============
+
+# Accept ISO string dates in range filters until `python manage.py migrate-dates` has run
+LEGACY_STRING_DATES = os.environ.get('LEGACY_STRING_DATES', 'true').lower() == 'true'
+
+def parse_date_param(value: str, name: str) -> datetime:
+    """Parse a date query parameter, rejecting malformed values"""
+    try:
+        return parse_datetime(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid date for {name}: {value}")
+
+def date_range_filter(field: str, date_from: Optional[str], date_to: Optional[str]) -> dict:
+    """Query clause selecting documents whose date field lies in [date_from, date_to]"""
+    if not (date_from or date_to):
+        return {}
+    
+    native = {}
+    if date_from:
+        native["$gte"] = parse_date_param(date_from, "date_from")
+    if date_to:
+        native["$lte"] = parse_date_param(date_to, "date_to")
+    
+    if not LEGACY_STRING_DATES:
+        return {field: native}
+    
+    # Unmigrated documents still hold ISO strings, which only compare against strings
+    legacy = {}
+    if date_from:
+        legacy["$gte"] = date_from
+    if date_to:
+        legacy["$lte"] = date_to
+    return {"$or": [{field: native}, {field: legacy}]}
+
+def encode_updates(model, updates: dict) -> dict:
+    """Convert date strings in a raw update payload into datetimes before storing it"""
+    try:
+        return codec_for(model).encode(updates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid date: {e}")
+
+# ============ Response Helper Functions ============
+
+# Large lists are streamed from the cursor with orjson instead of being built as models
+STREAM_LIST_RESPONSES = os.environ.get('STREAM_LIST_RESPONSES', 'true').lower() == 'true'
+
+def fields_projection(fields: Optional[tuple], default: dict = None) -> dict:
+    """Projection for a fields= selection, falling back to the endpoint's usual one"""
+    if fields is not None:
+        return projection_for(fields)
+    return default if default is not None else {"_id": 0}
+
+async def list_response(
+    cursor,
+    model,
+    response: Response,
+    headers: dict,
+    fields: Optional[tuple] = None,
+    stream: bool = True
+):
+    """Encode documents as a JSON array with orjson, or materialise models when streaming is disabled
+
+    cursor may be a Motor cursor, a PageCursor or a list of documents that were already read.
+    """
+    if fields is not None:
+        model = partial_model(model, fields)
+    
+    if stream and STREAM_LIST_RESPONSES:
+        # decode normalises legacy ISO string dates so both paths emit the same format
+        if isinstance(cursor, PageCursor):
+            # The next cursor is only known once the page has been read
+            return json_array_response(cursor, codec_for(model).decode, headers, cursor.headers, [NEXT_CURSOR_HEADER])
+        return json_array_response(cursor, codec_for(model).decode, headers)
+    docs = cursor if isinstance(cursor, list) else await cursor.to_list(None)
+    if isinstance(cursor, PageCursor):
+        headers = {**headers, **cursor.headers()}
+    
+    items = codec_for(model).load_many(docs)
+    if fields is not None:
+        # Trimmed items don't satisfy the route's full response_model, so bypass it
+        return JSONResponse(jsonable_encoder(items), headers=headers)
+    
+    response.headers.update(headers)
+    return items
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers the given ETag"""
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip() for candidate in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def conditional_response(request: Request, response: Response, *collections: str) -> Optional[Response]:
+    """Tag a reference-data response with its ETag, or return a 304 if the client copy is current"""
+    # Versions are kept in memory, so revalidation never touches Mongo
+    etag = collection_versions.etag(*collections)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    response.headers.update(headers)
+    return None
+
+def detail_response(doc: dict, model, fields: Optional[tuple] = None):
+    """Build the response for a single document, trimmed when fields= was given"""
+    if fields is None:
+        return codec_for(model).load(doc)
+    
+    item = codec_for(partial_model(model, fields)).load(doc)
+    return JSONResponse(jsonable_encoder(item))
+
 # ============ Authentication Helper Functions ============
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
-    """Get current authenticated user from JWT token"""
-    token = credentials.credentials
-    payload = decode_access_token(token)
+# Token versions for claim tokens; bumping a user's version revokes their tokens
+token_versions = TokenVersionMap()
+
+# Updating any of these changes what a claim token asserts about the user
+TOKEN_CLAIM_FIELDS = {"username", "role", "is_active"}
+
+async def bump_token_version(user_id: str):
+    """Revoke all claim tokens issued to a user so far"""
+    doc = await db.token_versions.find_one_and_update(
+        {"user_id": user_id},
+        {"$inc": {"version": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    token_versions.set(user_id, doc["version"])
+
+def decode_credentials(credentials: HTTPAuthorizationCredentials) -> dict:
+    """Decode the bearer token, rejecting invalid or subject-less tokens"""
+    payload = decode_access_token(credentials.credentials)
     
     if payload is None:
         raise HTTPException(
@@ -75,13 +344,21 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    username: str = payload.get("sub")
-    if username is None:
+    if payload.get("sub") is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials"
         )
     
+    return payload
+
+async def load_user(username: str, token: str) -> User:
+    """Resolve the user behind a token, served from the user cache when possible"""
+    # Each request gets its own copy, so a handler changing it can't leak into other requests
+    cached_user = user_cache.get((username, token))
+    if cached_user is not None:
+        return cached_user.model_copy()
+    
     user = await db.users.find_one({"username": username}, {"_id": 0, "password_hash": 0})
     if user is None:
         raise HTTPException(
@@ -89,13 +366,51 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             detail="User not found"
         )
     
-    # Convert ISO string timestamps back to datetime
-    if isinstance(user.get('created_at'), str):
-        user['created_at'] = datetime.fromisoformat(user['created_at'])
-    if isinstance(user.get('updated_at'), str):
-        user['updated_at'] = datetime.fromisoformat(user['updated_at'])
+    user_obj = codec_for(User).load(user)
+    user_cache.set((username, token), user_obj)
+    return user_obj.model_copy()
+
+async def user_from_claims(payload: dict) -> User:
+    """Build the current user from a claim token without touching the users collection"""
+    if token_versions.is_stale():
+        await token_versions.refresh(db.token_versions)
     
-    return User(**user)
+    known = token_versions.get(payload["uid"])
+    if payload["ver"] > known:
+        # Issued after a bump this worker hasn't picked up yet
+        known = await token_versions.fetch(db.token_versions, payload["uid"])
+    if payload["ver"] != known:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    # Only id, username and role are known here; /auth/me loads the full profile
+    return User.model_construct(
+        id=payload["uid"],
+        username=payload["sub"],
+        role=UserRole(payload["role"]),
+        is_active=True
+    )
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+    """Get current authenticated user from JWT token"""
+    payload = decode_credentials(credentials)
+    
+    if AUTH_TOKEN_MODE == "claims" and "ver" in payload:
+        return await user_from_claims(payload)
+    
+    return await load_user(payload["sub"], credentials.credentials)
+
+async def get_current_user_profile(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
+    """Get the full profile of the authenticated user, whatever the token mode"""
+    payload = decode_credentials(credentials)
+    
+    if AUTH_TOKEN_MODE == "claims" and "ver" in payload:
+        await user_from_claims(payload)
+    
+    return await load_user(payload["sub"], credentials.credentials)
 
 def require_role(allowed_roles: List[UserRole]):
     """Dependency to check if user has required role"""
@@ -124,13 +439,11 @@ async def register(user_create: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user
-    password_hash = get_password_hash(user_create.password)
+    password_hash = await get_password_hash_async(user_create.password)
     user_dict = user_create.model_dump(exclude={'password'})
     user_obj = UserInDB(**user_dict, password_hash=password_hash)
     
-    doc = user_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
+    doc = codec_for(UserInDB).dump(user_obj)
     
     await db.users.insert_one(doc)
     
@@ -141,7 +454,7 @@ async def login(user_login: UserLogin):
     """Login and get access token"""
     user_doc = await db.users.find_one({"username": user_login.username}, {"_id": 0})
     
-    if not user_doc or not verify_password(user_login.password, user_doc["password_hash"]):
+    if not user_doc or not await verify_password_async(user_login.password, user_doc["password_hash"]):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -155,20 +468,22 @@ async def login(user_login: UserLogin):
         )
     
     # Create access token
-    access_token = create_access_token(data={"sub": user_doc["username"]})
-    
-    # Convert timestamps
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
-    if isinstance(user_doc.get('updated_at'), str):
-        user_doc['updated_at'] = datetime.fromisoformat(user_doc['updated_at'])
-    
-    user = User(**{k: v for k, v in user_doc.items() if k != 'password_hash'})
+    token_data = {"sub": user_doc["username"]}
+    if AUTH_TOKEN_MODE == "claims":
+        version_doc = await db.token_versions.find_one({"user_id": user_doc["id"]})
+        token_data.update({
+            "uid": user_doc["id"],
+            "role": user_doc["role"],
+            "ver": version_doc["version"] if version_doc else 0
+        })
+    access_token = create_access_token(data=token_data)
+    
+    user = codec_for(User).load({k: v for k, v in user_doc.items() if k != 'password_hash'})
     
     return Token(access_token=access_token, user=user)
 
 @api_router.get("/auth/me", response_model=User)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: User = Depends(get_current_user_profile)):
     """Get current user info"""
     return current_user
 
@@ -176,7 +491,10 @@ async def get_me(current_user: User = Depends(get_current_user)):
 
 @api_router.get("/users", response_model=List[User])
 async def get_users(
+    response: Response,
     role: Optional[UserRole] = None,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
     current_user: User = Depends(require_role([UserRole.ADMIN]))
 ):
     """Get all users (Admin only)"""
@@ -184,33 +502,30 @@ async def get_users(
     if role:
         query["role"] = role
     
-    users = await db.users.find(query, {"_id": 0, "password_hash": 0}).to_list(1000)
-    
-    for user in users:
-        if isinstance(user.get('created_at'), str):
-            user['created_at'] = datetime.fromisoformat(user['created_at'])
-        if isinstance(user.get('updated_at'), str):
-            user['updated_at'] = datetime.fromisoformat(user['updated_at'])
+    selected = parse_fields(User, fields)
+    cursor, headers = await paginated_find(
+        db.users, query, [("created_at", 1), ("id", 1)], page,
+        fields_projection(selected, {"_id": 0, "password_hash": 0})
+    )
     
-    return [User(**user) for user in users]
+    return await list_response(cursor, User, response, headers, selected, stream=False)
 
 @api_router.get("/users/{user_id}", response_model=User)
 async def get_user(
     user_id: str,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get user by ID"""
-    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+    selected = parse_fields(User, fields)
+    user = await db.users.find_one(
+        {"id": user_id}, fields_projection(selected, {"_id": 0, "password_hash": 0})
+    )
     
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    if isinstance(user.get('created_at'), str):
-        user['created_at'] = datetime.fromisoformat(user['created_at'])
-    if isinstance(user.get('updated_at'), str):
-        user['updated_at'] = datetime.fromisoformat(user['updated_at'])
-    
-    return User(**user)
+    return detail_response(user, User, selected)
 
 @api_router.put("/users/{user_id}", response_model=User)
 async def update_user(
@@ -227,21 +542,22 @@ async def update_user(
     if "password" in updates:
         del updates["password"]
     
-    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
+    updates["updated_at"] = datetime.now(timezone.utc)
+    encode_updates(User, updates)
     
     result = await db.users.update_one({"id": user_id}, {"$set": updates})
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+    # Covers role changes and deactivation as well as profile edits
+    invalidate_cached_user(user_id)
+    if TOKEN_CLAIM_FIELDS & updates.keys():
+        await bump_token_version(user_id)
     
-    if isinstance(user.get('created_at'), str):
-        user['created_at'] = datetime.fromisoformat(user['created_at'])
-    if isinstance(user.get('updated_at'), str):
-        user['updated_at'] = datetime.fromisoformat(user['updated_at'])
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
     
-    return User(**user)
+    return codec_for(User).load(user)
 
 @api_router.delete("/users/{user_id}")
 async def delete_user(
@@ -254,8 +570,69 @@ async def delete_user(
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
+    invalidate_cached_user(user_id)
+    await bump_token_version(user_id)
+    
     return {"message": "User deleted successfully"}
 
+@api_router.get("/admin/runtime-stats")
+async def get_runtime_stats(current_user: User = Depends(require_role([UserRole.ADMIN]))):
+    """Get in-process cache and worker pool counters (Admin only)"""
+    return {
+        "user_cache": user_cache.stats(),
+        "password_hashing": password_hash_pool_stats(),
+        "reference_data": reference_data.stats(),
+        "dashboard_cache": dashboard_cache.stats(),
+        "ranking_cache": ranking_cache.stats(),
+        "attendance_coalescing": attendance_coalescer.stats() if ATTENDANCE_COALESCE_MS > 0 else None
+    }
+
+async def profiling_allowed(authorization: Optional[str]) -> bool:
+    """Whether a request asking to be profiled comes from an admin"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        user = await get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+    except HTTPException:
+        return False
+    return user.role == UserRole.ADMIN
+
+@api_router.get("/admin/profiles")
+async def get_profiles(current_user: User = Depends(require_role([UserRole.ADMIN]))):
+    """List stored request profiles, newest first (Admin only)"""
+    return profile_store.list()
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    current_user: User = Depends(require_role([UserRole.ADMIN]))
+):
+    """Get a request profile as collapsed stacks, by file name or X-Profile-Id (Admin only)"""
+    profile = profile_store.read(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    
+    return PlainTextResponse(profile)
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(
+    limit: int = 10,
+    current_user: User = Depends(require_role([UserRole.ADMIN]))
+):
+    """Get the slowest Mongo query shapes of every route since startup (Admin only)"""
+    return {
+        "slow_query_ms": command_monitor.slow_ms,
+        "untracked_shapes": command_monitor.dropped,
+        "routes": command_monitor.slowest(limit)
+    }
+
+@api_router.delete("/admin/slow-queries")
+async def reset_slow_queries(current_user: User = Depends(require_role([UserRole.ADMIN]))):
+    """Clear recorded query timings (Admin only)"""
+    command_monitor.reset()
+    return {"message": "Query timings cleared"}
+
 # ============ School Year Routes ============
 
 @api_router.post("/school-years", response_model=SchoolYear)
@@ -269,45 +646,43 @@ async def create_school_year(
         await db.school_years.update_many({}, {"$set": {"is_current": False}})
     
     year_obj = SchoolYear(**school_year.model_dump())
-    doc = year_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['start_date'] = doc['start_date'].isoformat()
-    doc['end_date'] = doc['end_date'].isoformat()
+    doc = codec_for(SchoolYear).dump(year_obj)
     
     await db.school_years.insert_one(doc)
+    await reference_data_changed("school_years")
     return year_obj
 
 @api_router.get("/school-years", response_model=List[SchoolYear])
-async def get_school_years(current_user: User = Depends(get_current_user)):
+async def get_school_years(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
     """Get all school years"""
-    years = await db.school_years.find({}, {"_id": 0}).to_list(100)
+    not_modified = conditional_response(request, response, "school_years")
+    if not_modified:
+        return not_modified
     
-    for year in years:
-        if isinstance(year.get('created_at'), str):
-            year['created_at'] = datetime.fromisoformat(year['created_at'])
-        if isinstance(year.get('start_date'), str):
-            year['start_date'] = datetime.fromisoformat(year['start_date'])
-        if isinstance(year.get('end_date'), str):
-            year['end_date'] = datetime.fromisoformat(year['end_date'])
-    
-    return [SchoolYear(**year) for year in years]
+    return await reference_data.all("school_years")
 
 @api_router.get("/school-years/current", response_model=SchoolYear)
-async def get_current_school_year(current_user: User = Depends(get_current_user)):
+async def get_current_school_year(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
     """Get current active school year"""
-    year = await db.school_years.find_one({"is_current": True}, {"_id": 0})
+    not_modified = conditional_response(request, response, "school_years")
+    if not_modified:
+        return not_modified
+    
+    years = await reference_data.all("school_years")
+    year = next((year for year in years if year.is_current), None)
     
     if not year:
         raise HTTPException(status_code=404, detail="No current school year set")
     
-    if isinstance(year.get('created_at'), str):
-        year['created_at'] = datetime.fromisoformat(year['created_at'])
-    if isinstance(year.get('start_date'), str):
-        year['start_date'] = datetime.fromisoformat(year['start_date'])
-    if isinstance(year.get('end_date'), str):
-        year['end_date'] = datetime.fromisoformat(year['end_date'])
-    
-    return SchoolYear(**year)
+    return year
 
 # ============ Section Routes ============
 
@@ -318,22 +693,24 @@ async def create_section(
 ):
     """Create section"""
     section_obj = Section(**section.model_dump())
-    doc = section_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = codec_for(Section).dump(section_obj)
     
     await db.sections.insert_one(doc)
+    await reference_data_changed("sections")
     return section_obj
 
 @api_router.get("/sections", response_model=List[Section])
-async def get_sections(current_user: User = Depends(get_current_user)):
+async def get_sections(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
     """Get all sections"""
-    sections = await db.sections.find({}, {"_id": 0}).to_list(100)
-    
-    for section in sections:
-        if isinstance(section.get('created_at'), str):
-            section['created_at'] = datetime.fromisoformat(section['created_at'])
+    not_modified = conditional_response(request, response, "sections")
+    if not_modified:
+        return not_modified
     
-    return [Section(**section) for section in sections]
+    return await reference_data.all("sections")
 
 # ============ Class Routes ============
 
@@ -344,45 +721,45 @@ async def create_class(
 ):
     """Create class"""
     class_obj = Class(**class_data.model_dump())
-    doc = class_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = codec_for(Class).dump(class_obj)
     
     await db.classes.insert_one(doc)
+    await collection_counters.inc("classes")
+    await reference_data_changed("classes")
     return class_obj
 
 @api_router.get("/classes", response_model=List[Class])
 async def get_classes(
+    request: Request,
+    response: Response,
     school_year_id: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get all classes"""
-    query = {}
-    if school_year_id:
-        query["school_year_id"] = school_year_id
-    
-    classes = await db.classes.find(query, {"_id": 0}).sort("numeric", 1).to_list(100)
+    not_modified = conditional_response(request, response, "classes")
+    if not_modified:
+        return not_modified
     
-    for class_doc in classes:
-        if isinstance(class_doc.get('created_at'), str):
-            class_doc['created_at'] = datetime.fromisoformat(class_doc['created_at'])
+    classes = await reference_data.all("classes")
+    if school_year_id:
+        classes = [class_obj for class_obj in classes if class_obj.school_year_id == school_year_id]
     
-    return [Class(**class_doc) for class_doc in classes]
+    return classes
 
 @api_router.get("/classes/{class_id}", response_model=Class)
 async def get_class(
     class_id: str,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get class by ID"""
-    class_doc = await db.classes.find_one({"id": class_id}, {"_id": 0})
+    selected = parse_fields(Class, fields)
+    class_doc = await db.classes.find_one({"id": class_id}, fields_projection(selected))
     
     if not class_doc:
         raise HTTPException(status_code=404, detail="Class not found")
     
-    if isinstance(class_doc.get('created_at'), str):
-        class_doc['created_at'] = datetime.fromisoformat(class_doc['created_at'])
-    
-    return Class(**class_doc)
+    return detail_response(class_doc, Class, selected)
 
 # ============ Subject Routes ============
 
@@ -393,29 +770,30 @@ async def create_subject(
 ):
     """Create subject"""
     subject_obj = Subject(**subject.model_dump())
-    doc = subject_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = codec_for(Subject).dump(subject_obj)
     
     await db.subjects.insert_one(doc)
+    await collection_counters.inc("subjects")
+    await reference_data_changed("subjects")
     return subject_obj
 
 @api_router.get("/subjects", response_model=List[Subject])
 async def get_subjects(
+    request: Request,
+    response: Response,
     class_id: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get all subjects"""
-    query = {}
-    if class_id:
-        query["class_id"] = class_id
-    
-    subjects = await db.subjects.find(query, {"_id": 0}).to_list(100)
+    not_modified = conditional_response(request, response, "subjects")
+    if not_modified:
+        return not_modified
     
-    for subject in subjects:
-        if isinstance(subject.get('created_at'), str):
-            subject['created_at'] = datetime.fromisoformat(subject['created_at'])
+    subjects = await reference_data.all("subjects")
+    if class_id:
+        subjects = [subject for subject in subjects if subject.class_id == class_id]
     
-    return [Subject(**subject) for subject in subjects]
+    return subjects
 
 # ============ Teacher Routes ============
 
@@ -426,55 +804,41 @@ async def create_teacher(
 ):
     """Create teacher"""
     teacher_obj = Teacher(**teacher.model_dump())
-    doc = teacher_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    if doc.get('dob'):
-        doc['dob'] = doc['dob'].isoformat()
-    if doc.get('joining_date'):
-        doc['joining_date'] = doc['joining_date'].isoformat()
+    doc = codec_for(Teacher).dump(teacher_obj)
     
     await db.teachers.insert_one(doc)
+    await collection_counters.inc("teachers")
     return teacher_obj
 
 @api_router.get("/teachers", response_model=List[Teacher])
-async def get_teachers(current_user: User = Depends(get_current_user)):
+async def get_teachers(
+    response: Response,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
+    current_user: User = Depends(get_current_user)
+):
     """Get all teachers"""
-    teachers = await db.teachers.find({}, {"_id": 0}).to_list(1000)
+    selected = parse_fields(Teacher, fields)
+    cursor, headers = await paginated_find(
+        db.teachers, {}, [("created_at", 1), ("id", 1)], page, fields_projection(selected)
+    )
     
-    for teacher in teachers:
-        if isinstance(teacher.get('created_at'), str):
-            teacher['created_at'] = datetime.fromisoformat(teacher['created_at'])
-        if isinstance(teacher.get('updated_at'), str):
-            teacher['updated_at'] = datetime.fromisoformat(teacher['updated_at'])
-        if teacher.get('dob') and isinstance(teacher['dob'], str):
-            teacher['dob'] = datetime.fromisoformat(teacher['dob'])
-        if teacher.get('joining_date') and isinstance(teacher['joining_date'], str):
-            teacher['joining_date'] = datetime.fromisoformat(teacher['joining_date'])
-    
-    return [Teacher(**teacher) for teacher in teachers]
+    return await list_response(cursor, Teacher, response, headers, selected, stream=False)
 
 @api_router.get("/teachers/{teacher_id}", response_model=Teacher)
 async def get_teacher(
     teacher_id: str,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get teacher by ID"""
-    teacher = await db.teachers.find_one({"id": teacher_id}, {"_id": 0})
+    selected = parse_fields(Teacher, fields)
+    teacher = await db.teachers.find_one({"id": teacher_id}, fields_projection(selected))
     
     if not teacher:
         raise HTTPException(status_code=404, detail="Teacher not found")
     
-    if isinstance(teacher.get('created_at'), str):
-        teacher['created_at'] = datetime.fromisoformat(teacher['created_at'])
-    if isinstance(teacher.get('updated_at'), str):
-        teacher['updated_at'] = datetime.fromisoformat(teacher['updated_at'])
-    if teacher.get('dob') and isinstance(teacher['dob'], str):
-        teacher['dob'] = datetime.fromisoformat(teacher['dob'])
-    if teacher.get('joining_date') and isinstance(teacher['joining_date'], str):
-        teacher['joining_date'] = datetime.fromisoformat(teacher['joining_date'])
-    
-    return Teacher(**teacher)
+    return detail_response(teacher, Teacher, selected)
 
 # ============ Student Routes ============
 
@@ -494,22 +858,20 @@ async def create_student(
         raise HTTPException(status_code=400, detail="Roll number already exists in this class")
     
     student_obj = Student(**student.model_dump())
-    doc = student_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    if doc.get('dob'):
-        doc['dob'] = doc['dob'].isoformat()
-    if doc.get('admission_date'):
-        doc['admission_date'] = doc['admission_date'].isoformat()
+    doc = codec_for(Student).dump(student_obj)
     
     await db.students.insert_one(doc)
+    await collection_counters.inc("students")
     return student_obj
 
 @api_router.get("/students", response_model=List[Student])
 async def get_students(
+    response: Response,
     class_id: Optional[str] = None,
     section_id: Optional[str] = None,
     school_year_id: Optional[str] = None,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
     current_user: User = Depends(get_current_user)
 ):
     """Get all students"""
@@ -521,41 +883,27 @@ async def get_students(
     if school_year_id:
         query["school_year_id"] = school_year_id
     
-    students = await db.students.find(query, {"_id": 0}).to_list(1000)
-    
-    for student in students:
-        if isinstance(student.get('created_at'), str):
-            student['created_at'] = datetime.fromisoformat(student['created_at'])
-        if isinstance(student.get('updated_at'), str):
-            student['updated_at'] = datetime.fromisoformat(student['updated_at'])
-        if student.get('dob') and isinstance(student['dob'], str):
-            student['dob'] = datetime.fromisoformat(student['dob'])
-        if student.get('admission_date') and isinstance(student['admission_date'], str):
-            student['admission_date'] = datetime.fromisoformat(student['admission_date'])
+    selected = parse_fields(Student, fields)
+    cursor, headers = await paginated_find(
+        db.students, query, [("created_at", 1), ("id", 1)], page, fields_projection(selected)
+    )
     
-    return [Student(**student) for student in students]
+    return await list_response(cursor, Student, response, headers, selected)
 
 @api_router.get("/students/{student_id}", response_model=Student)
 async def get_student(
     student_id: str,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get student by ID"""
-    student = await db.students.find_one({"id": student_id}, {"_id": 0})
+    selected = parse_fields(Student, fields)
+    student = await db.students.find_one({"id": student_id}, fields_projection(selected))
     
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    if isinstance(student.get('created_at'), str):
-        student['created_at'] = datetime.fromisoformat(student['created_at'])
-    if isinstance(student.get('updated_at'), str):
-        student['updated_at'] = datetime.fromisoformat(student['updated_at'])
-    if student.get('dob') and isinstance(student['dob'], str):
-        student['dob'] = datetime.fromisoformat(student['dob'])
-    if student.get('admission_date') and isinstance(student['admission_date'], str):
-        student['admission_date'] = datetime.fromisoformat(student['admission_date'])
-    
-    return Student(**student)
+    return detail_response(student, Student, selected)
 
 @api_router.put("/students/{student_id}", response_model=Student)
 async def update_student(
@@ -564,7 +912,8 @@ async def update_student(
     current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.TEACHER]))
 ):
     """Update student"""
-    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
+    updates["updated_at"] = datetime.now(timezone.utc)
+    encode_updates(Student, updates)
     
     result = await db.students.update_one({"id": student_id}, {"$set": updates})
     
@@ -573,16 +922,7 @@ async def update_student(
     
     student = await db.students.find_one({"id": student_id}, {"_id": 0})
     
-    if isinstance(student.get('created_at'), str):
-        student['created_at'] = datetime.fromisoformat(student['created_at'])
-    if isinstance(student.get('updated_at'), str):
-        student['updated_at'] = datetime.fromisoformat(student['updated_at'])
-    if student.get('dob') and isinstance(student['dob'], str):
-        student['dob'] = datetime.fromisoformat(student['dob'])
-    if student.get('admission_date') and isinstance(student['admission_date'], str):
-        student['admission_date'] = datetime.fromisoformat(student['admission_date'])
-    
-    return Student(**student)
+    return codec_for(Student).load(student)
 
 # ============ Parent Routes ============
 
@@ -593,22 +933,26 @@ async def create_parent(
 ):
     """Create parent"""
     parent_obj = Parent(**parent.model_dump())
-    doc = parent_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = codec_for(Parent).dump(parent_obj)
     
     await db.parents.insert_one(doc)
+    await collection_counters.inc("parents")
     return parent_obj
 
 @api_router.get("/parents", response_model=List[Parent])
-async def get_parents(current_user: User = Depends(get_current_user)):
+async def get_parents(
+    response: Response,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
+    current_user: User = Depends(get_current_user)
+):
     """Get all parents"""
-    parents = await db.parents.find({}, {"_id": 0}).to_list(1000)
-    
-    for parent in parents:
-        if isinstance(parent.get('created_at'), str):
-            parent['created_at'] = datetime.fromisoformat(parent['created_at'])
+    selected = parse_fields(Parent, fields)
+    cursor, headers = await paginated_find(
+        db.parents, {}, [("created_at", 1), ("id", 1)], page, fields_projection(selected)
+    )
     
-    return [Parent(**parent) for parent in parents]
+    return await list_response(cursor, Parent, response, headers, selected, stream=False)
 
 # ============ Settings Routes ============
 
@@ -622,56 +966,126 @@ async def create_settings(
     await db.settings.delete_many({})
     
     settings_obj = Settings(**settings.model_dump())
-    doc = settings_obj.model_dump()
-    doc['updated_at'] = doc['updated_at'].isoformat()
+    doc = codec_for(Settings).dump(settings_obj)
     
     await db.settings.insert_one(doc)
+    await reference_data_changed("settings")
     return settings_obj
 
 @api_router.get("/settings", response_model=Settings)
-async def get_settings():
+async def get_settings(request: Request, response: Response):
     """Get school settings (public)"""
-    settings = await db.settings.find_one({}, {"_id": 0})
+    not_modified = conditional_response(request, response, "settings")
+    if not_modified:
+        return not_modified
+    
+    settings = await reference_data.all("settings")
     
     if not settings:
         # Return default settings
         return Settings(school_name="School Management System")
     
-    if isinstance(settings.get('updated_at'), str):
-        settings['updated_at'] = datetime.fromisoformat(settings['updated_at'])
-    
-    return Settings(**settings)
+    return settings[0]
 
 # ============ Dashboard Statistics ============
 
-@api_router.get("/dashboard/stats")
-async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
-    """Get dashboard statistics"""
+def today_filter(field: str) -> dict:
+    """Query clause selecting documents dated today (UTC)"""
+    start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(days=1) - timedelta(microseconds=1)
+    # Bounds without an offset, in the form legacy string dates were stored in; the
+    # date-only lower bound also sorts before "YYYY-MM-DD" and "YYYY-MM-DDT00:00:00"
+    return date_range_filter(field, start.strftime("%Y-%m-%d"), end.replace(tzinfo=None).isoformat())
+
+async def attendance_rate_today(query: dict) -> Optional[float]:
+    """Weighted attendance percentage of today's records, or None if none are marked yet"""
+    start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if ATTENDANCE_STORAGE == "packed":
+        stats = await packed_attendance.stats(query, start, start + timedelta(days=1) - timedelta(microseconds=1))
+    elif ATTENDANCE_ROLLUPS and set(query) <= {"class_id", "section_id"}:
+        # Section figures come from the daily rollup; a student's own few records are read directly
+        stats = summarize_counts(await attendance_rollups.day_counts(query, start))
+    else:
+        stats = await attendance_stats(db.attendance, {**query, **today_filter("date")})
+    
+    if not stats["total_days"]:
+        return None
+    return stats["percentage"]
+
+async def outstanding_fees(student_ids: List[str]) -> float:
+    """Unpaid balance of the open invoices of some students"""
+    result = await db.invoices.aggregate([
+        {"$match": {
+            "student_id": {"$in": student_ids},
+            "status": {"$in": [InvoiceStatus.PENDING.value, InvoiceStatus.PARTIALLY_PAID.value, InvoiceStatus.OVERDUE.value]}
+        }},
+        {"$group": {"_id": None, "balance": {"$sum": {"$subtract": ["$total_amount", "$paid_amount"]}}}}
+    ]).to_list(1)
+    
+    return result[0]["balance"] if result else 0.0
+
+async def pending_marks_entries(subject_ids: List[str]) -> int:
+    """Exams of some subjects that have taken place but have no marks entered yet"""
+    query = {"subject_id": {"$in": subject_ids}}
+    query.update(date_range_filter("exam_date", None, datetime.now(timezone.utc).isoformat()))
+    schedules = await db.exam_schedules.find(query, {"_id": 0, "id": 1}).to_list(None)
+    
+    schedule_ids = [schedule["id"] for schedule in schedules]
+    if not schedule_ids:
+        return 0
+    
+    entered = await db.marks.distinct("exam_schedule_id", {"exam_schedule_id": {"$in": schedule_ids}})
+    return len(schedule_ids) - len(entered)
+
+async def user_dashboard_stats(current_user: User) -> dict:
+    """Dashboard figures of a teacher, student or parent"""
     stats = {}
     
-    if current_user.role == UserRole.ADMIN:
-        stats['total_students'] = await db.students.count_documents({})
-        stats['total_teachers'] = await db.teachers.count_documents({})
-        stats['total_parents'] = await db.parents.count_documents({})
-        stats['total_classes'] = await db.classes.count_documents({})
-        stats['total_subjects'] = await db.subjects.count_documents({})
-    
-    elif current_user.role == UserRole.TEACHER:
-        teacher = await db.teachers.find_one({"user_id": current_user.id})
+    if current_user.role == UserRole.TEACHER:
+        teacher = await db.teachers.find_one({"user_id": current_user.id}, {"_id": 0, "classes": 1, "subjects": 1})
         if teacher:
-            stats['my_classes'] = len(teacher.get('classes', []))
-            stats['my_subjects'] = len(teacher.get('subjects', []))
+            classes = teacher.get('classes', [])
+            subjects = teacher.get('subjects', [])
+            stats['my_classes'] = len(classes)
+            stats['my_subjects'] = len(subjects)
+            stats['attendance_rate_today'], stats['pending_marks_entries'] = await asyncio.gather(
+                attendance_rate_today({"class_id": {"$in": classes}}),
+                pending_marks_entries(subjects)
+            )
     
     elif current_user.role == UserRole.STUDENT:
-        student = await db.students.find_one({"user_id": current_user.id})
+        student = await db.students.find_one({"user_id": current_user.id}, {"_id": 0, "id": 1, "class_id": 1, "section_id": 1})
         if student:
             stats['my_class'] = student.get('class_id')
             stats['my_section'] = student.get('section_id')
+            stats['attendance_rate_today'], stats['outstanding_fees'] = await asyncio.gather(
+                attendance_rate_today({"student_id": student['id']}),
+                outstanding_fees([student['id']])
+            )
     
     elif current_user.role == UserRole.PARENT:
-        parent = await db.parents.find_one({"user_id": current_user.id})
+        parent = await db.parents.find_one({"user_id": current_user.id}, {"_id": 0, "student_ids": 1})
         if parent:
-            stats['my_children'] = len(parent.get('student_ids', []))
+            children = parent.get('student_ids', [])
+            stats['my_children'] = len(children)
+            stats['attendance_rate_today'], stats['outstanding_fees'] = await asyncio.gather(
+                attendance_rate_today({"student_id": {"$in": children}}),
+                outstanding_fees(children)
+            )
+    
+    return stats
+
+@api_router.get("/dashboard/stats")
+async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
+    """Get dashboard statistics"""
+    if current_user.role == UserRole.ADMIN:
+        counts = await collection_counters.get_all()
+        return {f"total_{name}": count for name, count in counts.items()}
+    
+    stats = dashboard_cache.get(current_user.id)
+    if stats is None:
+        stats = await user_dashboard_stats(current_user)
+        dashboard_cache.set(current_user.id, stats)
     
     return stats
 
@@ -715,19 +1129,20 @@ async def create_timetable_entry(
 ):
     """Create timetable entry"""
     entry_obj = TimetableEntry(**entry.model_dump())
-    doc = entry_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
+    doc = codec_for(TimetableEntry).dump(entry_obj)
     
     await db.timetable.insert_one(doc)
     return entry_obj
 
 @api_router.get("/timetable", response_model=List[TimetableEntry])
 async def get_timetable(
+    response: Response,
     class_id: Optional[str] = None,
     section_id: Optional[str] = None,
     teacher_id: Optional[str] = None,
     day: Optional[DayOfWeek] = None,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
     current_user: User = Depends(get_current_user)
 ):
     """Get timetable entries"""
@@ -741,15 +1156,12 @@ async def get_timetable(
     if day:
         query["day"] = day
     
-    entries = await db.timetable.find(query, {"_id": 0}).sort([("day", 1), ("period_number", 1)]).to_list(1000)
-    
-    for entry in entries:
-        if isinstance(entry.get('created_at'), str):
-            entry['created_at'] = datetime.fromisoformat(entry['created_at'])
-        if isinstance(entry.get('updated_at'), str):
-            entry['updated_at'] = datetime.fromisoformat(entry['updated_at'])
+    selected = parse_fields(TimetableEntry, fields)
+    cursor, headers = await paginated_find(
+        db.timetable, query, [("day", 1), ("period_number", 1), ("id", 1)], page, fields_projection(selected)
+    )
     
-    return [TimetableEntry(**entry) for entry in entries]
+    return await list_response(cursor, TimetableEntry, response, headers, selected, stream=False)
 
 @api_router.put("/timetable/{entry_id}", response_model=TimetableEntry)
 async def update_timetable_entry(
@@ -758,7 +1170,8 @@ async def update_timetable_entry(
     current_user: User = Depends(require_role([UserRole.ADMIN]))
 ):
     """Update timetable entry"""
-    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
+    updates["updated_at"] = datetime.now(timezone.utc)
+    encode_updates(TimetableEntry, updates)
     
     result = await db.timetable.update_one({"id": entry_id}, {"$set": updates})
     
@@ -767,12 +1180,7 @@ async def update_timetable_entry(
     
     entry = await db.timetable.find_one({"id": entry_id}, {"_id": 0})
     
-    if isinstance(entry.get('created_at'), str):
-        entry['created_at'] = datetime.fromisoformat(entry['created_at'])
-    if isinstance(entry.get('updated_at'), str):
-        entry['updated_at'] = datetime.fromisoformat(entry['updated_at'])
-    
-    return TimetableEntry(**entry)
+    return codec_for(TimetableEntry).load(entry)
 
 @api_router.delete("/timetable/{entry_id}")
 async def delete_timetable_entry(
@@ -789,46 +1197,100 @@ async def delete_timetable_entry(
 
 # ============ PHASE 3: Attendance Routes ============
 
+def date_bounds(date_from: Optional[str], date_to: Optional[str]) -> tuple:
+    """Parsed date_from/date_to bounds for packed and rollup attendance reads"""
+    return (
+        parse_date_param(date_from, "date_from") if date_from else None,
+        parse_date_param(date_to, "date_to") if date_to else None
+    )
+
+async def section_summary_rows(counts: dict) -> List[dict]:
+    """Summary rows for per-student counts, with names and roll numbers looked up in one query"""
+    students = await db.students.find(
+        {"id": {"$in": list(counts)}}, {"_id": 0, "id": 1, "name": 1, "roll_no": 1}
+    ).to_list(None)
+    return summary_rows(counts, {student["id"]: student for student in students})
+
+async def store_attendance(docs: List[dict]) -> List[tuple]:
+    """Upsert attendance records and update the rollups, returning each row's result and stored record"""
+    results, changes = await upsert_records(db.attendance, docs, ATTENDANCE_BULK_CHUNK_SIZE)
+    await attendance_rollups.apply(changes)
+    
+    stored = iter([record for record, sign in changes if sign > 0])
+    return [(result, None if result["status"] == "failed" else next(stored)) for result in results]
+
+attendance_coalescer = WriteCoalescer(
+    store_attendance,
+    max_batch=ATTENDANCE_COALESCE_MAX_BATCH,
+    max_delay=ATTENDANCE_COALESCE_MS / 1000
+)
+
 @api_router.post("/attendance", response_model=Attendance)
 async def mark_attendance(
     attendance: AttendanceCreate,
     current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.TEACHER]))
 ):
     """Mark student attendance"""
+    if ATTENDANCE_STORAGE == "packed":
+        record = attendance.model_dump()
+        [result] = await packed_attendance.mark([record])
+        if result["status"] == "failed":
+            raise HTTPException(status_code=400, detail=result["error"])
+        return Attendance(**record, id=result["id"])
+    
     attendance_obj = Attendance(**attendance.model_dump())
-    doc = attendance_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['date'] = doc['date'].isoformat()
+    doc = codec_for(Attendance).dump(attendance_obj)
     
-    await db.attendance.insert_one(doc)
-    return attendance_obj
+    # Marking the same student, date and subject again overwrites the earlier mark
+    if ATTENDANCE_COALESCE_MS > 0:
+        result, record = await attendance_coalescer.submit(doc)
+    else:
+        [(result, record)] = await store_attendance([doc])
+    
+    if result["status"] == "failed":
+        raise HTTPException(status_code=400, detail=result["error"])
+    return Attendance(**record)
 
 @api_router.post("/attendance/bulk")
 async def mark_bulk_attendance(
     attendance_list: List[AttendanceCreate],
     current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.TEACHER]))
 ):
-    """Mark attendance for multiple students at once"""
-    docs = []
-    for attendance in attendance_list:
-        attendance_obj = Attendance(**attendance.model_dump())
-        doc = attendance_obj.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        doc['date'] = doc['date'].isoformat()
-        docs.append(doc)
-    
-    if docs:
-        await db.attendance.insert_many(docs)
-    
-    return {"message": f"Marked attendance for {len(docs)} students"}
+    """Mark attendance for multiple students at once
+
+    Rows overwrite existing records with the same student, date and subject, so
+    re-submitting a register is safe. Each row is reported as inserted, updated or failed.
+    """
+    if ATTENDANCE_STORAGE == "packed":
+        results = await packed_attendance.mark(
+            [attendance.model_dump() for attendance in attendance_list], ATTENDANCE_BULK_CHUNK_SIZE
+        )
+    else:
+        docs = []
+        for attendance in attendance_list:
+            attendance_obj = Attendance(**attendance.model_dump())
+            doc = codec_for(Attendance).dump(attendance_obj)
+            docs.append(doc)
+        results = [result for result, _ in await store_attendance(docs)]
+    
+    counts = {outcome: sum(1 for result in results if result["status"] == outcome)
+              for outcome in ("inserted", "updated", "failed")}
+    return {
+        "message": f"Marked attendance for {counts['inserted'] + counts['updated']} students",
+        **counts,
+        "results": results
+    }
 
 @api_router.get("/attendance", response_model=List[Attendance])
 async def get_attendance(
+    response: Response,
     student_id: Optional[str] = None,
     class_id: Optional[str] = None,
     section_id: Optional[str] = None,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
     current_user: User = Depends(get_current_user)
 ):
     """Get attendance records"""
@@ -840,22 +1302,27 @@ async def get_attendance(
     if section_id:
         query["section_id"] = section_id
     
-    if date_from or date_to:
-        query["date"] = {}
-        if date_from:
-            query["date"]["$gte"] = date_from
-        if date_to:
-            query["date"]["$lte"] = date_to
+    selected = parse_fields(Attendance, fields)
     
-    records = await db.attendance.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
+    if ATTENDANCE_STORAGE == "packed":
+        start, end = date_bounds(date_from, date_to)
+        after = decode_cursor(RECORD_SORT, page.cursor) if page.cursor else None
+        records, more = await packed_attendance.find_page(query, start, end, page.limit, after)
+        
+        headers = {}
+        if more:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(RECORD_SORT, records[-1])
+        if page.include_total:
+            headers[TOTAL_COUNT_HEADER] = str(await packed_attendance.count(query, start, end))
+        return await list_response(records, Attendance, response, headers, selected, stream=False)
+    
+    query.update(date_range_filter("date", date_from, date_to))
     
-    for record in records:
-        if isinstance(record.get('created_at'), str):
-            record['created_at'] = datetime.fromisoformat(record['created_at'])
-        if isinstance(record.get('date'), str):
-            record['date'] = datetime.fromisoformat(record['date'])
+    cursor, headers = await paginated_find(
+        db.attendance, query, [("date", -1), ("id", 1)], page, fields_projection(selected)
+    )
     
-    return [Attendance(**record) for record in records]
+    return await list_response(cursor, Attendance, response, headers, selected)
 
 @api_router.get("/attendance/stats")
 async def get_attendance_stats(
@@ -867,29 +1334,38 @@ async def get_attendance_stats(
     """Get attendance statistics for a student"""
     query = {"student_id": student_id}
     
-    if date_from or date_to:
-        query["date"] = {}
-        if date_from:
-            query["date"]["$gte"] = date_from
-        if date_to:
-            query["date"]["$lte"] = date_to
+    if ATTENDANCE_STORAGE == "packed":
+        return await packed_attendance.stats(query, *date_bounds(date_from, date_to))
+    if ATTENDANCE_ROLLUPS:
+        return summarize_counts(await attendance_rollups.counts(query, *date_bounds(date_from, date_to)))
+    
+    query.update(date_range_filter("date", date_from, date_to))
     
-    records = await db.attendance.find(query, {"_id": 0}).to_list(1000)
+    return await attendance_stats(db.attendance, query)
+
+@api_router.get("/attendance/summary")
+async def get_attendance_summary(
+    class_id: str,
+    section_id: str,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.TEACHER]))
+):
+    """Get attendance statistics of every student in a section"""
+    query = {"class_id": class_id, "section_id": section_id}
     
-    total = len(records)
-    present = len([r for r in records if r['status'] == AttendanceStatus.PRESENT])
-    absent = len([r for r in records if r['status'] == AttendanceStatus.ABSENT])
-    late = len([r for r in records if r['status'] == AttendanceStatus.LATE])
+    if ATTENDANCE_STORAGE == "packed":
+        return await section_summary_rows(
+            await packed_attendance.student_counts(query, *date_bounds(date_from, date_to))
+        )
+    if ATTENDANCE_ROLLUPS:
+        return await section_summary_rows(
+            await attendance_rollups.student_counts(query, *date_bounds(date_from, date_to))
+        )
     
-    percentage = (present / total * 100) if total > 0 else 0
+    query.update(date_range_filter("date", date_from, date_to))
     
-    return {
-        "total_days": total,
-        "present": present,
-        "absent": absent,
-        "late": late,
-        "percentage": round(percentage, 2)
-    }
+    return await student_summaries(db.attendance, query)
 
 # ============ PHASE 3: Exam Management Routes ============
 
@@ -900,22 +1376,24 @@ async def create_exam_type(
 ):
     """Create exam type"""
     exam_type_obj = ExamType(**exam_type.model_dump())
-    doc = exam_type_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = codec_for(ExamType).dump(exam_type_obj)
     
     await db.exam_types.insert_one(doc)
+    await reference_data_changed("exam_types")
     return exam_type_obj
 
 @api_router.get("/exam-types", response_model=List[ExamType])
-async def get_exam_types(current_user: User = Depends(get_current_user)):
+async def get_exam_types(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
     """Get all exam types"""
-    exam_types = await db.exam_types.find({}, {"_id": 0}).to_list(100)
+    not_modified = conditional_response(request, response, "exam_types")
+    if not_modified:
+        return not_modified
     
-    for exam_type in exam_types:
-        if isinstance(exam_type.get('created_at'), str):
-            exam_type['created_at'] = datetime.fromisoformat(exam_type['created_at'])
-    
-    return [ExamType(**exam_type) for exam_type in exam_types]
+    return await reference_data.all("exam_types")
 
 @api_router.post("/exam-schedules", response_model=ExamSchedule)
 async def create_exam_schedule(
@@ -924,18 +1402,18 @@ async def create_exam_schedule(
 ):
     """Create exam schedule"""
     schedule_obj = ExamSchedule(**schedule.model_dump())
-    doc = schedule_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    doc['exam_date'] = doc['exam_date'].isoformat()
+    doc = codec_for(ExamSchedule).dump(schedule_obj)
     
     await db.exam_schedules.insert_one(doc)
     return schedule_obj
 
 @api_router.get("/exam-schedules", response_model=List[ExamSchedule])
 async def get_exam_schedules(
+    response: Response,
     class_id: Optional[str] = None,
     exam_type_id: Optional[str] = None,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
     current_user: User = Depends(get_current_user)
 ):
     """Get exam schedules"""
@@ -945,17 +1423,12 @@ async def get_exam_schedules(
     if exam_type_id:
         query["exam_type_id"] = exam_type_id
     
-    schedules = await db.exam_schedules.find(query, {"_id": 0}).sort("exam_date", 1).to_list(1000)
-    
-    for schedule in schedules:
-        if isinstance(schedule.get('created_at'), str):
-            schedule['created_at'] = datetime.fromisoformat(schedule['created_at'])
-        if isinstance(schedule.get('updated_at'), str):
-            schedule['updated_at'] = datetime.fromisoformat(schedule['updated_at'])
-        if isinstance(schedule.get('exam_date'), str):
-            schedule['exam_date'] = datetime.fromisoformat(schedule['exam_date'])
+    selected = parse_fields(ExamSchedule, fields)
+    cursor, headers = await paginated_find(
+        db.exam_schedules, query, [("exam_date", 1), ("id", 1)], page, fields_projection(selected)
+    )
     
-    return [ExamSchedule(**schedule) for schedule in schedules]
+    return await list_response(cursor, ExamSchedule, response, headers, selected, stream=False)
 
 @api_router.post("/marks", response_model=MarksEntry)
 async def create_marks_entry(
@@ -964,11 +1437,10 @@ async def create_marks_entry(
 ):
     """Enter marks for a student"""
     marks_obj = MarksEntry(**marks.model_dump())
-    doc = marks_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
+    doc = codec_for(MarksEntry).dump(marks_obj)
     
     await db.marks.insert_one(doc)
+    exam_rankings.invalidate(doc['exam_schedule_id'])
     return marks_obj
 
 @api_router.post("/marks/bulk")
@@ -980,20 +1452,23 @@ async def create_bulk_marks(
     docs = []
     for marks in marks_list:
         marks_obj = MarksEntry(**marks.model_dump())
-        doc = marks_obj.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        doc['updated_at'] = doc['updated_at'].isoformat()
+        doc = codec_for(MarksEntry).dump(marks_obj)
         docs.append(doc)
     
     if docs:
         await db.marks.insert_many(docs)
+    for schedule_id in {doc['exam_schedule_id'] for doc in docs}:
+        exam_rankings.invalidate(schedule_id)
     
     return {"message": f"Entered marks for {len(docs)} students"}
 
 @api_router.get("/marks", response_model=List[MarksEntry])
 async def get_marks(
+    response: Response,
     student_id: Optional[str] = None,
     exam_schedule_id: Optional[str] = None,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
     current_user: User = Depends(get_current_user)
 ):
     """Get marks entries"""
@@ -1003,15 +1478,12 @@ async def get_marks(
     if exam_schedule_id:
         query["exam_schedule_id"] = exam_schedule_id
     
-    marks = await db.marks.find(query, {"_id": 0}).to_list(1000)
-    
-    for mark in marks:
-        if isinstance(mark.get('created_at'), str):
-            mark['created_at'] = datetime.fromisoformat(mark['created_at'])
-        if isinstance(mark.get('updated_at'), str):
-            mark['updated_at'] = datetime.fromisoformat(mark['updated_at'])
+    selected = parse_fields(MarksEntry, fields)
+    cursor, headers = await paginated_find(
+        db.marks, query, [("created_at", 1), ("id", 1)], page, fields_projection(selected)
+    )
     
-    return [MarksEntry(**mark) for mark in marks]
+    return await list_response(cursor, MarksEntry, response, headers, selected)
 
 @api_router.put("/marks/{marks_id}", response_model=MarksEntry)
 async def update_marks(
@@ -1020,21 +1492,84 @@ async def update_marks(
     current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.TEACHER]))
 ):
     """Update marks entry"""
-    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
+    updates["updated_at"] = datetime.now(timezone.utc)
+    encode_updates(MarksEntry, updates)
     
-    result = await db.marks.update_one({"id": marks_id}, {"$set": updates})
+    # The entry as it was, to know which schedule's rankings it was part of
+    previous = await db.marks.find_one_and_update(
+        {"id": marks_id}, {"$set": updates}, {"_id": 0, "exam_schedule_id": 1}
+    )
     
-    if result.matched_count == 0:
+    if previous is None:
         raise HTTPException(status_code=404, detail="Marks entry not found")
     
     marks = await db.marks.find_one({"id": marks_id}, {"_id": 0})
+    exam_rankings.invalidate(previous['exam_schedule_id'])
+    exam_rankings.invalidate(marks['exam_schedule_id'])
+    
+    return codec_for(MarksEntry).load(marks)
+
+async def with_student_names(*row_lists: List[dict]):
+    """Add name and roll number to ranking rows, looking students up in one query"""
+    ids = list({row['student_id'] for rows in row_lists for row in rows})
+    students = await db.students.find(
+        {"id": {"$in": ids}}, {"_id": 0, "id": 1, "name": 1, "roll_no": 1}
+    ).to_list(None)
+    by_id = {student['id']: student for student in students}
+    for rows in row_lists:
+        for row in rows:
+            student = by_id.get(row['student_id'], {})
+            row['name'] = student.get('name')
+            row['roll_no'] = student.get('roll_no')
+
+@api_router.get("/rankings")
+async def get_exam_rankings(
+    class_id: str,
+    exam_type_id: str,
+    current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.TEACHER]))
+):
+    """Rank a class in every subject of an exam and overall"""
+    schedules = await db.exam_schedules.find(
+        {"class_id": class_id, "exam_type_id": exam_type_id}, {"_id": 0}
+    ).to_list(None)
+    rankings = await exam_rankings.rankings(schedules)
+    grades = await grade_table()
+    
+    subjects = []
+    for ranking in rankings:
+        subject = await reference_data.get("subjects", ranking.subject_id)
+        subjects.append({
+            "exam_schedule_id": ranking.schedule_id,
+            "subject_id": ranking.subject_id,
+            "subject_name": subject.name if subject else "Unknown",
+            "total_marks": ranking.total_marks,
+            "students": ranking.rows(grades)
+        })
+    overall = overall_rows(rankings, grades)
+    await with_student_names(overall, *(subject['students'] for subject in subjects))
+    
+    return {"class_id": class_id, "exam_type_id": exam_type_id, "subjects": subjects, "overall": overall}
+
+@api_router.get("/rankings/{exam_schedule_id}")
+async def get_schedule_rankings(
+    exam_schedule_id: str,
+    current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.TEACHER]))
+):
+    """Rank the students of one exam schedule (subject)"""
+    schedule = await db.exam_schedules.find_one({"id": exam_schedule_id}, {"_id": 0})
+    if not schedule:
+        raise HTTPException(status_code=404, detail="Exam schedule not found")
     
-    if isinstance(marks.get('created_at'), str):
-        marks['created_at'] = datetime.fromisoformat(marks['created_at'])
-    if isinstance(marks.get('updated_at'), str):
-        marks['updated_at'] = datetime.fromisoformat(marks['updated_at'])
+    [ranking] = await exam_rankings.rankings([schedule])
+    rows = ranking.rows(await grade_table())
+    await with_student_names(rows)
     
-    return MarksEntry(**marks)
+    return {
+        "exam_schedule_id": ranking.schedule_id,
+        "subject_id": ranking.subject_id,
+        "total_marks": ranking.total_marks,
+        "students": rows
+    }
 
 @api_router.post("/grade-rules", response_model=GradeRule)
 async def create_grade_rule(
@@ -1042,23 +1577,39 @@ async def create_grade_rule(
     current_user: User = Depends(require_role([UserRole.ADMIN]))
 ):
     """Create grade rule"""
+    if grade_rule.min_percentage > grade_rule.max_percentage:
+        raise HTTPException(status_code=400, detail="Minimum percentage is above the maximum")
+    
+    grades = await grade_table()
+    overlapping = grades.overlapping(grade_rule.min_percentage, grade_rule.max_percentage)
+    if overlapping:
+        ranges = ", ".join(f"{rule.name} ({rule.min_percentage}-{rule.max_percentage}%)" for rule in overlapping)
+        raise HTTPException(status_code=400, detail=f"Grade rule overlaps {ranges}")
+    
     grade_rule_obj = GradeRule(**grade_rule.model_dump())
-    doc = grade_rule_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = codec_for(GradeRule).dump(grade_rule_obj)
     
     await db.grade_rules.insert_one(doc)
+    await reference_data_changed("grade_rules")
+    
+    gaps = GradeTable(grades.rules + [grade_rule_obj]).gaps
+    if gaps:
+        logger.warning("Grade rules leave percentages ungraded: %s",
+                       ", ".join(f"{low}-{high}%" for low, high in gaps))
     return grade_rule_obj
 
 @api_router.get("/grade-rules", response_model=List[GradeRule])
-async def get_grade_rules(current_user: User = Depends(get_current_user)):
+async def get_grade_rules(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
     """Get all grade rules"""
-    grade_rules = await db.grade_rules.find({}, {"_id": 0}).sort("min_percentage", -1).to_list(100)
+    not_modified = conditional_response(request, response, "grade_rules")
+    if not_modified:
+        return not_modified
     
-    for grade_rule in grade_rules:
-        if isinstance(grade_rule.get('created_at'), str):
-            grade_rule['created_at'] = datetime.fromisoformat(grade_rule['created_at'])
-    
-    return [GradeRule(**grade_rule) for grade_rule in grade_rules]
+    return await reference_data.all("grade_rules")
 
 @api_router.get("/report-card/{student_id}")
 async def get_report_card(
@@ -1067,64 +1618,25 @@ async def get_report_card(
     current_user: User = Depends(get_current_user)
 ):
     """Generate report card for a student"""
-    # Get student info
-    student = await db.students.find_one({"id": student_id}, {"_id": 0})
-    if not student:
+    loaded = await load_report_card(db, student_id, exam_type_id)
+    if loaded is None:
         raise HTTPException(status_code=404, detail="Student not found")
     
-    # Get exam schedules for student's class
-    query = {"class_id": student['class_id']}
-    if exam_type_id:
-        query["exam_type_id"] = exam_type_id
-    
-    schedules = await db.exam_schedules.find(query, {"_id": 0}).to_list(1000)
-    
-    # Get marks for each schedule
-    results = []
-    total_marks_obtained = 0
-    total_marks_possible = 0
-    
-    for schedule in schedules:
-        marks = await db.marks.find_one({
-            "student_id": student_id,
-            "exam_schedule_id": schedule['id']
-        }, {"_id": 0})
-        
-        if marks:
-            total_marks_obtained += marks['marks_obtained']
-            total_marks_possible += schedule['total_marks']
-            
-            # Get subject name
-            subject = await db.subjects.find_one({"id": schedule['subject_id']}, {"_id": 0})
-            
-            results.append({
-                "subject_name": subject['name'] if subject else "Unknown",
-                "subject_code": subject['code'] if subject else "",
-                "marks_obtained": marks['marks_obtained'],
-                "total_marks": schedule['total_marks'],
-                "percentage": round((marks['marks_obtained'] / schedule['total_marks'] * 100), 2),
-                "remarks": marks.get('remarks', '')
-            })
-    
-    # Calculate overall percentage
-    overall_percentage = (total_marks_obtained / total_marks_possible * 100) if total_marks_possible > 0 else 0
-    
-    # Determine grade
-    grade_rules = await db.grade_rules.find({}, {"_id": 0}).sort("min_percentage", -1).to_list(100)
-    grade = "N/A"
-    for rule in grade_rules:
-        if rule['min_percentage'] <= overall_percentage <= rule['max_percentage']:
-            grade = rule['name']
-            break
-    
-    return {
-        "student": student,
-        "results": results,
-        "total_marks_obtained": total_marks_obtained,
-        "total_marks_possible": total_marks_possible,
-        "overall_percentage": round(overall_percentage, 2),
-        "grade": grade
-    }
+    student, schedules, marks_by_schedule = loaded
+    subjects = {subject.id: subject for subject in await reference_data.all("subjects")}
+    return compose_report_card(student, schedules, marks_by_schedule, subjects, await grade_table())
+
+@api_router.get("/report-cards")
+async def get_class_report_cards(
+    class_id: str,
+    section_id: Optional[str] = None,
+    exam_type_id: Optional[str] = None,
+    current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.TEACHER]))
+):
+    """Generate report cards for every student in a class, streamed as NDJSON"""
+    subjects = {subject.id: subject for subject in await reference_data.all("subjects")}
+    grades = await grade_table()
+    return ndjson_response(iter_class_report_cards(db, class_id, section_id, exam_type_id, subjects, grades))
 
 # ============ PHASE 4: Financial Management Routes ============
 
@@ -1135,22 +1647,24 @@ async def create_fee_type(
 ):
     """Create fee type"""
     fee_type_obj = FeeType(**fee_type.model_dump())
-    doc = fee_type_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc = codec_for(FeeType).dump(fee_type_obj)
     
     await db.fee_types.insert_one(doc)
+    await reference_data_changed("fee_types")
     return fee_type_obj
 
 @api_router.get("/fee-types", response_model=List[FeeType])
-async def get_fee_types(current_user: User = Depends(get_current_user)):
+async def get_fee_types(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user)
+):
     """Get all fee types"""
-    fee_types = await db.fee_types.find({}, {"_id": 0}).to_list(100)
-    
-    for fee_type in fee_types:
-        if isinstance(fee_type.get('created_at'), str):
-            fee_type['created_at'] = datetime.fromisoformat(fee_type['created_at'])
+    not_modified = conditional_response(request, response, "fee_types")
+    if not_modified:
+        return not_modified
     
-    return [FeeType(**fee_type) for fee_type in fee_types]
+    return await reference_data.all("fee_types")
 
 @api_router.post("/fee-structures", response_model=FeeStructure)
 async def create_fee_structure(
@@ -1159,10 +1673,7 @@ async def create_fee_structure(
 ):
     """Create fee structure"""
     fee_structure_obj = FeeStructure(**fee_structure.model_dump())
-    doc = fee_structure_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    if doc.get('due_date'):
-        doc['due_date'] = doc['due_date'].isoformat()
+    doc = codec_for(FeeStructure).dump(fee_structure_obj)
     
     await db.fee_structures.insert_one(doc)
     return fee_structure_obj
@@ -1182,13 +1693,7 @@ async def get_fee_structures(
     
     structures = await db.fee_structures.find(query, {"_id": 0}).to_list(1000)
     
-    for structure in structures:
-        if isinstance(structure.get('created_at'), str):
-            structure['created_at'] = datetime.fromisoformat(structure['created_at'])
-        if structure.get('due_date') and isinstance(structure['due_date'], str):
-            structure['due_date'] = datetime.fromisoformat(structure['due_date'])
-    
-    return [FeeStructure(**structure) for structure in structures]
+    return codec_for(FeeStructure).load_many(structures)
 
 @api_router.post("/invoices", response_model=Invoice)
 async def create_invoice(
@@ -1197,19 +1702,18 @@ async def create_invoice(
 ):
     """Create invoice"""
     invoice_obj = Invoice(**invoice.model_dump())
-    doc = invoice_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    doc['issue_date'] = doc['issue_date'].isoformat()
-    doc['due_date'] = doc['due_date'].isoformat()
+    doc = codec_for(Invoice).dump(invoice_obj)
     
     await db.invoices.insert_one(doc)
     return invoice_obj
 
 @api_router.get("/invoices", response_model=List[Invoice])
 async def get_invoices(
+    response: Response,
     student_id: Optional[str] = None,
     status: Optional[InvoiceStatus] = None,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
     current_user: User = Depends(get_current_user)
 ):
     """Get invoices"""
@@ -1219,41 +1723,27 @@ async def get_invoices(
     if status:
         query["status"] = status
     
-    invoices = await db.invoices.find(query, {"_id": 0}).sort("issue_date", -1).to_list(1000)
-    
-    for invoice in invoices:
-        if isinstance(invoice.get('created_at'), str):
-            invoice['created_at'] = datetime.fromisoformat(invoice['created_at'])
-        if isinstance(invoice.get('updated_at'), str):
-            invoice['updated_at'] = datetime.fromisoformat(invoice['updated_at'])
-        if isinstance(invoice.get('issue_date'), str):
-            invoice['issue_date'] = datetime.fromisoformat(invoice['issue_date'])
-        if isinstance(invoice.get('due_date'), str):
-            invoice['due_date'] = datetime.fromisoformat(invoice['due_date'])
+    selected = parse_fields(Invoice, fields)
+    cursor, headers = await paginated_find(
+        db.invoices, query, [("issue_date", -1), ("id", 1)], page, fields_projection(selected)
+    )
     
-    return [Invoice(**invoice) for invoice in invoices]
+    return await list_response(cursor, Invoice, response, headers, selected)
 
 @api_router.get("/invoices/{invoice_id}", response_model=Invoice)
 async def get_invoice(
     invoice_id: str,
+    fields: Optional[str] = None,
     current_user: User = Depends(get_current_user)
 ):
     """Get invoice by ID"""
-    invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
+    selected = parse_fields(Invoice, fields)
+    invoice = await db.invoices.find_one({"id": invoice_id}, fields_projection(selected))
     
     if not invoice:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    if isinstance(invoice.get('created_at'), str):
-        invoice['created_at'] = datetime.fromisoformat(invoice['created_at'])
-    if isinstance(invoice.get('updated_at'), str):
-        invoice['updated_at'] = datetime.fromisoformat(invoice['updated_at'])
-    if isinstance(invoice.get('issue_date'), str):
-        invoice['issue_date'] = datetime.fromisoformat(invoice['issue_date'])
-    if isinstance(invoice.get('due_date'), str):
-        invoice['due_date'] = datetime.fromisoformat(invoice['due_date'])
-    
-    return Invoice(**invoice)
+    return detail_response(invoice, Invoice, selected)
 
 @api_router.put("/invoices/{invoice_id}", response_model=Invoice)
 async def update_invoice(
@@ -1262,7 +1752,8 @@ async def update_invoice(
     current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.ACCOUNTANT]))
 ):
     """Update invoice"""
-    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
+    updates["updated_at"] = datetime.now(timezone.utc)
+    encode_updates(Invoice, updates)
     
     result = await db.invoices.update_one({"id": invoice_id}, {"$set": updates})
     
@@ -1271,16 +1762,7 @@ async def update_invoice(
     
     invoice = await db.invoices.find_one({"id": invoice_id}, {"_id": 0})
     
-    if isinstance(invoice.get('created_at'), str):
-        invoice['created_at'] = datetime.fromisoformat(invoice['created_at'])
-    if isinstance(invoice.get('updated_at'), str):
-        invoice['updated_at'] = datetime.fromisoformat(invoice['updated_at'])
-    if isinstance(invoice.get('issue_date'), str):
-        invoice['issue_date'] = datetime.fromisoformat(invoice['issue_date'])
-    if isinstance(invoice.get('due_date'), str):
-        invoice['due_date'] = datetime.fromisoformat(invoice['due_date'])
-    
-    return Invoice(**invoice)
+    return codec_for(Invoice).load(invoice)
 
 @api_router.post("/payments", response_model=Payment)
 async def create_payment(
@@ -1289,9 +1771,7 @@ async def create_payment(
 ):
     """Record payment"""
     payment_obj = Payment(**payment.model_dump())
-    doc = payment_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['payment_date'] = doc['payment_date'].isoformat()
+    doc = codec_for(Payment).dump(payment_obj)
     
     await db.payments.insert_one(doc)
     
@@ -1306,7 +1786,7 @@ async def create_payment(
             {"$set": {
                 "paid_amount": new_paid_amount,
                 "status": new_status,
-                "updated_at": datetime.now(timezone.utc).isoformat()
+                "updated_at": datetime.now(timezone.utc)
             }}
         )
     
@@ -1314,8 +1794,11 @@ async def create_payment(
 
 @api_router.get("/payments", response_model=List[Payment])
 async def get_payments(
+    response: Response,
     student_id: Optional[str] = None,
     invoice_id: Optional[str] = None,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
     current_user: User = Depends(get_current_user)
 ):
     """Get payments"""
@@ -1325,15 +1808,12 @@ async def get_payments(
     if invoice_id:
         query["invoice_id"] = invoice_id
     
-    payments = await db.payments.find(query, {"_id": 0}).sort("payment_date", -1).to_list(1000)
-    
-    for payment in payments:
-        if isinstance(payment.get('created_at'), str):
-            payment['created_at'] = datetime.fromisoformat(payment['created_at'])
-        if isinstance(payment.get('payment_date'), str):
-            payment['payment_date'] = datetime.fromisoformat(payment['payment_date'])
+    selected = parse_fields(Payment, fields)
+    cursor, headers = await paginated_find(
+        db.payments, query, [("payment_date", -1), ("id", 1)], page, fields_projection(selected)
+    )
     
-    return [Payment(**payment) for payment in payments]
+    return await list_response(cursor, Payment, response, headers, selected)
 
 @api_router.post("/income", response_model=Income)
 async def create_income(
@@ -1342,18 +1822,19 @@ async def create_income(
 ):
     """Record income"""
     income_obj = Income(**income.model_dump())
-    doc = income_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['date'] = doc['date'].isoformat()
+    doc = codec_for(Income).dump(income_obj)
     
     await db.income.insert_one(doc)
     return income_obj
 
 @api_router.get("/income", response_model=List[Income])
 async def get_income(
+    response: Response,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     category: Optional[IncomeCategory] = None,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
     current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.ACCOUNTANT]))
 ):
     """Get income records"""
@@ -1361,22 +1842,14 @@ async def get_income(
     if category:
         query["category"] = category
     
-    if date_from or date_to:
-        query["date"] = {}
-        if date_from:
-            query["date"]["$gte"] = date_from
-        if date_to:
-            query["date"]["$lte"] = date_to
+    query.update(date_range_filter("date", date_from, date_to))
     
-    income_records = await db.income.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
+    selected = parse_fields(Income, fields)
+    cursor, headers = await paginated_find(
+        db.income, query, [("date", -1), ("id", 1)], page, fields_projection(selected)
+    )
     
-    for income in income_records:
-        if isinstance(income.get('created_at'), str):
-            income['created_at'] = datetime.fromisoformat(income['created_at'])
-        if isinstance(income.get('date'), str):
-            income['date'] = datetime.fromisoformat(income['date'])
-    
-    return [Income(**income) for income in income_records]
+    return await list_response(cursor, Income, response, headers, selected, stream=False)
 
 @api_router.post("/expenses", response_model=Expense)
 async def create_expense(
@@ -1385,18 +1858,19 @@ async def create_expense(
 ):
     """Record expense"""
     expense_obj = Expense(**expense.model_dump())
-    doc = expense_obj.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['date'] = doc['date'].isoformat()
+    doc = codec_for(Expense).dump(expense_obj)
     
     await db.expenses.insert_one(doc)
     return expense_obj
 
 @api_router.get("/expenses", response_model=List[Expense])
 async def get_expenses(
+    response: Response,
     date_from: Optional[str] = None,
     date_to: Optional[str] = None,
     category: Optional[ExpenseCategory] = None,
+    fields: Optional[str] = None,
+    page: Page = Depends(),
     current_user: User = Depends(require_role([UserRole.ADMIN, UserRole.ACCOUNTANT]))
 ):
     """Get expense records"""
@@ -1404,22 +1878,14 @@ async def get_expenses(
     if category:
         query["category"] = category
     
-    if date_from or date_to:
-        query["date"] = {}
-        if date_from:
-            query["date"]["$gte"] = date_from
-        if date_to:
-            query["date"]["$lte"] = date_to
-    
-    expense_records = await db.expenses.find(query, {"_id": 0}).sort("date", -1).to_list(1000)
+    query.update(date_range_filter("date", date_from, date_to))
     
-    for expense in expense_records:
-        if isinstance(expense.get('created_at'), str):
-            expense['created_at'] = datetime.fromisoformat(expense['created_at'])
-        if isinstance(expense.get('date'), str):
-            expense['date'] = datetime.fromisoformat(expense['date'])
+    selected = parse_fields(Expense, fields)
+    cursor, headers = await paginated_find(
+        db.expenses, query, [("date", -1), ("id", 1)], page, fields_projection(selected)
+    )
     
-    return [Expense(**expense) for expense in expense_records]
+    return await list_response(cursor, Expense, response, headers, selected, stream=False)
 
 @api_router.get("/financial-reports")
 async def get_financial_reports(
@@ -1429,12 +1895,7 @@ async def get_financial_reports(
 ):
     """Get financial summary report"""
     query = {}
-    if date_from or date_to:
-        query["date"] = {}
-        if date_from:
-            query["date"]["$gte"] = date_from
-        if date_to:
-            query["date"]["$lte"] = date_to
+    query.update(date_range_filter("date", date_from, date_to))
     
     # Get income
     income_records = await db.income.find(query, {"_id": 0}).to_list(10000)
@@ -1446,12 +1907,7 @@ async def get_financial_reports(
     
     # Get fee collection
     payment_query = {}
-    if date_from or date_to:
-        payment_query["payment_date"] = {}
-        if date_from:
-            payment_query["payment_date"]["$gte"] = date_from
-        if date_to:
-            payment_query["payment_date"]["$lte"] = date_to
+    payment_query.update(date_range_filter("payment_date", date_from, date_to))
     
     payments = await db.payments.find(payment_query, {"_id": 0}).to_list(10000)
     total_fee_collected = sum(payment['amount'] for payment in payments)
@@ -1484,10 +1940,54 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, "X-Profile-Id"],
+)
+
+# Lets the command monitor attribute queries to the route being served
+app.add_middleware(RequestScopeMiddleware)
+
+app.add_middleware(
+    ProfilingMiddleware,
+    store=profile_store,
+    authorize=profiling_allowed,
+    interval=float(os.environ.get('PROFILE_INTERVAL_MS', '2')) / 1000
 )
 
+if METRICS_ENABLED:
+    # Outermost, so timings cover every other middleware
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def get_metrics():
+        """Prometheus text exposition of this worker's metrics"""
+        return PlainTextResponse(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.on_event("startup")
+async def create_indexes():
+    failures = await ensure_indexes(db)
+    if failures:
+        logger.error("%d indexes are missing, see the errors above", failures)
+
+@app.on_event("startup")
+async def start_collection_versions():
+    await collection_versions.start()
+
+@app.on_event("startup")
+async def start_counter_reconciliation():
+    collection_counters.start()
+
+@app.on_event("startup")
+async def start_event_loop_lag_monitor():
+    if METRICS_ENABLED:
+        event_loop_lag_monitor.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    # Write marks still waiting for a group commit before the connection closes
+    await attendance_coalescer.drain()
+    event_loop_lag_monitor.stop()
+    collection_counters.stop()
+    await collection_versions.stop()
     client.close()
 
 if __name__ == "__main__":
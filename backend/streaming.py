@@ -0,0 +1,116 @@
+from typing import AsyncIterable, AsyncIterator, Callable, Iterable, Optional, Sequence, Union
+from fastapi.responses import StreamingResponse
+import orjson
+
+# Match pydantic's JSON output: UTC datetimes as "...Z", naive ones assumed UTC
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC
+
+# Documents encoded per chunk written to the socket
+STREAM_CHUNK_DOCUMENTS = 200
+
+async def _iterate(docs: Iterable[dict]) -> AsyncIterator[dict]:
+    for doc in docs:
+        yield doc
+
+async def iter_json_array(
+    cursor: Union[AsyncIterable[dict], Iterable[dict]],
+    decode: Optional[Callable[[dict], dict]] = None,
+    chunk_documents: int = STREAM_CHUNK_DOCUMENTS
+) -> AsyncIterator[bytes]:
+    """Encode documents from an async cursor or a list as one JSON array, chunk by chunk"""
+    if not hasattr(cursor, "__aiter__"):
+        cursor = _iterate(cursor)
+    parts = [b"["]
+    pending = 0
+    separator = b""
+
+    async for doc in cursor:
+        if decode is not None:
+            doc = decode(doc)
+        parts.append(separator)
+        parts.append(orjson.dumps(doc, option=ORJSON_OPTIONS))
+        separator = b","
+        pending += 1
+
+        if pending >= chunk_documents:
+            yield b"".join(parts)
+            parts = []
+            pending = 0
+
+    parts.append(b"]")
+    yield b"".join(parts)
+
+class TrailingStreamingResponse(StreamingResponse):
+    """Streamed body with headers that are only known once the body has been produced
+
+    Where the server supports HTTP trailers the body streams and those headers
+    follow it as trailers. Otherwise the encoded body is held until it is complete
+    and they go out with the other headers.
+    """
+
+    def __init__(
+        self,
+        content: AsyncIterable[bytes],
+        late_headers: Callable[[], dict],
+        late_names: Sequence[str],
+        headers: Optional[dict] = None,
+        media_type: Optional[str] = None
+    ):
+        super().__init__(content, headers=headers, media_type=media_type)
+        self.late_headers = late_headers
+        self.late_names = late_names
+
+    async def __call__(self, scope, receive, send):
+        if "http.response.trailers" in scope.get("extensions", {}):
+            self.headers["trailer"] = ", ".join(self.late_names)
+            await send({"type": "http.response.start", "status": self.status_code,
+                        "headers": self.raw_headers, "trailers": True})
+            async for chunk in self.body_iterator:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            trailers = [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                        for name, value in self.late_headers().items()]
+            await send({"type": "http.response.trailers", "headers": trailers, "more_trailers": False})
+        else:
+            # Only encoded bytes wait here, never the documents they came from
+            body = b"".join([chunk async for chunk in self.body_iterator])
+            self.headers.update(self.late_headers())
+            self.headers["content-length"] = str(len(body))
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+            await send({"type": "http.response.body", "body": body})
+
+        if self.background is not None:
+            await self.background()
+
+def json_array_response(
+    cursor,
+    decode: Optional[Callable[[dict], dict]] = None,
+    headers: Optional[dict] = None,
+    late_headers: Optional[Callable[[], dict]] = None,
+    late_names: Sequence[str] = ()
+) -> StreamingResponse:
+    """Stream a Motor cursor, or documents already read, to the client as a JSON array
+
+    late_headers, if given, returns headers only known once the cursor has been
+    read, such as a page's next cursor; late_names lists the names it may return.
+    """
+    if late_headers is not None:
+        return TrailingStreamingResponse(
+            iter_json_array(cursor, decode), late_headers, late_names, headers, media_type="application/json"
+        )
+    return StreamingResponse(iter_json_array(cursor, decode), media_type="application/json", headers=headers)
+
+async def iter_ndjson(items: AsyncIterable[dict], chunk_documents: int = STREAM_CHUNK_DOCUMENTS) -> AsyncIterator[bytes]:
+    """Encode documents as newline-delimited JSON, chunk by chunk"""
+    parts = []
+    async for item in items:
+        parts.append(orjson.dumps(item, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE))
+        if len(parts) >= chunk_documents:
+            yield b"".join(parts)
+            parts = []
+    if parts:
+        yield b"".join(parts)
+
+def ndjson_response(items: AsyncIterable[dict], headers: Optional[dict] = None) -> StreamingResponse:
+    """Stream documents to the client as they are produced, one JSON document per line"""
+    return StreamingResponse(iter_ndjson(items), media_type="application/x-ndjson", headers=headers)
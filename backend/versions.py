@@ -0,0 +1,59 @@
+from pymongo import ReturnDocument
+from typing import Dict, Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CollectionVersions:
+    """Per-collection write counters, shared across workers through a small Mongo collection"""
+
+    def __init__(self, collection, poll_interval: float = 2.0):
+        self.collection = collection
+        self.poll_interval = poll_interval
+        self._versions: Dict[str, int] = {}
+        self._poller: Optional[asyncio.Task] = None
+
+    def get(self, name: str) -> int:
+        """Last known version of a collection; other workers' writes show up after one poll"""
+        return self._versions.get(name, 0)
+
+    def etag(self, *names: str) -> str:
+        """Strong ETag for data derived from the given collections"""
+        return '"' + ".".join(f"{name}-{self.get(name)}" for name in names) + '"'
+
+    async def bump(self, name: str) -> int:
+        """Record a write to a collection"""
+        doc = await self.collection.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._versions[name] = max(self._versions.get(name, 0), doc["version"])
+        return self._versions[name]
+
+    async def poll(self):
+        """Reload all counters"""
+        docs = await self.collection.find({}).to_list(None)
+        for doc in docs:
+            self._versions[doc["_id"]] = max(self._versions.get(doc["_id"], 0), doc["version"])
+
+    async def _poll_forever(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Polling collection versions failed")
+
+    async def start(self):
+        """Load the counters and keep them fresh in the background"""
+        await self.poll()
+        self._poller = asyncio.create_task(self._poll_forever())
+
+    async def stop(self):
+        """Stop the background poller"""
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Performance Benchmarks for School Management System
+Live benchmarks run against a backend (same URL resolution as backend_test.py):
+- Login throughput: latency of unrelated endpoints while logins are in flight
+- Attendance stats: aggregation over years of subject-wise records for one student
+- Attendance marking: concurrent single-record marks; run once with ATTENDANCE_COALESCE_MS=0
+  and once with it set to compare direct writes against group commit
+
+Offline microbenchmarks import the backend modules directly:
+- Codec: schema-driven document decoding vs per-field branching
+- Streaming: orjson-streamed list responses vs materialised Pydantic lists
+- Attendance storage: BSON size and counting speed of per-record vs bit-packed monthly documents
+- Report cards: composing and NDJSON-encoding a whole year group's cards from batched loads
+
+Usage: python backend_benchmark.py [benchmark ...]
+"""
+
+import asyncio
+import json
+import requests
+import sys
+import time
+import threading
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Offline benchmarks import backend modules the same way server.py does
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+
+# Get backend URL from frontend .env
+def get_backend_url():
+    env_path = Path("/app/frontend/.env")
+    if env_path.exists():
+        with open(env_path, 'r') as f:
+            for line in f:
+                if line.startswith('REACT_APP_BACKEND_URL='):
+                    return line.split('=', 1)[1].strip()
+    return "http://localhost:8001"
+
+BASE_URL = get_backend_url()
+API_URL = f"{BASE_URL}/api"
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def summarize(name, samples_ms):
+    """Print count and latency percentiles for a list of millisecond samples"""
+    print(f"{name}: n={len(samples_ms)} "
+          f"p50={percentile(samples_ms, 50):.1f}ms "
+          f"p90={percentile(samples_ms, 90):.1f}ms "
+          f"p99={percentile(samples_ms, 99):.1f}ms "
+          f"max={max(samples_ms, default=0):.1f}ms")
+
+class SchoolAPIBenchmark:
+    def __init__(self):
+        self.session = requests.Session()
+        self.auth_token = None
+
+    def make_request(self, method, endpoint, data=None, params=None, session=None):
+        """Make authenticated API request"""
+        headers = {}
+        if self.auth_token:
+            headers["Authorization"] = f"Bearer {self.auth_token}"
+        session = session or self.session
+        return session.request(method, f"{API_URL}{endpoint}", headers=headers, json=data, params=params)
+
+    def authenticate(self):
+        """Log in as the benchmark admin, registering it on first run"""
+        if self.auth_token:
+            return
+        credentials = {"username": "bench_admin", "password": "bench123"}
+        response = self.make_request("POST", "/auth/login", credentials)
+        if response.status_code != 200:
+            self.make_request("POST", "/auth/register", {
+                "username": "bench_admin",
+                "email": "bench.admin@school.edu",
+                "name": "Benchmark Admin",
+                "role": "admin",
+                "password": "bench123"
+            })
+            response = self.make_request("POST", "/auth/login", credentials)
+        response.raise_for_status()
+        self.auth_token = response.json()["access_token"]
+
+    def bench_login_throughput(self, concurrent_logins=200, rounds=3):
+        """p99 of an unrelated endpoint while many logins hash passwords"""
+        print(f"\n=== Login Throughput ({concurrent_logins} concurrent logins) ===")
+        self.authenticate()
+
+        def timed_probe(samples, stop):
+            probe_session = requests.Session()
+            while not stop.is_set():
+                started = time.perf_counter()
+                self.make_request("GET", "/settings", session=probe_session)
+                samples.append((time.perf_counter() - started) * 1000)
+
+        def login(_):
+            started = time.perf_counter()
+            requests.post(f"{API_URL}/auth/login", json={"username": "bench_admin", "password": "bench123"})
+            return (time.perf_counter() - started) * 1000
+
+        idle = []
+        stop = threading.Event()
+        probe = threading.Thread(target=timed_probe, args=(idle, stop))
+        probe.start()
+        time.sleep(2)
+        stop.set()
+        probe.join()
+        summarize("GET /settings (idle)", idle)
+
+        busy = []
+        stop = threading.Event()
+        probe = threading.Thread(target=timed_probe, args=(busy, stop))
+        probe.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrent_logins) as pool:
+            login_times = list(pool.map(login, range(concurrent_logins * rounds)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        probe.join()
+
+        summarize("GET /settings (during logins)", busy)
+        summarize("POST /auth/login", login_times)
+        print(f"Login throughput: {len(login_times) / elapsed:.1f} logins/s")
+
+        stats = self.make_request("GET", "/admin/runtime-stats")
+        if stats.status_code == 200:
+            print(f"Hashing pool after run: {stats.json().get('password_hashing')}")
+
+    def bench_codec(self, documents=10000, repeat=5):
+        """Decode stored Student documents: codec vs hand-written branching"""
+        print(f"\n=== Document Codec ({documents} Student documents) ===")
+        from codec import codec_for
+        from models import Student
+
+        def legacy_decode(student):
+            if isinstance(student.get('created_at'), str):
+                student['created_at'] = datetime.fromisoformat(student['created_at'])
+            if isinstance(student.get('updated_at'), str):
+                student['updated_at'] = datetime.fromisoformat(student['updated_at'])
+            if student.get('dob') and isinstance(student['dob'], str):
+                student['dob'] = datetime.fromisoformat(student['dob'])
+            if student.get('admission_date') and isinstance(student['admission_date'], str):
+                student['admission_date'] = datetime.fromisoformat(student['admission_date'])
+            return student
+
+        # Documents as written before the BSON date migration, with ISO string dates
+        now = datetime.now(timezone.utc)
+        stored = [Student(
+            user_id=str(uuid.uuid4()),
+            name=f"Student {i}",
+            roll_no=str(i),
+            class_id="class-1",
+            section_id="section-a",
+            school_year_id="year-1",
+            dob=now - timedelta(days=5000 + i % 1000),
+            admission_date=now - timedelta(days=i % 700)
+        ).model_dump(mode="json") for i in range(documents)]
+
+        codec = codec_for(Student)
+        variants = {
+            "per-field branching": lambda docs: [legacy_decode(doc) for doc in docs],
+            "codec decode": lambda docs: [codec.decode(doc) for doc in docs],
+            "per-field branching + models": lambda docs: [Student(**legacy_decode(doc)) for doc in docs],
+            "codec load_many": codec.load_many,
+        }
+        for name, run in variants.items():
+            timings = []
+            for _ in range(repeat):
+                docs = [dict(doc) for doc in stored]
+                started = time.perf_counter()
+                run(docs)
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f"{name}: best={min(timings):.1f}ms median={sorted(timings)[len(timings) // 2]:.1f}ms")
+
+    def bench_streaming(self, documents=50000):
+        """Peak memory and time-to-first-byte of a 50k-row attendance list response"""
+        print(f"\n=== Streaming List Response ({documents} attendance rows) ===")
+        from typing import List
+        from pydantic import TypeAdapter
+        from codec import codec_for
+        from models import Attendance
+        from streaming import iter_json_array
+
+        now = datetime.now(timezone.utc)
+        stored = [Attendance(
+            student_id=f"student-{i % 600}",
+            class_id="class-1",
+            section_id="section-a",
+            date=now - timedelta(days=i // 600),
+            status="present" if i % 7 else "absent",
+            marked_by="teacher-1"
+        ).model_dump() for i in range(documents)]
+
+        class FakeCursor:
+            """Yields fresh dicts like a Motor cursor decoding BSON"""
+            def __init__(self, docs):
+                self.docs = docs
+
+            async def to_list(self, length):
+                return [dict(doc) for doc in self.docs]
+
+            def __aiter__(self):
+                return self._iterate()
+
+            async def _iterate(self):
+                for doc in self.docs:
+                    yield dict(doc)
+
+        adapter = TypeAdapter(List[Attendance])
+
+        async def materialised():
+            # What FastAPI does with response_model=List[Attendance]
+            started = time.perf_counter()
+            models = codec_for(Attendance).load_many(await FakeCursor(stored).to_list(None))
+            content = adapter.dump_python(adapter.validate_python(models), mode="json")
+            body = json.dumps(content).encode()
+            elapsed = time.perf_counter() - started
+            return elapsed, elapsed, len(body)
+
+        async def streamed():
+            started = time.perf_counter()
+            first_byte = None
+            size = 0
+            async for chunk in iter_json_array(FakeCursor(stored), codec_for(Attendance).decode):
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+                size += len(chunk)
+            return first_byte, time.perf_counter() - started, size
+
+        for name, run in (("materialised models", materialised), ("orjson stream", streamed)):
+            tracemalloc.start()
+            first_byte, total, size = asyncio.run(run())
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name}: ttfb={first_byte * 1000:.1f}ms total={total * 1000:.1f}ms "
+                  f"peak={peak / 1024 / 1024:.1f}MiB body={size / 1024 / 1024:.1f}MiB")
+
+    def bench_attendance_stats(self, years=3, school_days=190, subjects=6, requests_count=50):
+        """/attendance/stats for a student with years of subject-wise attendance"""
+        records = years * school_days * subjects
+        print(f"\n=== Attendance Stats ({records} records for one student) ===")
+        self.authenticate()
+
+        student_id = f"bench-student-{uuid.uuid4().hex[:8]}"
+        statuses = ["present"] * 14 + ["absent", "late", "half_day", "excused"]
+        start = datetime(2021, 9, 1, tzinfo=timezone.utc)
+        rows = [{
+            "student_id": student_id,
+            "class_id": "bench-class",
+            "section_id": "bench-section",
+            "subject_id": f"bench-subject-{subject}",
+            "date": (start + timedelta(days=day * 365 // school_days)).isoformat(),
+            "status": statuses[(day * subjects + subject) % len(statuses)],
+            "marked_by": "bench-teacher"
+        } for day in range(years * school_days) for subject in range(subjects)]
+
+        started = time.perf_counter()
+        for offset in range(0, len(rows), 1000):
+            self.make_request("POST", "/attendance/bulk", rows[offset:offset + 1000]).raise_for_status()
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+        timings = []
+        for _ in range(requests_count):
+            started = time.perf_counter()
+            response = self.make_request("GET", "/attendance/stats", params={"student_id": student_id})
+            timings.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+        summarize("GET /attendance/stats", timings)
+        print(f"Result: {response.json()}")
+
+        # Baseline: fetch the raw records and count them client-side
+        timings = []
+        for _ in range(max(1, requests_count // 10)):
+            started = time.perf_counter()
+            response = self.make_request("GET", "/attendance", params={"student_id": student_id, "limit": 5000})
+            counts = {}
+            for record in response.json():
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+            timings.append((time.perf_counter() - started) * 1000)
+        summarize("GET /attendance + client-side counting", timings)
+
+    def bench_attendance_marking(self, teachers=100, students_per_teacher=30):
+        """Throughput and latency of POST /attendance with many teachers marking at once"""
+        marks = teachers * students_per_teacher
+        print(f"\n=== Attendance Marking ({teachers} teachers, {marks} single marks) ===")
+        self.authenticate()
+        stats = self.make_request("GET", "/admin/runtime-stats").json().get("attendance_coalescing")
+        print(f"Group commit: {'enabled' if stats is not None else 'disabled'}")
+
+        run = uuid.uuid4().hex[:8]
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).isoformat()
+
+        def teacher(index):
+            # Each teacher works through their class one student at a time, like the UI
+            session = requests.Session()
+            timings = []
+            for student in range(students_per_teacher):
+                started = time.perf_counter()
+                self.make_request("POST", "/attendance", {
+                    "student_id": f"bench-{run}-{index}-{student}",
+                    "class_id": f"bench-class-{index}",
+                    "section_id": "bench-section",
+                    "date": today,
+                    "status": "present" if student % 9 else "absent",
+                    "marked_by": f"bench-teacher-{index}"
+                }, session=session).raise_for_status()
+                timings.append((time.perf_counter() - started) * 1000)
+            return timings
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=teachers) as pool:
+            timings = [sample for samples in pool.map(teacher, range(teachers)) for sample in samples]
+        elapsed = time.perf_counter() - started
+
+        summarize("POST /attendance", timings)
+        print(f"Throughput: {marks / elapsed:.1f} marks/s")
+        stats = self.make_request("GET", "/admin/runtime-stats").json().get("attendance_coalescing")
+        if stats is not None:
+            print(f"Batches after run: {stats}")
+
+    def bench_attendance_storage(self, students=600, years=3, school_days=190, repeat=5):
+        """Stored size and stats-counting time of attendance records vs packed month documents"""
+        records = students * years * school_days
+        print(f"\n=== Attendance Storage ({records} records, {students} students) ===")
+        from bson import encode
+        from codec import codec_for
+        from models import Attendance
+        from packed_attendance import _count, month_id, month_start, pack_days
+
+        statuses = ["present"] * 14 + ["absent", "late", "half_day", "excused"]
+        start = datetime(2021, 9, 1, tzinfo=timezone.utc)
+        rows = [Attendance(
+            student_id=f"student-{student}",
+            class_id="class-1",
+            section_id="section-a",
+            date=start + timedelta(days=day * 365 // school_days),
+            status=statuses[(day + student) % len(statuses)],
+            marked_by="teacher-1"
+        ) for student in range(students) for day in range(years * school_days)]
+
+        # The documents both storage modes would write for the same marks
+        record_docs = [codec_for(Attendance).dump(row) for row in rows]
+        months = {}
+        for row in rows:
+            month = month_start(row.date)
+            doc = months.setdefault(month_id(row.student_id, None, month), {
+                "_id": month_id(row.student_id, None, month),
+                "student_id": row.student_id,
+                "subject_id": None,
+                "month": month,
+                "class_id": row.class_id,
+                "section_id": row.section_id,
+                "marked_by": row.marked_by,
+                "updated_at": row.created_at,
+                "days": {}
+            })
+            doc["days"][row.date.day] = row.status.value
+        month_docs = [{**{k: v for k, v in doc.items() if k != "days"}, **pack_days(doc["days"])}
+                      for doc in months.values()]
+
+        for name, docs in (("records", record_docs), ("packed months", month_docs)):
+            size = sum(len(encode(doc)) for doc in docs)
+            print(f"{name}: {len(docs)} documents, {size / 1024 / 1024:.1f}MiB BSON, "
+                  f"{size / records:.1f} bytes per mark")
+
+        def count_records(docs):
+            counts = {"total": 0}
+            for doc in docs:
+                counts[doc["status"]] = counts.get(doc["status"], 0) + 1
+                counts["total"] += 1
+            return counts
+
+        # Decoding work per mark once documents reach the application
+        for name, run in (("count records", lambda: count_records(record_docs)),
+                          ("unpack and count months", lambda: _count(month_docs, None, None))):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+            print(f"{name}: best={min(timings):.1f}ms median={sorted(timings)[len(timings) // 2]:.1f}ms")
+
+    def bench_report_cards(self, students=2000, subjects=10, exams=4, batch_size=500):
+        """In-memory work of GET /report-cards for a 2000-student year group"""
+        print(f"\n=== Report Cards ({students} students, {subjects * exams} exam schedules) ===")
+        import orjson
+        from grading import GradeTable
+        from models import GradeRule, Subject
+        from reports import compose_report_cards
+        from streaming import ORJSON_OPTIONS
+
+        now = datetime.now(timezone.utc)
+        student_docs = [{"id": f"student-{i}", "name": f"Student {i}", "roll_no": str(i), "class_id": "class-1",
+                         "section_id": f"section-{i % 4}", "created_at": now} for i in range(students)]
+        schedules = [{"id": f"schedule-{exam}-{subject}", "class_id": "class-1", "exam_type_id": f"exam-{exam}",
+                      "subject_id": f"subject-{subject}", "total_marks": 100.0}
+                     for exam in range(exams) for subject in range(subjects)]
+        marks = [{"student_id": student["id"], "exam_schedule_id": schedule["id"],
+                  "marks_obtained": float((i * 37 + j * 11) % 101), "remarks": None}
+                 for i, student in enumerate(student_docs) for j, schedule in enumerate(schedules)]
+        subject_models = {f"subject-{i}": Subject(name=f"Subject {i}", code=f"S{i}", class_id="class-1")
+                          for i in range(subjects)}
+        grades = GradeTable([GradeRule(name=name, min_percentage=low, max_percentage=high)
+                             for name, low, high in (("A", 80, 100), ("B", 60, 79.99), ("C", 40, 59.99), ("F", 0, 39.99))])
+
+        # Marks arrive per batch of students, as iter_class_report_cards queries them
+        marks_by_batch = [marks[offset * len(schedules):(offset + batch_size) * len(schedules)]
+                          for offset in range(0, students, batch_size)]
+        started = time.perf_counter()
+        size = 0
+        for index, batch_marks in enumerate(marks_by_batch):
+            batch = student_docs[index * batch_size:(index + 1) * batch_size]
+            for card in compose_report_cards(batch, schedules, batch_marks, subject_models, grades):
+                size += len(orjson.dumps(card, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE))
+        elapsed = time.perf_counter() - started
+        print(f"Composed and encoded {students} cards from {len(marks)} marks in {elapsed * 1000:.0f}ms "
+              f"({size / 1024 / 1024:.1f}MiB NDJSON)")
+        print(f"Queries: 1 schedules + 1 students cursor + {len(marks_by_batch)} marks batches "
+              f"(vs {students} report-card requests of 3 queries each)")
+
+    def bench_grading(self, percentages=50000, rules=12, repeat=5):
+        """Grading percentages by scanning the rules, by bisect and as one array"""
+        print(f"\n=== Grading ({percentages} percentages, {rules} grade rules) ===")
+        import numpy as np
+        from grading import GradeTable
+        from models import GradeRule
+
+        width = 100 / rules
+        grade_rules = [GradeRule(name=f"G{i}", min_percentage=round(i * width, 2),
+                                 max_percentage=100.0 if i == rules - 1 else round((i + 1) * width - 0.01, 2))
+                       for i in reversed(range(rules))]
+        values = np.random.default_rng(0).uniform(0, 100, percentages).round(2)
+        as_list = values.tolist()
+
+        def scan():
+            # The lookup report cards used before grade tables
+            return [next((rule.name for rule in grade_rules
+                          if rule.min_percentage <= p <= rule.max_percentage), "N/A") for p in as_list]
+
+        started = time.perf_counter()
+        grades = GradeTable(grade_rules)
+        compile_ms = (time.perf_counter() - started) * 1000
+
+        expected = scan()
+        assert [grades.grade(p) for p in as_list] == expected
+        assert grades.grade_many(values).tolist() == expected
+
+        for label, run in (("linear scan", scan),
+                           ("bisect", lambda: [grades.grade(p) for p in as_list]),
+                           ("grade_many", lambda: grades.grade_many(values))):
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+            print(f"{label}: best={min(timings) * 1000:.1f}ms median={sorted(timings)[len(timings) // 2] * 1000:.1f}ms")
+        print(f"Compiling the table: {compile_ms:.3f}ms")
+
+BENCHMARKS = {
+    "login": "bench_login_throughput",
+    "codec": "bench_codec",
+    "streaming": "bench_streaming",
+    "attendance-stats": "bench_attendance_stats",
+    "attendance-storage": "bench_attendance_storage",
+    "attendance-marking": "bench_attendance_marking",
+    "report-cards": "bench_report_cards",
+    "grading": "bench_grading",
+}
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    benchmark = SchoolAPIBenchmark()
+    for name in selected:
+        getattr(benchmark, BENCHMARKS[name])()
@@ -56,7 +56,7 @@ const AttendanceManagement = () => {
   const fetchStudents = async () => {
     try {
       const response = await fetch(
-        `${BACKEND_URL}/api/students?class_id=${selectedClass}&section_id=${selectedSection}`,
+        `${BACKEND_URL}/api/students?class_id=${selectedClass}&section_id=${selectedSection}&fields=name,admission_number`,
         { headers: { Authorization: `Bearer ${token}` } }
       );
       if (response.ok) {
@@ -10,6 +10,9 @@ import {
 
 const API_URL = process.env.REACT_APP_BACKEND_URL + '/api';
 
+// Attendance rates are null until today's register has been taken
+const formatRate = (rate) => (rate === null || rate === undefined ? '—' : `${rate}%`);
+
 const Dashboard = () => {
   const { user } = useAuth();
   const [stats, setStats] = useState({});
@@ -148,6 +151,18 @@ const Dashboard = () => {
                       {stats.my_subjects || 0}
                     </p>
                   </div>
+                  <div className="p-4 bg-purple-50 rounded-lg">
+                    <p className="text-sm text-purple-600 font-medium">Attendance Today</p>
+                    <p className="text-2xl font-bold text-purple-900 mt-1">
+                      {formatRate(stats.attendance_rate_today)}
+                    </p>
+                  </div>
+                  <div className="p-4 bg-orange-50 rounded-lg">
+                    <p className="text-sm text-orange-600 font-medium">Pending Marks Entries</p>
+                    <p className="text-2xl font-bold text-orange-900 mt-1">
+                      {stats.pending_marks_entries || 0}
+                    </p>
+                  </div>
                 </div>
               </div>
 
@@ -175,6 +190,12 @@ const Dashboard = () => {
             <div className="bg-white rounded-xl shadow-sm p-6 border border-gray-100">
               <h3 className="text-lg font-semibold text-gray-900 mb-4">My Profile</h3>
               <p className="text-gray-600">Welcome to your student dashboard!</p>
+              <p className="text-gray-600 mt-2">
+                Attendance today: {formatRate(stats.attendance_rate_today)}
+              </p>
+              <p className="text-gray-600">
+                Outstanding fees: {(stats.outstanding_fees || 0).toFixed(2)}
+              </p>
             </div>
           )}
 
@@ -184,6 +205,12 @@ const Dashboard = () => {
               <p className="text-gray-600">
                 Number of children: {stats.my_children || 0}
               </p>
+              <p className="text-gray-600">
+                Attendance today: {formatRate(stats.attendance_rate_today)}
+              </p>
+              <p className="text-gray-600">
+                Outstanding fees: {(stats.outstanding_fees || 0).toFixed(2)}
+              </p>
             </div>
           )}
         </div>
@@ -0,0 +1,210 @@
+"""
+Tests for upserting attendance registers with upsert_records in backend/attendance.py
+
+Needs a running MongoDB (MONGO_URL, default mongodb://localhost:27017); skipped otherwise.
+"""
+
+import asyncio
+import os
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import AutoReconnect, BulkWriteError, PyMongoError
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from attendance import DUPLICATE_KEY, record_key, upsert_records  # noqa: E402
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+TEST_DB_NAME = os.environ.get("ATTENDANCE_UPSERT_TEST_DB_NAME", "school_attendance_upsert_test")
+
+DATE = datetime(2024, 3, 4, tzinfo=timezone.utc)
+
+def record(n: int, status: str = "present") -> dict:
+    return {
+        "id": f"record-{n}-{status}",
+        "student_id": f"student-{n}",
+        "class_id": "class-1",
+        "section_id": "section-1",
+        "date": DATE,
+        "subject_id": None,
+        "status": status,
+        "marked_by": "teacher",
+        "created_at": datetime(2024, 3, 4, 9, n, tzinfo=timezone.utc)
+    }
+
+def run(*registers, chunk_size: int = 500):
+    """Upsert registers concurrently, returning each one's (results, changes)"""
+    async def go():
+        client = AsyncIOMotorClient(MONGO_URL, tz_aware=True)
+        try:
+            collection = client[TEST_DB_NAME].attendance
+            return await asyncio.gather(*(upsert_records(collection, docs, chunk_size) for docs in registers))
+        finally:
+            client.close()
+
+    return asyncio.run(go())
+
+@pytest.fixture
+def db():
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"MongoDB is not reachable at {MONGO_URL}")
+
+    client.drop_database(TEST_DB_NAME)
+    client[TEST_DB_NAME].attendance.create_index(
+        [("student_id", 1), ("date", 1), ("subject_id", 1)], unique=True
+    )
+
+    yield client[TEST_DB_NAME]
+
+    client.drop_database(TEST_DB_NAME)
+    client.close()
+
+def test_insert_then_update(db):
+    [(results, changes)] = run([record(0), record(1)])
+
+    assert [(r["index"], r["status"], r["id"]) for r in results] == [
+        (0, "inserted", "record-0-present"), (1, "inserted", "record-1-present")]
+    assert [(doc["id"], sign) for doc, sign in changes] == [("record-0-present", 1), ("record-1-present", 1)]
+
+    [(results, changes)] = run([record(0, "absent"), record(2)])
+
+    # The stored record keeps its id and created_at; the old status leaves the counts
+    assert [(r["status"], r["id"]) for r in results] == [("updated", "record-0-present"), ("inserted", "record-2-present")]
+    assert [(doc["status"], sign) for doc, sign in changes] == [("present", -1), ("absent", 1), ("present", 1)]
+    assert changes[1][0]["created_at"] == record(0)["created_at"]
+    assert db.attendance.count_documents({}) == 3
+    assert db.attendance.find_one({"student_id": "student-0"})["status"] == "absent"
+
+def test_duplicate_rows_in_one_register(db):
+    [(results, changes)] = run([record(0, "present"), record(0, "late")])
+
+    assert [r["status"] for r in results] == ["inserted", "updated"]
+    assert results[1]["id"] == "record-0-present"
+    assert [(doc["status"], sign) for doc, sign in changes] == [("present", 1), ("present", -1), ("late", 1)]
+    assert db.attendance.find_one({"student_id": "student-0"})["status"] == "late"
+
+def test_chunks_keep_document_order(db):
+    docs = [record(n) for n in range(7)] + [record(2, "absent")]
+
+    [(results, changes)] = run(docs, chunk_size=3)
+
+    assert [r["index"] for r in results] == list(range(8))
+    assert [r["status"] for r in results] == ["inserted"] * 7 + ["updated"]
+    assert [doc["student_id"] for doc, sign in changes if sign > 0] == [doc["student_id"] for doc in docs]
+    assert db.attendance.count_documents({}) == 7
+
+def test_concurrent_resubmissions_net_one_record_per_key(db):
+    first = [record(n, "present") for n in range(20)]
+    second = [record(n, "absent") for n in range(20)]
+
+    outcomes = run(first, second)
+
+    statuses = Counter(r["status"] for results, _ in outcomes for r in results)
+    assert statuses == {"inserted": 20, "updated": 20}
+    net = Counter()
+    for _, changes in outcomes:
+        for doc, sign in changes:
+            net[doc["student_id"]] += sign
+    assert set(net.values()) == {1}
+    assert db.attendance.count_documents({}) == 20
+
+class Records:
+    """Attendance collection answering upsert_records' $in read and guarded bulk writes
+
+    before_write(records) runs between the read and each bulk write, standing in
+    for another request's write; fail_writes makes bulk writes after the first n fail.
+    """
+
+    def __init__(self, before_write=None, fail_writes=None):
+        self.records = {}
+        self.before_write = before_write
+        self.fail_writes = fail_writes
+        self.writes = 0
+
+    def find(self, query, projection):
+        return _Found([dict(record) for record in self.records.values()
+                       if all(record.get(field) in condition["$in"] for field, condition in query.items())])
+
+    async def bulk_write(self, operations, ordered=True):
+        self.writes += 1
+        if self.fail_writes is not None and self.writes > self.fail_writes:
+            raise AutoReconnect("connection closed")
+        if self.before_write:
+            self.before_write(self.records)
+        errors, upserted = [], []
+        for index, operation in enumerate(operations):
+            guard, update = operation._filter, operation._doc
+            key = record_key(guard)
+            stored = self.records.get(key)
+            if stored is None:
+                values = {field: value for field, value in guard.items() if not isinstance(value, dict)}
+                self.records[key] = {**values, **update["$setOnInsert"], **update["$set"]}
+                upserted.append({"index": index, "_id": key})
+            elif matches(stored, guard):
+                stored.update(update["$set"])
+            else:
+                # The upsert's insert collides with the record under the key
+                errors.append({"index": index, "code": DUPLICATE_KEY, "errmsg": "E11000 duplicate key"})
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "upserted": upserted})
+        return _Written({u["index"]: u["_id"] for u in upserted})
+
+def matches(record, guard):
+    for field, value in guard.items():
+        if isinstance(value, dict):
+            if (field in record) != value["$exists"]:
+                return False
+        elif record.get(field) != value:
+            return False
+    return True
+
+class _Found:
+    def __init__(self, records):
+        self.records = records
+
+    async def __aiter__(self):
+        for record in self.records:
+            yield record
+
+class _Written:
+    def __init__(self, upserted_ids):
+        self.upserted_ids = upserted_ids
+
+def upsert(collection, docs, chunk_size=500):
+    return asyncio.run(upsert_records(collection, docs, chunk_size))
+
+def test_record_changed_after_read_is_retried():
+    collection = Records()
+    upsert(collection, [record(0, "present")])
+
+    def remark_late(records):
+        # Another request re-marks the student between this request's read and write
+        collection.before_write = None
+        for stored in records.values():
+            stored["status"] = "late"
+
+    collection.before_write = remark_late
+    results, changes = upsert(collection, [record(0, "absent")])
+
+    assert [r["status"] for r in results] == ["updated"]
+    # The record replaced is the late one actually overwritten, not the present one read first
+    assert [(doc["status"], sign) for doc, sign in changes] == [("late", -1), ("absent", 1)]
+    assert collection.writes == 3
+
+def test_failed_chunk_keeps_earlier_changes():
+    collection = Records(fail_writes=1)
+
+    results, changes = upsert(collection, [record(n) for n in range(4)], chunk_size=2)
+
+    assert [r["status"] for r in results] == ["inserted", "inserted", "failed", "failed"]
+    assert results[2]["error"] == "connection closed"
+    assert [doc["student_id"] for doc, sign in changes] == ["student-0", "student-1"]
@@ -0,0 +1,46 @@
+"""
+Tests for the group-commit queue in backend/coalescing.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from coalescing import WriteCoalescer  # noqa: E402
+
+def submit_all(coalescer: WriteCoalescer, items):
+    async def go():
+        return await asyncio.wait_for(
+            asyncio.gather(*(coalescer.submit(item) for item in items), return_exceptions=True), 1
+        )
+    return asyncio.run(go())
+
+def test_concurrent_items_share_one_write():
+    batches = []
+
+    async def write(items):
+        batches.append(items)
+        return [item * 2 for item in items]
+
+    coalescer = WriteCoalescer(write, max_batch=3, max_delay=0.01)
+
+    assert submit_all(coalescer, [1, 2, 3, 4]) == [2, 4, 6, 8]
+    assert batches == [[1, 2, 3], [4]]
+
+def test_short_results_fail_the_batch_instead_of_hanging():
+    async def write(items):
+        return [True] * (len(items) - 1)
+
+    outcomes = submit_all(WriteCoalescer(write, max_delay=0.001), ["a", "b"])
+
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+def test_write_error_reaches_every_caller():
+    async def write(items):
+        raise ValueError("down")
+
+    outcomes = submit_all(WriteCoalescer(write, max_delay=0.001), ["a", "b"])
+
+    assert [(type(outcome), str(outcome)) for outcome in outcomes] == [(ValueError, "down")] * 2
@@ -0,0 +1,69 @@
+"""
+Tests for the compiled grade tables in backend/grading.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from grading import GradeTable, find_gaps, find_overlaps  # noqa: E402
+from models import GradeRule  # noqa: E402
+
+def rules(*ranges):
+    return [GradeRule(name=name, min_percentage=low, max_percentage=high) for name, low, high in ranges]
+
+STANDARD = rules(("A", 80, 100), ("B", 60, 79.99), ("C", 40, 59.99), ("F", 0, 39.99))
+
+def scan(grade_rules, percentage):
+    """The linear lookup grade tables replace: first covering rule by descending minimum"""
+    for rule in sorted(grade_rules, key=lambda rule: -rule.min_percentage):
+        if rule.min_percentage <= percentage <= rule.max_percentage:
+            return rule.name
+    return "N/A"
+
+def test_grade_boundaries():
+    grades = GradeTable(STANDARD)
+
+    assert [grades.grade(p) for p in (0, 39.99, 40, 79.99, 80, 100)] == ["F", "F", "C", "B", "A", "A"]
+    assert grades.grade(79.995) == "N/A"
+    assert grades.grade(100.5) == "N/A"
+    assert grades.grade(-1) == "N/A"
+
+def test_grade_many_matches_grade():
+    grades = GradeTable(STANDARD)
+    percentages = np.array([-1, 0, 39.99, 39.995, 40, 65.5, 79.99, 80, 100, 101, np.nan])
+
+    assert grades.grade_many(percentages).tolist() == [grades.grade(p) for p in percentages]
+
+def test_empty_table():
+    grades = GradeTable([])
+
+    assert grades.grade(50) == "N/A"
+    assert grades.grade_many([10, 90]).tolist() == ["N/A", "N/A"]
+    assert grades.gaps == [(0.0, 100.0)]
+
+def test_overlapping_rules_match_linear_scan():
+    # Rules saved before overlaps were rejected still grade as they used to
+    legacy = rules(("Wide", 0, 100), ("B", 50, 70), ("A", 90, 95))
+    grades = GradeTable(legacy)
+    percentages = np.linspace(-5, 105, 221)
+
+    expected = [scan(legacy, p) for p in percentages]
+    assert [grades.grade(p) for p in percentages] == expected
+    assert grades.grade_many(percentages).tolist() == expected
+    assert grades.grade(80) == "Wide"
+
+def test_overlaps():
+    assert find_overlaps(GradeTable(STANDARD).rules) == []
+    assert GradeTable(rules(("A", 80, 100), ("B", 60, 80))).overlaps == [("B", "A")]
+
+    grades = GradeTable(STANDARD)
+    assert [rule.name for rule in grades.overlapping(75, 85)] == ["B", "A"]
+    assert grades.overlapping(79.995, 79.999) == []
+
+def test_gaps():
+    assert find_gaps(GradeTable(STANDARD).rules) == []
+    assert GradeTable(rules(("A", 80, 100), ("C", 40, 59.99))).gaps == [(0.0, 40), (59.99, 80)]
@@ -0,0 +1,185 @@
+"""
+Query plan regression tests for the index registry in backend/indexes.py
+
+Runs explain() for the query shape of every route against a scratch database and
+fails when MongoDB would answer it with a collection scan. Needs a running MongoDB
+(MONGO_URL, default mongodb://localhost:27017); skipped otherwise.
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from indexes import INDEXES, ensure_indexes  # noqa: E402
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+TEST_DB_NAME = os.environ.get("INDEX_TEST_DB_NAME", "school_index_plan_test")
+
+CREATED_ASC = [("created_at", 1), ("id", 1)]
+DATE_DESC = [("date", -1), ("id", 1)]
+
+def date_range(field: str, legacy: bool) -> dict:
+    """A date range filter as server.date_range_filter builds it
+
+    While LEGACY_STRING_DATES is on (the default) it matches native datetimes or ISO
+    strings of documents migrate-dates has not reached yet.
+    """
+    native = {field: {"$gte": datetime(2024, 1, 1, tzinfo=timezone.utc),
+                      "$lte": datetime(2024, 3, 31, tzinfo=timezone.utc)}}
+    if not legacy:
+        return native
+    return {"$or": [native, {field: {"$gte": "2024-01-01", "$lte": "2024-03-31"}}]}
+
+# (route, collection, filter, sort) for every lookup the API issues.
+# Full loads of reference collections are intentionally left out.
+QUERY_SHAPES = [
+    ("POST /auth/login", "users", {"username": "u"}, None),
+    ("POST /auth/register", "users", {"email": "u@x.edu"}, None),
+    ("GET /users", "users", {}, CREATED_ASC),
+    ("GET /users?role", "users", {"role": "teacher"}, CREATED_ASC),
+    ("GET /users/{id}", "users", {"id": "x"}, None),
+    ("POST /auth/login (claims)", "token_versions", {"user_id": "x"}, None),
+    ("GET /classes/{id}", "classes", {"id": "x"}, None),
+    ("GET /teachers", "teachers", {}, CREATED_ASC),
+    ("GET /teachers/{id}", "teachers", {"id": "x"}, None),
+    ("GET /dashboard/stats (teacher)", "teachers", {"user_id": "x"}, None),
+    ("POST /students", "students", {"roll_no": "1", "class_id": "c", "school_year_id": "y"}, None),
+    ("GET /students", "students", {}, CREATED_ASC),
+    ("GET /students?class_id", "students", {"class_id": "c"}, CREATED_ASC),
+    ("GET /students?class_id&section_id", "students", {"class_id": "c", "section_id": "s"}, CREATED_ASC),
+    ("GET /students?school_year_id", "students", {"school_year_id": "y"}, CREATED_ASC),
+    ("GET /students/{id}", "students", {"id": "x"}, None),
+    ("GET /dashboard/stats (student)", "students", {"user_id": "x"}, None),
+    ("GET /parents", "parents", {}, CREATED_ASC),
+    ("GET /dashboard/stats (parent)", "parents", {"user_id": "x"}, None),
+    ("GET /timetable", "timetable", {}, [("day", 1), ("period_number", 1), ("id", 1)]),
+    ("GET /timetable?class_id&section_id", "timetable", {"class_id": "c", "section_id": "s"},
+     [("day", 1), ("period_number", 1), ("id", 1)]),
+    ("GET /timetable?teacher_id", "timetable", {"teacher_id": "t"}, [("day", 1), ("period_number", 1), ("id", 1)]),
+    ("PUT /timetable/{id}", "timetable", {"id": "x"}, None),
+    ("GET /attendance", "attendance", {}, DATE_DESC),
+    ("GET /attendance?student_id", "attendance", {"student_id": "x"}, DATE_DESC),
+    ("GET /attendance?class_id&section_id", "attendance", {"class_id": "c", "section_id": "s"}, DATE_DESC),
+    ("GET /attendance/stats", "attendance", {"student_id": "x"}, None),
+    ("GET /exam-schedules", "exam_schedules", {}, [("exam_date", 1), ("id", 1)]),
+    ("GET /exam-schedules?class_id", "exam_schedules", {"class_id": "c"}, [("exam_date", 1), ("id", 1)]),
+    ("GET /report-card/{id}", "exam_schedules", {"class_id": "c", "exam_type_id": "e"}, None),
+    ("GET /report-cards", "students", {"class_id": "c", "section_id": "s"}, CREATED_ASC),
+    ("GET /marks", "marks", {}, CREATED_ASC),
+    ("GET /marks?student_id", "marks", {"student_id": "x"}, CREATED_ASC),
+    ("GET /marks?exam_schedule_id", "marks", {"exam_schedule_id": "x"}, CREATED_ASC),
+    ("GET /report-card/{id} (marks)", "marks", {"student_id": "x", "exam_schedule_id": {"$in": ["e", "f"]}}, None),
+    ("GET /report-cards (marks)", "marks",
+     {"student_id": {"$in": ["x", "y"]}, "exam_schedule_id": {"$in": ["e", "f"]}}, None),
+    ("PUT /marks/{id}", "marks", {"id": "x"}, None),
+    ("GET /fee-structures?class_id", "fee_structures", {"class_id": "c"}, None),
+    ("GET /fee-structures?school_year_id", "fee_structures", {"school_year_id": "y"}, None),
+    ("GET /invoices", "invoices", {}, [("issue_date", -1), ("id", 1)]),
+    ("GET /invoices?student_id", "invoices", {"student_id": "x"}, [("issue_date", -1), ("id", 1)]),
+    ("GET /invoices?status", "invoices", {"status": "pending"}, [("issue_date", -1), ("id", 1)]),
+    ("GET /invoices/{id}", "invoices", {"id": "x"}, None),
+    ("GET /financial-reports (pending)", "invoices", {"status": {"$in": ["pending", "overdue"]}}, None),
+    ("GET /payments", "payments", {}, [("payment_date", -1), ("id", 1)]),
+    ("GET /payments?student_id", "payments", {"student_id": "x"}, [("payment_date", -1), ("id", 1)]),
+    ("GET /payments?invoice_id", "payments", {"invoice_id": "x"}, [("payment_date", -1), ("id", 1)]),
+    ("GET /income", "income", {}, DATE_DESC),
+    ("GET /income?category", "income", {"category": "donation"}, DATE_DESC),
+    ("GET /expenses", "expenses", {}, DATE_DESC),
+    ("GET /expenses?category", "expenses", {"category": "salary"}, DATE_DESC),
+]
+
+# Routes filtering on a date range, in both the legacy and the migrated form of the filter
+for legacy in (True, False):
+    suffix = " (legacy dates)" if legacy else ""
+    QUERY_SHAPES += [
+        (f"GET /attendance?date_from&date_to{suffix}", "attendance", date_range("date", legacy), DATE_DESC),
+        (f"GET /attendance?student_id&date_from{suffix}", "attendance",
+         {"student_id": "x", **date_range("date", legacy)}, DATE_DESC),
+        (f"GET /attendance/stats?date_from{suffix}", "attendance", {"student_id": "x", **date_range("date", legacy)}, None),
+        (f"GET /attendance/summary{suffix}", "attendance",
+         {"class_id": "c", "section_id": "s", **date_range("date", legacy)}, None),
+        (f"GET /dashboard/stats (teacher attendance){suffix}", "attendance",
+         {"class_id": {"$in": ["c", "d"]}, **date_range("date", legacy)}, None),
+        (f"GET /dashboard/stats (pending marks){suffix}", "exam_schedules",
+         {"subject_id": {"$in": ["m", "n"]}, **date_range("exam_date", legacy)}, None),
+        (f"GET /income?date_from{suffix}", "income", date_range("date", legacy), DATE_DESC),
+        (f"GET /expenses?category&date_from{suffix}", "expenses",
+         {"category": "salary", **date_range("date", legacy)}, DATE_DESC),
+        (f"GET /financial-reports (income){suffix}", "income", date_range("date", legacy), None),
+        (f"GET /financial-reports (expenses){suffix}", "expenses", date_range("date", legacy), None),
+        (f"GET /financial-reports (payments){suffix}", "payments", date_range("payment_date", legacy), None),
+    ]
+
+def stages(plan):
+    """Every stage name in an explain plan tree"""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            yield from stages(value)
+
+def apply_registry() -> int:
+    """Run the startup index bootstrap against the scratch database"""
+    async def apply():
+        motor_client = AsyncIOMotorClient(MONGO_URL)
+        try:
+            return await ensure_indexes(motor_client[TEST_DB_NAME])
+        finally:
+            motor_client.close()
+
+    return asyncio.run(apply())
+
+@pytest.fixture(scope="module")
+def db():
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"MongoDB is not reachable at {MONGO_URL}")
+
+    client.drop_database(TEST_DB_NAME)
+
+    assert apply_registry() == 0
+
+    yield client[TEST_DB_NAME]
+
+    client.drop_database(TEST_DB_NAME)
+    client.close()
+
+def test_registry_is_idempotent(db):
+    assert apply_registry() == 0
+    for name, indexes in INDEXES.items():
+        assert {index.document["name"] for index in indexes} <= set(db[name].index_information())
+
+@pytest.mark.parametrize("route,collection,query,sort", QUERY_SHAPES, ids=[shape[0] for shape in QUERY_SHAPES])
+def test_query_shape_uses_an_index(db, route, collection, query, sort):
+    cursor = db[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    plan = cursor.explain()["queryPlanner"]["winningPlan"]
+
+    assert "COLLSCAN" not in set(stages(plan)), f"{route} scans the whole {collection} collection"
+
+def test_unique_keys_reject_duplicates(db):
+    db.students.insert_one({"id": "a", "roll_no": "1", "class_id": "c", "school_year_id": "y"})
+    with pytest.raises(PyMongoError):
+        db.students.insert_one({"id": "b", "roll_no": "1", "class_id": "c", "school_year_id": "y"})
+
+def test_attendance_key_rejects_duplicates(db):
+    day = datetime(2024, 1, 15, tzinfo=timezone.utc)
+    db.attendance.insert_one({"id": "a", "student_id": "s", "date": day, "subject_id": None})
+    db.attendance.insert_one({"id": "b", "student_id": "s", "date": day, "subject_id": "math"})
+    with pytest.raises(PyMongoError):
+        db.attendance.insert_one({"id": "c", "student_id": "s", "date": day, "subject_id": None})
@@ -0,0 +1,75 @@
+"""
+Tests for cursor tracking in backend/monitoring.py CommandMonitor
+"""
+
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from monitoring import CommandMonitor  # noqa: E402
+
+class Events:
+    """Command events as pymongo passes them to a listener"""
+
+    def __init__(self, monitor: CommandMonitor):
+        self.monitor = monitor
+        self.request_id = 0
+
+    def started(self, name: str, command: dict) -> int:
+        self.request_id += 1
+        self.monitor.started(SimpleNamespace(command_name=name, command=command, request_id=self.request_id))
+        return self.request_id
+
+    def succeeded(self, request_id: int, reply: dict):
+        self.monitor.succeeded(SimpleNamespace(request_id=request_id, reply=reply, duration_micros=1000))
+
+    def failed(self, request_id: int):
+        self.monitor.failed(SimpleNamespace(request_id=request_id, duration_micros=1000))
+
+    def find(self, cursor_id: int):
+        request_id = self.started("find", {"find": "students", "filter": {"class_id": "c"}})
+        self.succeeded(request_id, {"cursor": {"id": cursor_id, "firstBatch": [{}]}})
+
+    def get_more(self, cursor_id: int) -> int:
+        return self.started("getMore", {"getMore": cursor_id, "collection": "students"})
+
+def test_exhausted_cursor_is_forgotten():
+    monitor = CommandMonitor()
+    events = Events(monitor)
+
+    events.find(7)
+    events.succeeded(events.get_more(7), {"cursor": {"id": 0, "nextBatch": [{}, {}]}})
+
+    assert monitor._cursors == {}
+    [shape] = monitor.slowest()["background"]
+    assert shape["count"] == 1 and shape["documents"] == 3
+
+def test_killed_cursors_are_forgotten():
+    monitor = CommandMonitor()
+    events = Events(monitor)
+
+    events.find(7)
+    events.find(8)
+    events.started("killCursors", {"killCursors": "students", "cursors": [7, 8]})
+
+    assert monitor._cursors == {}
+
+def test_failed_get_more_forgets_cursor():
+    monitor = CommandMonitor()
+    events = Events(monitor)
+
+    events.find(7)
+    events.failed(events.get_more(7))
+
+    assert monitor._cursors == {}
+
+def test_cursor_map_is_bounded():
+    monitor = CommandMonitor(max_cursors=2)
+    events = Events(monitor)
+
+    for cursor_id in (1, 2, 3):
+        events.find(cursor_id)
+
+    assert set(monitor._cursors) == {1, 2}
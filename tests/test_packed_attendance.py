@@ -0,0 +1,152 @@
+"""
+Tests for the bit-packed attendance layout in backend/packed_attendance.py
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from bson.int64 import Int64
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from packed_attendance import (  # noqa: E402
+    BITS_PER_DAY, DAY_MASK, STATUS_CODES, PackedAttendance, day_slot, month_id, pack_days, unpack_days
+)
+
+STATUSES = sorted(STATUS_CODES)
+
+def utc(*parts) -> datetime:
+    return datetime(*parts, tzinfo=timezone.utc)
+
+def test_day_slots_split_at_day_21():
+    assert day_slot(1) == ("w0", 0)
+    assert day_slot(21) == ("w0", 20 * BITS_PER_DAY)
+    assert day_slot(22) == ("w1", 0)
+    assert day_slot(31) == ("w1", 9 * BITS_PER_DAY)
+
+def test_status_codes_fit_and_leave_zero_for_unmarked():
+    assert sorted(STATUS_CODES.values()) == list(range(1, len(STATUS_CODES) + 1))
+    assert max(STATUS_CODES.values()) <= DAY_MASK
+
+@pytest.mark.parametrize("status", STATUSES)
+def test_round_trip_every_status_on_edge_days(status):
+    days = {1: status, 21: status, 22: status, 31: status}
+
+    words = pack_days(days)
+
+    assert unpack_days(words) == days
+    # The sign bit stays clear, so $bit never sees a negative word
+    assert all(0 <= word < 2 ** 63 for word in words.values())
+
+def test_round_trip_full_month_of_mixed_statuses():
+    days = {day: STATUSES[day % len(STATUSES)] for day in range(1, 32)}
+
+    assert unpack_days(pack_days(days)) == days
+
+def test_neighbouring_days_do_not_bleed():
+    assert unpack_days(pack_days({21: "half_day"})) == {21: "half_day"}
+    assert unpack_days(pack_days({22: "half_day"})) == {22: "half_day"}
+    assert pack_days({21: "present"})["w1"] == 0
+    assert pack_days({22: "present"})["w0"] == 0
+
+def record(day: int, status: str, month: int = 3) -> dict:
+    return {"student_id": "s", "class_id": "c", "section_id": "x", "subject_id": None,
+            "date": utc(2024, month, day), "status": status, "marked_by": "t"}
+
+def apply_bit(doc: dict, update: dict) -> dict:
+    """What MongoDB's $bit and/or does to a month document"""
+    doc = dict(doc)
+    for field, operations in update["$bit"].items():
+        doc[field] = Int64((doc.get(field, 0) & operations["and"]) | operations["or"])
+    return doc
+
+@pytest.mark.parametrize("day", [1, 21, 22, 31])
+def test_mark_update_overwrites_one_day(day):
+    packed = PackedAttendance(None)
+    # Every day starts marked, so each overwrite has bits to clear as well as set
+    doc = pack_days({d: "half_day" for d in range(1, 32)})
+
+    for status in STATUSES:
+        key, update = packed.mark_update(record(day, status))
+        doc = apply_bit(doc, update)
+
+        expected = {d: "half_day" for d in range(1, 32)}
+        expected[day] = status
+        assert unpack_days(doc) == expected
+    assert key == {"_id": month_id("s", None, utc(2024, 3, 1))}
+
+def test_mark_update_sets_month_on_insert_and_remarks():
+    key, update = PackedAttendance(None).mark_update({**record(22, "late"), "remarks": "Bus"})
+
+    assert update["$setOnInsert"]["month"] == utc(2024, 3, 1)
+    assert update["$set"]["remarks.22"] == "Bus"
+    assert "$unset" not in update
+
+    _, update = PackedAttendance(None).mark_update(record(22, "late"))
+    assert update["$unset"] == {"remarks.22": ""}
+
+class MonthDocuments:
+    """Month documents answering the find().sort() that PackedAttendance reads them with"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, query):
+        def matches(doc):
+            for field, condition in query.items():
+                if isinstance(condition, dict):
+                    if "$gte" in condition and doc[field] < condition["$gte"]:
+                        return False
+                    if "$lte" in condition and doc[field] > condition["$lte"]:
+                        return False
+                elif doc.get(field) != condition:
+                    return False
+            return True
+        return _Cursor([doc for doc in self.docs if matches(doc)])
+
+class _Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, spec):
+        for field, direction in reversed(spec):
+            self.docs.sort(key=lambda doc: doc[field], reverse=direction == -1)
+        return self
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            yield doc
+
+def month_doc(student_id: str, month: datetime, days: dict) -> dict:
+    return {"_id": month_id(student_id, None, month), "student_id": student_id, "class_id": "c",
+            "section_id": "x", "subject_id": None, "month": month, **pack_days(days)}
+
+def test_find_page_resumes_across_month_documents():
+    docs = [
+        month_doc("a", utc(2024, 2, 1), {28: "present", 29: "late"}),
+        month_doc("b", utc(2024, 2, 1), {29: "absent"}),
+        month_doc("a", utc(2024, 3, 1), {1: "present", 21: "excused", 22: "half_day", 31: "late"}),
+        month_doc("b", utc(2024, 3, 1), {1: "present", 31: "present"}),
+    ]
+    packed = PackedAttendance(MonthDocuments(docs))
+
+    async def all_pages(limit):
+        pages, after = [], None
+        while True:
+            page, more = await packed.find_page({}, None, None, limit, after)
+            pages.append(page)
+            if not more:
+                return pages
+            after = [page[-1]["date"], page[-1]["id"]]
+
+    expected = [(r["date"].day, r["student_id"]) for r in asyncio.run(packed.find_page({}, None, None, 100))[0]]
+    assert expected == [(31, "a"), (31, "b"), (22, "a"), (21, "a"), (1, "a"), (1, "b"),
+                        (29, "a"), (29, "b"), (28, "a")]
+
+    for limit in (1, 2, 3, 4):
+        pages = asyncio.run(all_pages(limit))
+        assert all(len(page) == limit for page in pages[:-1])
+        assert [(r["date"].day, r["student_id"]) for page in pages for r in page] == expected
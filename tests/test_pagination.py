@@ -0,0 +1,103 @@
+"""
+Tests for the keyset cursors in backend/pagination.py
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from pagination import NEXT_CURSOR_HEADER, PageCursor, decode_cursor, encode_cursor, keyset_filter  # noqa: E402
+from streaming import json_array_response  # noqa: E402
+
+DATE_SORT = [("date", -1), ("id", 1)]
+CREATED_SORT = [("created_at", 1), ("id", 1)]
+
+def test_cursor_round_trip_keeps_datetimes():
+    date = datetime(2024, 3, 1, 8, 30, tzinfo=timezone.utc)
+    cursor = encode_cursor(DATE_SORT, {"date": date, "id": "a", "status": "present"})
+
+    assert decode_cursor(DATE_SORT, cursor) == [date, "a"]
+
+def test_descending_date_cursor_reaches_legacy_strings():
+    date = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+    assert keyset_filter(DATE_SORT, [date, "a"]) == {"$or": [
+        {"date": {"$lt": date}},
+        {"date": {"$type": "string"}},
+        {"date": date, "id": {"$gt": "a"}},
+    ]}
+
+def test_descending_string_cursor_stays_on_strings():
+    # Strings sort before dates, so nothing of another type follows them in descending order
+    assert keyset_filter(DATE_SORT, ["2024-02-01", "a"]) == {"$or": [
+        {"date": {"$lt": "2024-02-01"}},
+        {"date": "2024-02-01", "id": {"$gt": "a"}},
+    ]}
+
+def test_ascending_string_cursor_reaches_dates():
+    assert keyset_filter(CREATED_SORT, ["2024-02-01T00:00:00", "a"]) == {"$or": [
+        {"created_at": {"$gt": "2024-02-01T00:00:00"}},
+        {"created_at": {"$type": "date"}},
+        {"created_at": "2024-02-01T00:00:00", "id": {"$gt": "a"}},
+    ]}
+
+class Rows:
+    """Async cursor over documents, counting the rows read"""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.read = 0
+
+    async def __aiter__(self):
+        for doc in self.docs:
+            self.read += 1
+            yield dict(doc)
+
+ROWS = [{"created_at": f"2024-01-0{n}", "id": str(n), "name": f"row {n}"} for n in range(1, 4)]
+
+def test_page_cursor_holds_back_the_extra_row():
+    page = PageCursor(Rows(ROWS), CREATED_SORT, 2, ["created_at"])
+
+    docs = asyncio.run(page.to_list())
+
+    # The sort field added to the projection is stripped, and the third row is never returned
+    assert docs == [{"id": "1", "name": "row 1"}, {"id": "2", "name": "row 2"}]
+    assert decode_cursor(CREATED_SORT, page.headers()[NEXT_CURSOR_HEADER]) == ["2024-01-02", "2"]
+
+def test_last_page_has_no_next_cursor():
+    page = PageCursor(Rows(ROWS), CREATED_SORT, 3, [])
+
+    assert len(asyncio.run(page.to_list())) == 3
+    assert page.headers() == {}
+
+def respond(page: PageCursor, extensions: dict) -> list:
+    response = json_array_response(page, None, {}, page.headers, [NEXT_CURSOR_HEADER])
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(response({"type": "http", "extensions": extensions}, None, send))
+    return sent
+
+def test_page_streams_with_next_cursor_as_trailer():
+    rows = Rows(ROWS)
+    sent = respond(PageCursor(rows, CREATED_SORT, 2, []), {"http.response.trailers": {}})
+
+    start, *bodies, trailers = sent
+    assert (b"trailer", NEXT_CURSOR_HEADER.encode()) in start["headers"]
+    assert b"".join(body["body"] for body in bodies).count(b'"id"') == 2
+    assert trailers["type"] == "http.response.trailers"
+    assert [name for name, _ in trailers["headers"]] == [NEXT_CURSOR_HEADER.lower().encode()]
+    assert rows.read == 3
+
+def test_page_without_trailer_support_sends_next_cursor_as_header():
+    sent = respond(PageCursor(Rows(ROWS), CREATED_SORT, 2, []), {})
+
+    start, body = sent
+    headers = dict(start["headers"])
+    assert NEXT_CURSOR_HEADER.lower().encode() in headers
+    assert int(headers[b"content-length"]) == len(body["body"])
@@ -0,0 +1,62 @@
+"""
+Tests for the request profiler in backend/profiling.py
+"""
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from profiling import PROFILE_ID_HEADER, ProfileStore, ProfilingMiddleware  # noqa: E402
+
+def busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+async def profiled_work():
+    for _ in range(5):
+        busy(0.01)
+        await asyncio.sleep(0.01)
+    # Work the request hands to a task of its own, as streamed responses do
+    await asyncio.create_task(profiled_child())
+
+async def profiled_child():
+    busy(0.02)
+
+async def other_request():
+    for _ in range(10):
+        busy(0.01)
+        await asyncio.sleep(0.005)
+
+def test_profile_keeps_only_the_profiled_request(tmp_path):
+    async def app(scope, receive, send):
+        await profiled_work()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def allow(authorization):
+        return True
+
+    store = ProfileStore(tmp_path)
+    middleware = ProfilingMiddleware(app, store, allow, interval=0.001)
+    scope = {"type": "http", "method": "GET", "path": "/x", "headers": [(b"x-profile", b"1")]}
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def main():
+        await asyncio.gather(middleware(scope, None, send), other_request())
+
+    asyncio.run(main())
+
+    assert any(name == PROFILE_ID_HEADER for name, _ in sent[0]["headers"])
+    [profile] = store.list()
+    stacks = store.read(profile["name"])
+    assert "profiled_work" in stacks
+    assert "profiled_child" in stacks
+    assert "other_request" not in stacks
+    assert "select" not in stacks
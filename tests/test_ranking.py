@@ -0,0 +1,109 @@
+"""
+Tests for the vectorised exam rankings in backend/ranking.py
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from cache import TTLCache  # noqa: E402
+from ranking import RankingCache, ScheduleRanking, overall_rows, rank_scores  # noqa: E402
+
+def test_rank_scores_with_ties():
+    ranks = rank_scores(np.array([90.0, 80.0, 80.0, 70.0, 95.0]))
+
+    assert ranks["competition"].tolist() == [2, 3, 3, 5, 1]
+    assert ranks["dense"].tolist() == [2, 3, 3, 4, 1]
+    assert ranks["percentile"].tolist() == [70.0, 40.0, 40.0, 10.0, 90.0]
+    assert ranks["z_score"].mean() == pytest.approx(0)
+    assert ranks["z_score"].std() == pytest.approx(1)
+
+def test_rank_scores_all_equal_and_empty():
+    ranks = rank_scores(np.array([50.0, 50.0]))
+    assert ranks["competition"].tolist() == [1, 1]
+    assert ranks["z_score"].tolist() == [0.0, 0.0]
+
+    assert rank_scores(np.array([]))["competition"].size == 0
+
+def test_schedule_ranking_rows():
+    schedule = {"id": "s1", "subject_id": "math", "total_marks": 50.0}
+    marks = [
+        {"student_id": "b", "marks_obtained": 40.0},
+        {"student_id": "a", "marks_obtained": 40.0},
+        {"student_id": "a", "marks_obtained": 5.0},
+        {"student_id": "c", "marks_obtained": 45.0},
+        {"student_id": "d", "marks_obtained": 0.0, "is_absent": True},
+    ]
+
+    rows = ScheduleRanking(schedule, marks).rows()
+
+    assert [(row["student_id"], row["rank"], row["dense_rank"]) for row in rows] == [
+        ("c", 1, 1), ("a", 2, 2), ("b", 2, 2), ("d", None, None)
+    ]
+    assert rows[0]["percentage"] == 90.0
+    assert rows[-1]["absent"] is True
+
+def test_overall_rows_sum_marks_over_schedules():
+    math = ScheduleRanking({"id": "s1", "subject_id": "math", "total_marks": 100.0}, [
+        {"student_id": "a", "marks_obtained": 90.0},
+        {"student_id": "b", "marks_obtained": 50.0},
+    ])
+    art = ScheduleRanking({"id": "s2", "subject_id": "art", "total_marks": 50.0}, [
+        {"student_id": "b", "marks_obtained": 50.0},
+        {"student_id": "c", "marks_obtained": 20.0},
+    ])
+
+    rows = overall_rows([math, art])
+
+    assert [(row["student_id"], row["marks_obtained"], row["percentage"], row["rank"]) for row in rows] == [
+        ("a", 90.0, 90.0, 1), ("b", 100.0, 66.67, 2), ("c", 20.0, 40.0, 3)
+    ]
+
+class Marks:
+    """Marks collection whose find() can run a write while the query is in flight"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.during_find = None
+
+    def find(self, query, projection):
+        return SimpleNamespace(to_list=lambda length: self._read())
+
+    async def _read(self):
+        entries = [dict(entry) for entry in self.entries]
+        if self.during_find:
+            self.during_find()
+        return entries
+
+SCHEDULE = {"id": "s1", "subject_id": "math", "total_marks": 100.0}
+
+def scores(ranking: ScheduleRanking) -> dict:
+    return {row["student_id"]: row["marks_obtained"] for row in ranking.rows()}
+
+def test_rankings_loaded_across_a_marks_write_are_not_cached():
+    marks = Marks([{"exam_schedule_id": "s1", "student_id": "a", "marks_obtained": 40.0}])
+    rankings = RankingCache(SimpleNamespace(marks=marks), TTLCache())
+
+    def enter_marks():
+        # A marks handler writes and invalidates after the load has read the old marks
+        marks.entries.append({"exam_schedule_id": "s1", "student_id": "b", "marks_obtained": 60.0})
+        rankings.invalidate("s1")
+
+    marks.during_find = enter_marks
+    [stale] = asyncio.run(rankings.rankings([SCHEDULE]))
+    assert scores(stale) == {"a": 40.0}
+
+    marks.during_find = None
+    [fresh] = asyncio.run(rankings.rankings([SCHEDULE]))
+    assert scores(fresh) == {"a": 40.0, "b": 60.0}
+
+    # The fresh load had no write in between, so it is served from the cache
+    marks.entries.clear()
+    [cached] = asyncio.run(rankings.rankings([SCHEDULE]))
+    assert cached is fresh
@@ -0,0 +1,160 @@
+"""
+Query count tests for report card loading in backend/reports.py
+
+Loads report cards for classes with different numbers of exam schedules and counts
+the commands the driver sends, which must not grow with the schedules. Needs a
+running MongoDB (MONGO_URL, default mongodb://localhost:27017); skipped otherwise.
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from grading import GradeTable  # noqa: E402
+from models import GradeRule, Subject  # noqa: E402
+from reports import compose_report_card, compose_report_cards, load_report_card  # noqa: E402
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+TEST_DB_NAME = os.environ.get("REPORT_CARD_TEST_DB_NAME", "school_report_card_test")
+
+# Student, exam schedules of the class, marks of those schedules
+QUERIES_PER_REPORT_CARD = 3
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def seed(db, class_id: str, subjects: int, exams: int):
+    """A student in a class with one schedule per subject and exam, marked in all but the last"""
+    student_id = f"student-{class_id}"
+    db.students.insert_one({"id": student_id, "name": "Student", "roll_no": "1", "class_id": class_id})
+    schedules, marks = [], []
+    for exam in range(exams):
+        for subject in range(subjects):
+            schedule_id = f"{class_id}-{exam}-{subject}"
+            schedules.append({
+                "id": schedule_id,
+                "class_id": class_id,
+                "exam_type_id": f"exam-{exam}",
+                "subject_id": f"subject-{subject}",
+                "exam_date": datetime(2024, 3, 1 + exam, tzinfo=timezone.utc),
+                "total_marks": 100.0
+            })
+            if subject < subjects - 1:
+                marks.append({"id": f"marks-{schedule_id}", "exam_schedule_id": schedule_id,
+                              "student_id": student_id, "marks_obtained": 80.0})
+    db.exam_schedules.insert_many(schedules)
+    if marks:
+        db.marks.insert_many(marks)
+    return student_id
+
+def load(student_id: str, exam_type_id=None):
+    """Load a report card through Motor, returning what was loaded and the commands sent"""
+    counter = CommandCounter()
+
+    async def run():
+        motor_client = AsyncIOMotorClient(MONGO_URL, event_listeners=[counter])
+        try:
+            return await load_report_card(motor_client[TEST_DB_NAME], student_id, exam_type_id)
+        finally:
+            motor_client.close()
+
+    return asyncio.run(run()), counter.commands
+
+@pytest.fixture(scope="module")
+def db():
+    client = MongoClient(MONGO_URL, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"MongoDB is not reachable at {MONGO_URL}")
+
+    client.drop_database(TEST_DB_NAME)
+
+    yield client[TEST_DB_NAME]
+
+    client.drop_database(TEST_DB_NAME)
+    client.close()
+
+@pytest.mark.parametrize("subjects,exams", [(1, 1), (10, 4), (12, 8)])
+def test_query_count_is_fixed(db, subjects, exams):
+    student_id = seed(db, f"class-{subjects}x{exams}", subjects, exams)
+
+    (student, schedules, marks_by_schedule), commands = load(student_id)
+
+    assert commands == ["find"] * QUERIES_PER_REPORT_CARD
+    assert len(schedules) == subjects * exams
+    assert len(marks_by_schedule) == (subjects - 1) * exams
+
+def test_exam_type_filter(db):
+    student_id = seed(db, "class-filtered", 3, 2)
+
+    (_, schedules, marks_by_schedule), commands = load(student_id, "exam-1")
+
+    assert len(commands) == QUERIES_PER_REPORT_CARD
+    assert {schedule["exam_type_id"] for schedule in schedules} == {"exam-1"}
+    assert set(marks_by_schedule) <= {schedule["id"] for schedule in schedules}
+
+def test_missing_student(db):
+    loaded, commands = load("no-such-student")
+
+    assert loaded is None
+    assert commands == ["find"]
+
+def test_compose_report_card():
+    schedules = [
+        {"id": "s1", "subject_id": "math", "total_marks": 100.0},
+        {"id": "s2", "subject_id": "art", "total_marks": 50.0},
+        {"id": "s3", "subject_id": "gone", "total_marks": 100.0},
+    ]
+    marks = {
+        "s1": {"marks_obtained": 90.0, "remarks": "Good"},
+        "s3": {"marks_obtained": 60.0},
+    }
+    subjects = {"math": Subject(name="Mathematics", code="MATH", class_id="c")}
+    grades = GradeTable([
+        GradeRule(name="A", min_percentage=80, max_percentage=100),
+        GradeRule(name="B", min_percentage=60, max_percentage=79.99),
+    ])
+
+    card = compose_report_card({"id": "x"}, schedules, marks, subjects, grades)
+
+    assert [result["subject_name"] for result in card["results"]] == ["Mathematics", "Unknown"]
+    assert card["total_marks_obtained"] == 150.0
+    assert card["total_marks_possible"] == 200.0
+    assert card["overall_percentage"] == 75.0
+    assert card["grade"] == "B"
+
+def test_compose_report_cards_groups_marks_by_student():
+    schedules = [{"id": "s1", "subject_id": "math", "total_marks": 100.0}]
+    students = [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    marks = [
+        {"student_id": "b", "exam_schedule_id": "s1", "marks_obtained": 40.0},
+        {"student_id": "a", "exam_schedule_id": "s1", "marks_obtained": 90.0},
+        {"student_id": "a", "exam_schedule_id": "s1", "marks_obtained": 10.0},
+    ]
+    grades = GradeTable([GradeRule(name="A", min_percentage=80, max_percentage=100)])
+
+    cards = compose_report_cards(students, schedules, marks, {}, grades)
+
+    assert [card["student"]["id"] for card in cards] == ["a", "b", "c"]
+    assert [card["total_marks_obtained"] for card in cards] == [90.0, 40.0, 0]
+    assert [card["grade"] for card in cards] == ["A", "N/A", "N/A"]
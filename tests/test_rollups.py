@@ -0,0 +1,94 @@
+"""
+Tests for the attendance rollups in backend/rollups.py
+"""
+
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from rollups import (  # noqa: E402
+    DAILY_COLLECTION, MONTHLY_COLLECTION, AttendanceRollups, daily_key, monthly_key, rebuild_pipelines, split_range
+)
+
+def utc(*parts) -> datetime:
+    return datetime(*parts, tzinfo=timezone.utc)
+
+MICROSECOND = timedelta(microseconds=1)
+
+def test_split_range_whole_months():
+    assert split_range(utc(2024, 1, 1), utc(2024, 3, 31)) == ((utc(2024, 1, 1), utc(2024, 4, 1)), [])
+
+def test_split_range_date_only_end_of_february():
+    # Leap year: the 29th is the last day
+    assert split_range(utc(2024, 2, 1), utc(2024, 2, 29)) == ((utc(2024, 2, 1), utc(2024, 3, 1)), [])
+    assert split_range(utc(2024, 2, 1), utc(2024, 2, 28)) == (None, [(utc(2024, 2, 1), utc(2024, 2, 28))])
+
+def test_split_range_partial_edges():
+    months, edges = split_range(utc(2024, 1, 15), utc(2024, 4, 10))
+
+    assert months == (utc(2024, 2, 1), utc(2024, 4, 1))
+    assert edges == [(utc(2024, 1, 15), utc(2024, 2, 1) - MICROSECOND), (utc(2024, 4, 1), utc(2024, 4, 10))]
+
+def test_split_range_within_one_month():
+    assert split_range(utc(2024, 3, 5), utc(2024, 3, 20)) == (None, [(utc(2024, 3, 5), utc(2024, 3, 20))])
+
+def test_split_range_open_bounds():
+    assert split_range(None, None) == ((None, None), [])
+    assert split_range(utc(2024, 3, 2), None) == ((utc(2024, 4, 1), None), [(utc(2024, 3, 2), utc(2024, 4, 1) - MICROSECOND)])
+    assert split_range(None, utc(2024, 3, 31)) == ((None, utc(2024, 4, 1)), [])
+
+def test_split_range_naive_dates_are_utc():
+    assert split_range(datetime(2024, 1, 1), datetime(2024, 1, 31)) == ((utc(2024, 1, 1), utc(2024, 2, 1)), [])
+
+def test_rebuild_pipelines_match_incremental_keys():
+    pipelines = rebuild_pipelines()
+
+    assert set(pipelines) == {MONTHLY_COLLECTION, DAILY_COLLECTION}
+    for name, key in ((MONTHLY_COLLECTION, monthly_key), (DAILY_COLLECTION, daily_key)):
+        pipeline = pipelines[name]
+        assert pipeline[0] == {"$match": {"date": {"$type": "date"}}}
+        assert pipeline[-1] == {"$out": name}
+        # Grouped and projected on the same fields the handlers' $setOnInsert writes
+        _, fields = key({"student_id": "s", "class_id": "c", "section_id": "x", "date": utc(2024, 3, 4)})
+        assert set(pipeline[1]["$group"]["_id"]) == set(fields)
+        assert set(fields) <= set(pipeline[2]["$project"])
+
+class Recorder:
+    """Collection recording the bulk writes sent to it"""
+
+    def __init__(self):
+        self.operations = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+def record(status: str, day: int = 4) -> dict:
+    return {"student_id": "s", "class_id": "c", "section_id": "x", "date": utc(2024, 3, day), "status": status}
+
+def test_apply_increments_both_rollups():
+    db = {MONTHLY_COLLECTION: Recorder(), DAILY_COLLECTION: Recorder()}
+
+    # A new record on the 4th, and a record of the 5th re-marked from present to late
+    asyncio.run(AttendanceRollups(db).apply([
+        (record("present"), 1), (record("present", 5), -1), (record("late", 5), 1)
+    ]))
+
+    [monthly] = db[MONTHLY_COLLECTION].operations
+    assert monthly._filter == {"_id": "s|c|x|2024-03"}
+    # The present mark added on the 4th and the one removed on the 5th cancel out
+    assert monthly._doc["$inc"] == {"total": 1, "late": 1}
+    assert monthly._doc["$setOnInsert"]["month"] == utc(2024, 3, 1)
+
+    daily = {operation._filter["_id"]: operation._doc["$inc"] for operation in db[DAILY_COLLECTION].operations}
+    assert daily == {"c|x|2024-03-04": {"total": 1, "present": 1}, "c|x|2024-03-05": {"present": -1, "late": 1}}
+
+def test_apply_skips_cancelled_changes():
+    db = {MONTHLY_COLLECTION: Recorder(), DAILY_COLLECTION: Recorder()}
+
+    asyncio.run(AttendanceRollups(db).apply([(record("present"), -1), (record("present"), 1)]))
+
+    assert db[MONTHLY_COLLECTION].operations == []
+    assert db[DAILY_COLLECTION].operations == []